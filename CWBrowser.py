@@ -0,0 +1,314 @@
+"""
+Palette browser.
+
+Shows every palette of a pack as a thumbnail strip in a list or grid.
+PaletteListModel pages rows in from a PaletteRepository or PaletteStore
+through canFetchMore()/fetchMore(), so only what has been scrolled to is
+ever loaded. It keeps the keyset cursor of every page but the rows of
+only the last few pages used; a page scrolled back to is read again by
+its cursor on the job runner, its rows painted blank until it is in.
+PaletteStripDelegate paints each row from a pixmap kept in
+QPixmapCache, which is size bounded: scrolling further evicts the least
+recently used thumbnails instead of growing memory.
+"""
+
+from collections import OrderedDict
+from functools import partial
+
+from PySide6.QtWidgets import (
+    QButtonGroup,
+    QComboBox,
+    QHBoxLayout,
+    QListView,
+    QRadioButton,
+    QStyle,
+    QStyledItemDelegate,
+    QVBoxLayout,
+    QWidget,
+)
+
+from PySide6.QtGui import (
+    QColor,
+    QPainter,
+    QPixmap,
+    QPixmapCache,
+)
+
+from PySide6.QtCore import (
+    Qt,
+    QAbstractListModel,
+    QModelIndex,
+    QRect,
+    QSize,
+    Signal,
+)
+
+from CWJobs import jobRunner
+from vconv import packed2hex
+
+__all__ = ['PaletteListModel', 'PaletteStripDelegate', 'PaletteBrowser']
+
+# Thumbnail budget for QPixmapCache, in KiB.
+CACHE_KB = 16 * 1024
+
+# Pages of rows PaletteListModel keeps.
+CACHE_PAGES = 8
+
+
+class PaletteListModel(QAbstractListModel):
+    """The palettes of one pack, paged in as the view scrolls."""
+    PaletteRole = Qt.UserRole
+
+    def __init__(self, page_size=100, cache_pages=CACHE_PAGES):
+        super().__init__()
+        self.page_size = page_size
+        self.cache_pages = cache_pages
+        self.repo = None
+        self.pack = None
+        self.count = 0
+        # cursors[k] is the cursor page k is read after.
+        self.cursors = [None]
+        self.pages = OrderedDict()
+        # Evicted pages being read again, and the setPack() they are for.
+        self.loading = set()
+        self.generation = 0
+        self.done = True
+
+    def setPack(self, repo, pack):
+        self.beginResetModel()
+        self.repo = repo
+        self.pack = pack
+        self.count = 0
+        self.cursors = [None]
+        self.pages.clear()
+        self.loading.clear()
+        self.generation += 1
+        self.done = repo is None or pack is None
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.count
+
+    def _keep(self, k, rows):
+        self.pages[k] = rows
+        self.pages.move_to_end(k)
+        while len(self.pages) > self.cache_pages:
+            self.pages.popitem(last=False)
+
+    def row(self, row, wait=False):
+        """
+        Returns the (name, packed) of row. If its page was evicted, it is
+        read again in the background and None returned, unless wait is set.
+        """
+        k, i = divmod(row, self.page_size)
+        rows = self.pages.get(k)
+        if rows is None:
+            if not wait:
+                self._load(k)
+                return None
+            rows, _ = self.repo.page(self.pack, self.cursors[k],
+                                     self.page_size)
+        self._keep(k, rows)
+        return rows[i]
+
+    def _load(self, k):
+        if k in self.loading:
+            return
+        self.loading.add(k)
+        jobRunner().submit(self.repo.page, self.pack, self.cursors[k],
+                           self.page_size, key=(self, k),
+                           onResult=partial(self._onPage, self.generation, k),
+                           onError=partial(self._onPageError,
+                                           self.generation, k))
+
+    def _onPage(self, generation, k, result):
+        if generation != self.generation:
+            return
+        self.loading.discard(k)
+        rows, _ = result
+        if not rows:
+            return
+        self._keep(k, rows)
+        first = k * self.page_size
+        self.dataChanged.emit(self.index(first),
+                              self.index(first + len(rows) - 1))
+
+    def _onPageError(self, generation, k, text):
+        # Let the next paint ask again.
+        if generation == self.generation:
+            self.loading.discard(k)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self.row(index.row())
+        if row is None:
+            return None
+        name, pal = row
+        if role == Qt.DisplayRole:
+            return name
+        if role == Qt.ToolTipRole:
+            return f'{name} ({len(pal)} colors)'
+        if role == self.PaletteRole:
+            return pal
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.done
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self.done:
+            return
+        k = len(self.cursors) - 1
+        rows, cursor = self.repo.page(self.pack, self.cursors[k],
+                                      self.page_size)
+        if len(rows) < self.page_size:
+            self.done = True
+        else:
+            self.cursors.append(cursor)
+        if rows:
+            first = self.count
+            self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+            self._keep(k, rows)
+            self.count += len(rows)
+            self.endInsertRows()
+
+    def palette(self, row):
+        """Returns the palette in row as hex strings."""
+        return packed2hex(self.row(row, wait=True)[1])
+
+
+class PaletteStripDelegate(QStyledItemDelegate):
+    """Paints a palette as a strip of swatches, cached as a pixmap."""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.grid = False
+
+    def sizeHint(self, option, index):
+        return QSize(160, 64) if self.grid else QSize(320, 28)
+
+    def strip(self, index, w, h, ratio):
+        """Returns the swatch pixmap of index at w x h logical pixels."""
+        model = index.model()
+        key = f'cwb:{id(model.repo)}:{model.pack}:{index.row()}' \
+            f':{w}x{h}@{ratio}'
+        pix = QPixmapCache.find(key)
+        if pix is None:
+            pal = index.data(PaletteListModel.PaletteRole)
+            if pal is None:
+                # Its page is being read again; painted once it is in.
+                return None
+            pal = pal.tolist()
+            pix = QPixmap(QSize(w, h) * ratio)
+            pix.setDevicePixelRatio(ratio)
+            pix.fill(Qt.transparent)
+            n = len(pal)
+            if n:
+                painter = QPainter(pix)
+                for i, c in enumerate(pal):
+                    painter.fillRect(i*w//n, 0, w//n+1, h, QColor.fromRgb(c))
+                painter.end()
+            QPixmapCache.insert(key, pix)
+        return pix
+
+    def paint(self, painter, option, index):
+        painter.save()
+        if option.state & QStyle.State_Selected:
+            painter.fillRect(option.rect, option.palette.highlight())
+            painter.setPen(option.palette.highlightedText().color())
+        r = option.rect.adjusted(3, 3, -3, -3)
+        if self.grid:
+            text_h = option.fontMetrics.height()
+            swatch = QRect(r.left(), r.top(), r.width(), r.height() - text_h)
+            text = QRect(r.left(), swatch.bottom() + 1, r.width(), text_h)
+        else:
+            split = r.width() * 2 // 5
+            text = QRect(r.left(), r.top(), split - 6, r.height())
+            swatch = QRect(r.left() + split, r.top(), r.width() - split,
+                           r.height())
+        ratio = painter.device().devicePixelRatioF()
+        pix = self.strip(index, swatch.width(), swatch.height(), ratio)
+        if pix is not None:
+            painter.drawPixmap(swatch.topLeft(), pix)
+        name = option.fontMetrics.elidedText(index.data() or '',
+                                             Qt.ElideRight, text.width())
+        painter.drawText(text, Qt.AlignVCenter | Qt.AlignLeft, name)
+        painter.restore()
+
+
+class PaletteBrowser(QWidget):
+    """Browses all palettes of a pack as thumbnails."""
+    paletteSelected = Signal(list)
+    def __init__(self):
+        super().__init__()
+        QPixmapCache.setCacheLimit(max(QPixmapCache.cacheLimit(), CACHE_KB))
+        self.repo = None
+        self.model = PaletteListModel()
+        self.delegate = PaletteStripDelegate(self)
+        self.initGui()
+        self.setWindowTitle('Palette Browser')
+        self.resize(480, 640)
+
+    def initGui(self):
+        main_layout = QVBoxLayout(self)
+
+        top_layout = QHBoxLayout()
+        self.pack_cbox = QComboBox()
+        self.pack_cbox.setPlaceholderText('Select Palette Pack')
+        self.pack_cbox.currentIndexChanged.connect(self.onPackChange)
+        list_rb = QRadioButton('List')
+        list_rb.setChecked(True)
+        grid_rb = QRadioButton('Grid')
+        grid_rb.toggled.connect(self.setGrid)
+        self.mode_group = QButtonGroup(self)
+        self.mode_group.addButton(list_rb)
+        self.mode_group.addButton(grid_rb)
+        top_layout.addWidget(self.pack_cbox, 1)
+        top_layout.addWidget(list_rb)
+        top_layout.addWidget(grid_rb)
+
+        self.view = QListView()
+        self.view.setModel(self.model)
+        self.view.setItemDelegate(self.delegate)
+        self.view.setUniformItemSizes(True)
+        self.view.setResizeMode(QListView.Adjust)
+        self.view.setVerticalScrollMode(QListView.ScrollPerPixel)
+        self.view.activated.connect(self.onActivated)
+
+        main_layout.addLayout(top_layout)
+        main_layout.addWidget(self.view, 1)
+
+    def setGrid(self, grid):
+        self.delegate.grid = grid
+        self.view.setViewMode(QListView.IconMode if grid
+                              else QListView.ListMode)
+        self.view.setMovement(QListView.Static)
+        self.view.setSpacing(4 if grid else 0)
+        # The delegate's size hint changed; relayout every row.
+        self.model.layoutChanged.emit()
+
+    def setRepository(self, repo):
+        """Shows the packs of repo (a PaletteRepository or PaletteStore)."""
+        self.repo = repo
+        jobRunner().submit(repo.packs, key=(self, 'packs'),
+                           onResult=self.onPacksLoaded)
+
+    def onPacksLoaded(self, packs):
+        pack = self.pack_cbox.currentText()
+        self.pack_cbox.blockSignals(True)
+        self.pack_cbox.clear()
+        self.pack_cbox.addItems(packs)
+        self.pack_cbox.blockSignals(False)
+        self.pack_cbox.setCurrentIndex(packs.index(pack) if pack in packs
+                                       else 0 if packs else -1)
+        self.onPackChange()
+
+    def onPackChange(self):
+        pack = self.pack_cbox.currentText() or None
+        self.model.setPack(self.repo, pack)
+        # fetchMore() only runs when the view next lays out; start now.
+        if self.model.canFetchMore():
+            self.model.fetchMore()
+
+    def onActivated(self, index):
+        self.paletteSelected.emit(self.model.palette(index.row()))
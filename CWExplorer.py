@@ -1,64 +1,64 @@
 #!/usr/bin/env python
 
+import time
+# Startup phases as (name, perf_counter() at its end); see --profile-startup.
+STARTUP = [('start', time.perf_counter())]
+
+def startupPhase(name):
+    """Marks the end of a startup phase."""
+    if STARTUP is not None:
+        STARTUP.append((name, time.perf_counter()))
+
+import os
 import sys
-import json
-from objregistry import ObjRegistry
+import sqlite3
 
 from PySide6.QtWidgets import (
     QApplication, 
-    QCheckBox,
     QColorDialog, 
     QComboBox,
-    QDial,
-    QFrame,
-    QGridLayout,
+    QFileDialog,
     QHBoxLayout,
+    QInputDialog,
     QMainWindow, 
     QLabel,
     QMessageBox, 
     QPushButton,
-    QSizePolicy,
-    QSlider,
-    QSpacerItem,
     QStackedLayout,
     QStatusBar,
     QToolBar,
-    QTableView,
     QVBoxLayout,
     QWidget, 
 )
 
 from PySide6.QtGui import (
     QAction, 
-    QBrush, 
-    QColor, 
-    QFont,
     QIcon, 
-    QLinearGradient,
-    QPainter, 
-    QPainterPath,
-    QPen, 
-    QPolygon,
 )
 
 from PySide6.QtCore import (
     Qt, 
-    QPoint, 
-    QRect,
-    Signal,
+    QEvent,
     QSize, 
+    QTimer,
 )
+startupPhase('import Qt')
 
-from PySide6.QtSql import (
-    QSqlDatabase, 
-    QSqlTableModel,
-    QSqlQuery, 
-    QSqlQueryModel,
+import metrics
+import palsort
+from objregistry import ObjRegistry
+from CWJobs import Progress, jobRunner
+from CWHistory import PaletteHistory, decode_state, encode_state
+from project import Project, autosavePath
+from GuiBones import ColorPatch
+from CWWidgets import (
+    ContrastPanel, HarmonyTool, ImagePalTool, OffsetPalTool, PaletteDisplay,
+    PaletteSelector, RandMixTool,
 )
+startupPhase('import app modules')
 
-#from GuiBones import ColorPatch
-from CWWidgets import *
-from colorways import *
+# Everything else (the databases, search, palette stores and the browser)
+# is imported where it is first used, after the window is up.
 
 class WorkSpace(QWidget): 
     """WorkSpace Class"""
@@ -67,23 +67,52 @@ class WorkSpace(QWidget):
         #selector = ObjRegistry.get('main-palette-selector')
         self.palettedisplay = PaletteDisplay()
         selector = PaletteSelector()
-        randmix = RandMixTool()
-        offsetpal = OffsetPalTool()
-
-        selector.paletteSelected.connect(self.palettedisplay.setPalette)
-        randmix.paletteCreated.connect(self.palettedisplay.setPalette)
-        offsetpal.paletteCreated.connect(self.palettedisplay.setPalette)
-
-        tool_cb = QComboBox()
-         
 
+        self.history = PaletteHistory(self.palettedisplay)
+        ObjRegistry.add('palette-history', self.history)
+        selector.paletteSelected.connect(self.history.select)
+
+        self.swatch = -1
+        self.swatch_patch = ColorPatch()
+        self.swatch_patch.setStatusTip('Click a swatch, then here to edit it')
+        self.swatch_patch.colorChanged.connect(self.onSwatchEdited)
+        self.palettedisplay.swatchClicked.connect(self.onSwatchClicked)
+        self.palettedisplay.swatchDoubleClicked.connect(
+            self.onSwatchDoubleClicked)
+
+        # Built the first time it is shown.
+        self.contrast = None
+
+        self.sort_cb = QComboBox()
+        self.sort_cb.addItems(palsort.METHODS)
+        self.sort_cb.setCurrentText('Path')
+        self.sort_cb.setStatusTip('Swatch order: by hue, by lightness, or '
+                                  'a path through similar colors')
+        self.sort_btn = QPushButton('Sort')
+        self.sort_btn.setStatusTip('Reorder the swatches of the palette')
+        self.sort_btn.clicked.connect(
+            lambda: self.history.sort(self.sort_cb.currentText()))
+
+        self.keep_btn = QPushButton('Keep')
+        self.keep_btn.setStatusTip('Store the palette in the project')
+
+        # Tool panels are built the first time they are shown; until then
+        # the stack holds an empty placeholder for each.
+        self.tool_classes = {'Random Mix': RandMixTool,
+                             'Offset': OffsetPalTool,
+                             'From Image': ImagePalTool,
+                             'Harmony': HarmonyTool}
+        self.tools = {}
+        self.tool_params = {}
+
+        self.tool_cb = tool_cb = QComboBox()
         self.stack = QStackedLayout()
-        self.stack.addWidget(randmix)
-        tool_cb.addItem("Random Mix")
-        self.stack.addWidget(offsetpal)
-        tool_cb.addItem("Offset")
+        for name in self.tool_classes:
+            self.stack.addWidget(QWidget(self))
+            tool_cb.addItem(name)
 
-        tool_cb.currentIndexChanged.connect(self.stack.setCurrentIndex)
+        tool_cb.currentIndexChanged.connect(self.showTool)
+        self.showTool(0)
         
         main_layout = QVBoxLayout(self)
         panel_layout = QHBoxLayout()
@@ -94,28 +123,175 @@ class WorkSpace(QWidget):
         #panel_layout.addWidget(randmix, 1)
         panel_layout.addWidget(selector, 1)
 
+        swatch_layout = QHBoxLayout()
+        swatch_layout.addWidget(QLabel('Swatch:'))
+        swatch_layout.addWidget(self.swatch_patch)
+        swatch_layout.addStretch()
+        swatch_layout.addWidget(self.sort_cb)
+        swatch_layout.addWidget(self.sort_btn)
+        swatch_layout.addWidget(self.keep_btn)
+
+        self.display_layout = QHBoxLayout()
+        self.display_layout.addWidget(self.palettedisplay, 3)
+
         main_layout.addLayout(panel_layout)
-        main_layout.addWidget(self.palettedisplay)
+        main_layout.addLayout(swatch_layout)
+        main_layout.addLayout(self.display_layout)
         main_layout.setStretch(0, 1)
-        main_layout.setStretch(1, 1)
+        main_layout.setStretch(2, 1)
         self.setLayout(main_layout)
 
+    def onSwatchClicked(self, i):
+        self.swatch = i
+        self.swatch_patch.setColor(self.palettedisplay.hexes[i])
+
+    def onSwatchDoubleClicked(self, i):
+        self.onSwatchClicked(i)
+        self.swatch_patch.onClicked()
+
+    def onSwatchEdited(self, color):
+        self.history.editSwatch(self.swatch, color)
+
+    def showContrast(self, on):
+        """Shows or hides the contrast panel next to the palette."""
+        if self.contrast is None:
+            if not on:
+                return
+            self.contrast = ContrastPanel()
+            self.display_layout.addWidget(self.contrast, 1)
+            self.palettedisplay.paletteChanged.connect(self.onPaletteChanged)
+            self.onPaletteChanged()
+        self.contrast.setVisible(on)
+
+    def onPaletteChanged(self):
+        self.contrast.setPalette(self.palettedisplay.hexes)
+
+    def tool(self, name):
+        """Returns the panel of tool name, building it if need be."""
+        if name not in self.tools:
+            tool = self.tools[name] = self.tool_classes[name]()
+            self.history.watchTool(tool, name)
+            if name in self.tool_params:
+                tool.setParams(self.tool_params.pop(name))
+            index = list(self.tool_classes).index(name)
+            placeholder = self.stack.widget(index)
+            self.stack.insertWidget(index, tool)
+            self.stack.removeWidget(placeholder)
+            placeholder.deleteLater()
+        return self.tools[name]
+
+    def showTool(self, index):
+        self.tool(self.tool_cb.itemText(index))
+        self.stack.setCurrentIndex(index)
+
+    def toolParams(self):
+        """The selected tool and the settings of every tool."""
+        params = dict(self.tool_params)
+        params.update((name, tool.params())
+                      for name, tool in self.tools.items())
+        params['tool'] = self.tool_cb.currentText()
+        return params
+
+    def setToolParams(self, params):
+        for name in self.tool_classes:
+            if name not in params:
+                continue
+            if name in self.tools:
+                self.tools[name].setParams(params[name])
+            else:
+                self.tool_params[name] = params[name]
+        if params.get('tool') in self.tool_classes:
+            self.tool_cb.setCurrentText(params['tool'])
+
 
 class MainWindow(QMainWindow):
     """Main Window class"""
     def __init__(self):
         super().__init__()
-        self.connectToDB()
+        self.browser = None
+        self.project_browser = None
+        self.palette_source = None
+        self.project = None
+        self.painted = False
         self.initializeUI()
+        startupPhase('build window')
+        # Pick up where an unsaved session left off.
+        autosave = autosavePath() + '.journal'
+        if os.path.exists(autosave):
+            self.setProject(Project.open(autosave))
+        else:
+            self.setProject(Project())
+        startupPhase('open project')
+        # The database is opened once the window has been painted.
+        self.work_area.installEventFilter(self)
+        QApplication.instance().aboutToQuit.connect(self.onQuit)
+
+    def onQuit(self):
+        # Unsaved changes stay in the journal for the next session.
+        self.work_area.history.stack.indexChanged.disconnect(
+            self.onHistoryIndex)
+        self.project.close()
+        if metrics.ENABLED:
+            print(f'Metrics written to {metrics.dump()}', file=sys.stderr)
+
+    def updateMetrics(self):
+        """Shows rolling p50/p95 of the slowest spans in the status bar."""
+        stats = sorted(metrics.summary().items(), key=lambda kv: -kv[1][2])
+        self.metrics_label.setText('  '.join(
+            f'{name} {p50:.1f}/{p95:.1f}ms' for name, (_, p50, p95)
+            in stats[:4]))
+        self.metrics_label.setToolTip('\n'.join(
+            f'{name}: n={n} p50={p50:.2f}ms p95={p95:.2f}ms'
+            for name, (n, p50, p95) in sorted(stats)))
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint and not self.painted:
+            self.painted = True
+            self.work_area.removeEventFilter(self)
+            # Let the paint finish before starting anything else.
+            QTimer.singleShot(0, self.onFirstPaint)
+        return super().eventFilter(obj, event)
+
+    def onFirstPaint(self):
+        startupPhase('first paint')
+        self.connectToDB()
 
     def connectToDB(self):
-        """Connect to color dstabase."""
-        db = QSqlDatabase.addDatabase('QSQLITE')
-        db.setDatabaseName('color.db')
-        if not db.open():
-            print("Unable to open database.")
-            print("Connection failed: ", database.lastError().text())
-            sys.exit(1)
+        """
+        Connect to color database. The connection is opened on a worker
+        thread once the window has been painted.
+        """
+        from palrepo import PaletteRepository
+        jobRunner().submit(PaletteRepository, 'color.db',
+                           onResult=self.onDBReady, onError=self.onDBError)
+
+    def onDBReady(self, repo):
+        from nearest import NearestColors
+        from contrast import ContrastIndex
+        from palsearch import PaletteSearch
+        startupPhase('open database')
+        ObjRegistry.update('palette-repository', repo)
+        self.setPaletteSource(repo)
+        jobRunner().submit(NearestColors.from_db, 'color.db',
+            onResult=lambda nc: ObjRegistry.update('nearest-colors', nc))
+        jobRunner().submit(PaletteSearch, 'color.db',
+                           onResult=self.onSearchReady)
+        jobRunner().submit(ContrastIndex, 'color.db',
+                           onResult=self.onContrastReady)
+        reportStartup()
+
+    def onSearchReady(self, search):
+        ObjRegistry.update('palette-search', search)
+        ObjRegistry.get('main-palette-selector').search.requestSearch()
+
+    def onContrastReady(self, index):
+        ObjRegistry.update('palette-contrast', index)
+        ObjRegistry.get('main-palette-selector').updateFilter()
+
+    def onDBError(self, text):
+        print("Unable to open database.")
+        print("Connection failed: ", text)
+        QApplication.exit(1)
 
     def initializeUI(self):
         """Set up the application's GUI."""
@@ -135,8 +311,18 @@ class MainWindow(QMainWindow):
         """Create and arrange widgets in the main window."""
         self.work_area = WorkSpace()
         self.work_area.setStatusTip('Work Area')
+        self.work_area.keep_btn.clicked.connect(self.keepPalette)
+        history = self.work_area.history
+        history.entryPushed.connect(self.onEntryPushed)
+        history.stack.indexChanged.connect(self.onHistoryIndex)
         self.setCentralWidget(self.work_area)
         self.setStatusBar(QStatusBar())
+        if metrics.ENABLED:
+            self.metrics_label = QLabel()
+            self.statusBar().addPermanentWidget(self.metrics_label)
+            self.metrics_timer = QTimer(self)
+            self.metrics_timer.timeout.connect(self.updateMetrics)
+            self.metrics_timer.start(1000)
 
     def createActions(self):
         """Create the application's menu actions."""
@@ -158,13 +344,36 @@ class MainWindow(QMainWindow):
         self.open_act = create_act('Open', 'Ctrl+O', 'i/file.svg')
         self.save_act = create_act('Save', 'Ctrl+S', 'i/save.svg')
         self.saveas_act = create_act('Save As', 'Shift+Ctrl+S')
+        self.import_act = create_act('Import Colors...')
+        self.import_act.setStatusTip('Add color lists and palette packs '
+                                     'to the color database')
+        self.export_act = create_act('Export Palettes...')
+        self.export_act.setStatusTip('Write palette packs to a zip of PNG, '
+                                     'SVG, GPL and ASE files')
         self.quit_act = create_act('Quit', 'Ctrl+Q', 'i/exit.svg')
        
         self.quit_act.triggered.connect(self.close)
+        self.new_act.triggered.connect(self.newProject)
+        self.open_act.triggered.connect(self.openProject)
+        self.save_act.triggered.connect(self.saveProject)
+        self.saveas_act.triggered.connect(self.saveProjectAs)
+        self.import_act.triggered.connect(self.importColors)
+        self.export_act.triggered.connect(self.exportPalettes)
 
         # Edit Menu Actions
         self.undo_act = create_act('Undo', 'Ctrl+Z')
         self.redo_act = create_act('Redo', 'Shift+Ctrl+Z')
+        stack = self.work_area.history.stack
+        self.undo_act.triggered.connect(stack.undo)
+        self.redo_act.triggered.connect(stack.redo)
+        self.undo_act.setEnabled(False)
+        self.redo_act.setEnabled(False)
+        stack.canUndoChanged.connect(self.undo_act.setEnabled)
+        stack.canRedoChanged.connect(self.redo_act.setEnabled)
+        stack.undoTextChanged.connect(
+            lambda text: self.undo_act.setText(f'Undo {text}'.strip()))
+        stack.redoTextChanged.connect(
+            lambda text: self.redo_act.setText(f'Redo {text}'.strip()))
         self.cut_act = create_act('Cut', 'Ctrl+X')
         self.copy_act = create_act('Copy', 'Ctrl+C')
         self.paste_act = create_act('Paste', 'Ctrl+V')
@@ -176,6 +385,15 @@ class MainWindow(QMainWindow):
         self.togtb_act.setChecked(True)
         self.togtb_act.triggered.connect(self.togToolbar)
         self.cdb_act = create_act('Color DB', None, 'i/db.svg')
+        self.cdb_act.triggered.connect(self.showBrowser)
+        self.psrc_act = create_act('Palette Source...')
+        self.psrc_act.triggered.connect(self.choosePaletteSource)
+        self.ppal_act = create_act('Project Palettes')
+        self.ppal_act.triggered.connect(self.showProjectBrowser)
+        self.contrast_act = create_act('Contrast', checkable=True)
+        self.contrast_act.setStatusTip('Show the WCAG contrast of every '
+                                       'pair of swatches')
+        self.contrast_act.toggled.connect(self.work_area.showContrast)
         
         # Help Menu Actions
         self.about_act = create_act('About')
@@ -189,9 +407,13 @@ class MainWindow(QMainWindow):
         # File menu
         file_menu = self.menuBar().addMenu('File')
         file_menu.addAction(self.new_act)
+        file_menu.addAction(self.open_act)
         file_menu.addAction(self.save_act)
         file_menu.addAction(self.saveas_act)
         file_menu.addSeparator()
+        file_menu.addAction(self.import_act)
+        file_menu.addAction(self.export_act)
+        file_menu.addSeparator()
         file_menu.addAction(self.quit_act)
 
         # Edit menu
@@ -206,6 +428,9 @@ class MainWindow(QMainWindow):
         tool_menu = self.menuBar().addMenu('Tools')
         tool_menu.addAction(self.color_act)
         tool_menu.addAction(self.cdb_act)
+        tool_menu.addAction(self.psrc_act)
+        tool_menu.addAction(self.ppal_act)
+        tool_menu.addAction(self.contrast_act)
         tool_menu.addSeparator()
         tool_menu.addAction(self.togtb_act)
 
@@ -238,6 +463,273 @@ class MainWindow(QMainWindow):
             self.work_area.colorfg = color
 
 
+    def choosePaletteSource(self):
+        """Browse palettes from a palette store or another color DB."""
+        path, _ = QFileDialog.getOpenFileName(self, 'Palette Source', '',
+            'Palette stores (*.cwp);;Color databases (*.db)')
+        if not path:
+            return
+        if path.endswith('.db'):
+            from palrepo import PaletteRepository as source
+        else:
+            from palstore import PaletteStore as source
+        jobRunner().submit(source, path, onResult=self.setPaletteSource,
+            onError=lambda text: QMessageBox.warning(self, 'Palette Source',
+                text.strip().splitlines()[-1]))
+
+    def importColors(self):
+        """Imports color libraries into color.db on a worker thread."""
+        from swatchio import FORMATS, import_files
+        patterns = ' '.join(f'*{ext}' for ext in FORMATS)
+        paths, _ = QFileDialog.getOpenFileNames(self, 'Import Colors', '',
+            f'Color libraries ({patterns})')
+        if not paths:
+            return
+        self.import_act.setEnabled(False)
+        self.statusBar().showMessage('Importing...')
+        progress = Progress(self)
+        progress.reported.connect(self.onImportProgress)
+        jobRunner().submit(import_files, paths, 'color.db',
+                           progress=progress, onResult=self.onImported,
+                           onError=self.onImportError)
+
+    def onImportProgress(self, counts):
+        self.statusBar().showMessage(f'Importing... {counts["rows"]:,} rows')
+
+    def onImported(self, counts):
+        """Shows the new colors and palettes wherever they are used."""
+        from nearest import NearestColors
+        self.import_act.setEnabled(True)
+        self.statusBar().showMessage(
+            f'{counts["colors"]:,} colors and {counts["palettes"]:,} '
+            f'palettes imported, {counts["skipped"]:,} skipped', 5000)
+        repo = ObjRegistry.get('palette-repository')
+        if repo is None:
+            return
+        repo.invalidate()
+        if self.palette_source is repo:
+            self.setPaletteSource(repo)
+        selector = ObjRegistry.get('main-palette-selector')
+        search = ObjRegistry.get('palette-search')
+        if search is not None:
+            jobRunner().submit(search.sync, onResult=lambda _:
+                               selector.search.requestSearch())
+        index = ObjRegistry.get('palette-contrast')
+        if index is not None:
+            jobRunner().submit(index.sync,
+                               onResult=lambda _: selector.updateFilter())
+        jobRunner().submit(NearestColors.from_db, 'color.db',
+            onResult=lambda nc: ObjRegistry.update('nearest-colors', nc))
+
+    def onImportError(self, text):
+        self.import_act.setEnabled(True)
+        self.statusBar().clearMessage()
+        QMessageBox.warning(self, 'Import Colors',
+                            text.strip().splitlines()[-1])
+
+    def exportPalettes(self):
+        """
+        Exports the packs matching a pattern (the current pack by default)
+        of the palette source to a zip, with worker processes.
+        """
+        from palexport import export, select_packs
+        if self.palette_source is None:
+            return
+        current = ObjRegistry.get('main-palette-selector').pack_cbox \
+            .currentText()
+        pattern, ok = QInputDialog.getText(
+            self, 'Export Palettes', "Packs (e.g. 'sports-*', or '*' for "
+            'all):', text=current)
+        if not ok or not pattern.strip():
+            return
+        packs = select_packs(self.palette_source, pattern.split())
+        if not packs:
+            self.statusBar().showMessage(f'No pack matches {pattern}', 2000)
+            return
+        path, _ = QFileDialog.getSaveFileName(self, 'Export Palettes',
+            f'{packs[0] if len(packs) == 1 else "palettes"}.zip',
+            'Zip archives (*.zip)')
+        if not path:
+            return
+        self.export_act.setEnabled(False)
+        self.statusBar().showMessage('Exporting...')
+        progress = Progress(self)
+        progress.reported.connect(self.onExportProgress)
+        jobRunner().submit(export, self.palette_source, path, packs,
+            progress=lambda done, total: progress((done, total)),
+            onResult=lambda n: self.onExported(n, path),
+            onError=self.onExportError)
+
+    def onExportProgress(self, value):
+        done, total = value
+        self.statusBar().showMessage(
+            f'Exporting... {done:,} of {total:,} palettes')
+
+    def onExported(self, n, path):
+        self.export_act.setEnabled(True)
+        self.statusBar().showMessage(f'{n:,} palettes exported to {path}',
+                                     5000)
+
+    def onExportError(self, text):
+        self.export_act.setEnabled(True)
+        self.statusBar().clearMessage()
+        QMessageBox.warning(self, 'Export Palettes',
+                            text.strip().splitlines()[-1])
+
+    def setPaletteSource(self, repo):
+        """Points the palette selector and browser at repo."""
+        self.palette_source = repo
+        ObjRegistry.get('main-palette-selector').setRepository(repo)
+        if self.browser is not None:
+            self.browser.setRepository(repo)
+
+    def showBrowser(self):
+        """Opens the palette browser window."""
+        if self.browser is None:
+            from CWBrowser import PaletteBrowser
+            self.browser = PaletteBrowser()
+            self.browser.paletteSelected.connect(
+                self.work_area.history.select)
+            if self.palette_source is not None:
+                self.browser.setRepository(self.palette_source)
+        self.browser.show()
+        self.browser.raise_()
+        self.browser.activateWindow()
+
+    ### Projects
+
+    def setProject(self, project):
+        """Makes project current and shows its tool settings and history."""
+        if self.project is not None:
+            self.project.close()
+        self.project = project
+        ObjRegistry.update('palette-project', project)
+        self.last_params = project.params()
+        if self.last_params:
+            self.work_area.setToolParams(self.last_params)
+        if project.replayed is not None:
+            base, entries, index = project.replayed
+            prev = base = decode_state(base)
+            states = []
+            for text, key, data in entries:
+                prev = decode_state(data, prev)
+                states.append((text, tuple(key) if isinstance(key, list)
+                               else key, prev))
+            self.work_area.history.restore(base, states, index)
+        else:
+            history = self.work_area.history
+            history.restore(history.current, [], 0)
+        if self.project_browser is not None:
+            self.project_browser.setRepository(project)
+        self.updateTitle()
+
+    def updateTitle(self):
+        name = os.path.basename(self.project.path) if self.project.path \
+            else 'Untitled'
+        self.setWindowTitle(f'{name} - Colorways Explorer')
+
+    def onEntryPushed(self, cmd, merged, undone):
+        """Journals a history entry, and the tool settings if changed."""
+        if self.project is None:
+            return
+        params = self.work_area.toolParams()
+        if params != self.last_params:
+            self.last_params = params
+            self.project.record('params', params=params)
+        extra = {}
+        if self.work_area.history.stack.count() == 1:
+            extra['old'] = encode_state(cmd.old)
+        self.project.record('push', text=cmd.text(), key=cmd.key,
+                            state=encode_state(cmd.new, cmd.old),
+                            merged=merged, undone=undone, **extra)
+
+    def onHistoryIndex(self, index):
+        history = self.work_area.history
+        if self.project is not None and not history.replaying:
+            self.project.record('index',
+                                undone=history.stack.count() - index)
+
+    def keepPalette(self):
+        """Stores the work area palette in the project."""
+        self.project.store('Kept', f'Palette {self.project.count + 1:05d}',
+                           self.work_area.history.colors)
+        if self.project_browser is not None:
+            self.project_browser.setRepository(self.project)
+        self.statusBar().showMessage('Palette kept', 2000)
+
+    def confirmDiscard(self):
+        """Asks before dropping unsaved changes; True to go ahead."""
+        if not self.project.dirty:
+            return True
+        answer = QMessageBox.question(self, 'Unsaved Changes',
+            'Discard unsaved changes to the project?',
+            QMessageBox.StandardButton.No | QMessageBox.StandardButton.Yes,
+            QMessageBox.StandardButton.No)
+        if answer != QMessageBox.StandardButton.Yes:
+            return False
+        self.project.journal.discard()
+        return True
+
+    def newProject(self):
+        if self.confirmDiscard():
+            self.setProject(Project())
+
+    def openProject(self):
+        path, _ = QFileDialog.getOpenFileName(self, 'Open Project', '',
+            'Projects (*.cwx);;Autosave journals (*.journal)')
+        if not path or not self.confirmDiscard():
+            return
+        jobRunner().submit(Project.open, path, key=(self, 'project'),
+            onResult=self.setProject,
+            onError=lambda text: QMessageBox.warning(self, 'Open Project',
+                text.strip().splitlines()[-1]))
+
+    def saveProject(self):
+        if self.project.path is None:
+            return self.saveProjectAs()
+        self.writeProject(self.project.path)
+
+    def saveProjectAs(self):
+        path, _ = QFileDialog.getSaveFileName(self, 'Save Project', '',
+                                              'Projects (*.cwx)')
+        if not path:
+            return
+        if not path.endswith('.cwx'):
+            path += '.cwx'
+        self.writeProject(path)
+
+    def writeProject(self, path):
+        base, entries, index = self.work_area.history.snapshot()
+        rows, prev = [], base
+        for text, key, state in entries:
+            rows.append((text, key, encode_state(state, prev)))
+            prev = state
+        self.last_params = self.work_area.toolParams()
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            self.project.save(path, self.last_params,
+                              (encode_state(base), rows, index))
+        except (OSError, sqlite3.Error) as e:
+            QApplication.restoreOverrideCursor()
+            QMessageBox.warning(self, 'Save Project', str(e))
+            return
+        QApplication.restoreOverrideCursor()
+        self.updateTitle()
+        self.statusBar().showMessage(f'Saved {path}', 2000)
+
+    def showProjectBrowser(self):
+        """Opens a palette browser on the palettes kept in the project."""
+        if self.project_browser is None:
+            from CWBrowser import PaletteBrowser
+            self.project_browser = PaletteBrowser()
+            self.project_browser.setWindowTitle('Project Palettes')
+            self.project_browser.paletteSelected.connect(
+                self.work_area.history.select)
+            self.project_browser.setRepository(self.project)
+        self.project_browser.show()
+        self.project_browser.raise_()
+        self.project_browser.activateWindow()
+
     def togToolbar(self, state):
         self.tool_bar.setVisible(state)
 
@@ -262,8 +754,25 @@ class MainWindow(QMainWindow):
             event.ignore()
 
 
+def reportStartup():
+    """Prints the startup phases once, if --profile-startup was given."""
+    global STARTUP
+    if STARTUP is None or '--profile-startup' not in sys.argv:
+        STARTUP = None
+        return
+    t0 = prev = STARTUP[0][1]
+    print('startup phase            ms   total', file=sys.stderr)
+    for name, t in STARTUP[1:]:
+        print(f'{name:20s} {(t - prev) * 1e3:7.1f} {(t - t0) * 1e3:7.1f}',
+              file=sys.stderr)
+        prev = t
+    STARTUP = None
+
+
 if __name__ == '__main__':
     app = QApplication(sys.argv)
+    app.setApplicationName('CWExplorer')
     app.setAttribute(Qt.ApplicationAttribute.AA_DontShowIconsInMenus, True)
+    startupPhase('create application')
     window = MainWindow()
     sys.exit(app.exec())
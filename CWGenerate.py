@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+"""
+Headless batch palette generation.
+
+Generates palettes with the same generators and parameters as the Random
+Mix and Offset tools, for every base color given, spread over a process
+pool. Results are streamed either to JSON Lines or into the `palettes`
+table of a color database.
+
+Examples:
+
+    # 1000 HSL random-mix palettes of 8 colors for two base colors
+    CWGenerate.py '#FF00FF' '#336699' -n 1000 -s 8 -o out.jsonl
+
+    # offset palettes for every crayola color, stored as pack 'gen-crayola'
+    CWGenerate.py --db-colors crayola --tool offset --offset value \\
+        --edge reflect -n 100 --to-db color.db --pack gen-crayola
+
+Each task (a chunk of palettes for one base color) generates its chunk in
+one vectorized call, with a numpy Generator seeded from --seed, the base
+color index and the chunk start. The output depends on --seed and --chunk
+but not on the number of worker processes.
+"""
+
+import argparse
+import json
+import multiprocessing
+import sqlite3
+import sys
+import time
+
+import palgen
+import palsort
+from vconv import hex2packed
+
+
+def read_colors(args):
+    """Collects base colors from the command line, a file or color.db."""
+    colors = list(args.colors)
+    if args.colors_file:
+        with open(args.colors_file) as f:
+            text = f.read()
+        if text.lstrip().startswith('['):
+            colors += json.loads(text)
+        else:
+            colors += [line.strip() for line in text.splitlines()
+                       if line.strip()]
+    if args.db_colors:
+        conn = sqlite3.connect(args.db)
+        query = 'SELECT DISTINCT hex FROM colors WHERE valid = 1'
+        params = ()
+        if args.db_colors != 'all':
+            query += ' AND topset = ?'
+            params = (args.db_colors,)
+        colors += [row[0] for row in conn.execute(query + ' ORDER BY rowid;',
+                                                  params)]
+        conn.close()
+    return colors
+
+
+def mode_name(text):
+    """Color mode names are accepted in any case."""
+    return {m.upper(): m for m in palgen.MODES}.get(text.upper(), text)
+
+
+def positive_int(text):
+    """Sizes, counts and batches must be at least 1."""
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f'must be at least 1: {text}')
+    return value
+
+
+def make_tasks(colors, args):
+    params = dict(tool=args.tool, n=args.size, mode=args.mode,
+                  amount=args.amount, offset=args.offset.capitalize(),
+                  edge=args.edge.capitalize(), sort=args.sort)
+    for ci, base in enumerate(colors):
+        for start in range(0, args.count, args.chunk):
+            count = min(args.chunk, args.count - start)
+            yield (args.seed, ci, base, start, count, params)
+
+
+def run_task(task):
+    """Worker: generates one chunk of palettes for one base color."""
+    seed, ci, base, start, count, params = task
+    rng = palgen.make_rng([seed, ci, start])
+    params = dict(params)
+    method = params.pop('sort')
+    palettes = palgen.generate_many(k=count, base=base, seed=rng, **params)
+    if method is not None:
+        palettes = [palsort.sort_hex(pal, method, budget=None)
+                    for pal in palettes]
+    return ci, base, start, palettes
+
+
+def palette_name(args, base, i):
+    return f'{args.tool}-{args.mode.lower()}-{base.lstrip("#")}-{i:06d}'
+
+
+class JsonlSink():
+    def __init__(self, path):
+        self.f = sys.stdout if path == '-' else open(path, 'w')
+
+    def write(self, args, base, start, palettes):
+        for i, pal in enumerate(palettes, start):
+            self.f.write(json.dumps({
+                'name': palette_name(args, base, i),
+                'base': base,
+                'palette': pal,
+            }) + '\n')
+
+    def close(self):
+        if self.f is not sys.stdout:
+            self.f.close()
+
+
+class DbSink():
+    """Inserts into palettes, committing every `batch` rows."""
+    def __init__(self, path, pack, batch):
+        self.conn = sqlite3.connect(path)
+        self.pack = pack
+        self.batch = batch
+        self.rows = []
+
+    def write(self, args, base, start, palettes):
+        self.rows += [(self.pack, palette_name(args, base, i), json.dumps(pal))
+                      for i, pal in enumerate(palettes, start)]
+        if len(self.rows) >= self.batch:
+            self.flush()
+
+    def flush(self):
+        with self.conn:
+            self.conn.executemany(
+                'INSERT INTO palettes (pack, name, json) VALUES (?, ?, ?);',
+                self.rows)
+        self.rows = []
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(
+        description='Generate palettes without the GUI.',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__[__doc__.index('Examples:'):])
+    src = parser.add_argument_group('base colors')
+    src.add_argument('colors', nargs='*', help='#RRGGBB base colors')
+    src.add_argument('--colors-file', help='file of hex colors, one per '
+                     'line or a JSON list')
+    src.add_argument('--db-colors', metavar='TOPSET',
+                     help="use colors of this topset from --db ('all' for "
+                     'every valid color)')
+    src.add_argument('--db', default='color.db')
+
+    gen = parser.add_argument_group('generator')
+    gen.add_argument('--tool', choices=palgen.TOOLS, default='randmix')
+    gen.add_argument('--mode', type=mode_name, choices=list(palgen.MODES),
+                     default='HSL')
+    gen.add_argument('-a', '--amount', '--weight', '--range', type=float,
+                     default=0.5, help='weight (randmix) or range (offset) '
+                     'in [0,1]')
+    gen.add_argument('--offset', type=str.lower, choices=['random', 'value'],
+                     default='random')
+    gen.add_argument('--edge', type=str.lower, choices=['clamp', 'reflect'],
+                     default='clamp')
+    gen.add_argument('-s', '--size', type=positive_int, default=5,
+                     help='colors per palette')
+    gen.add_argument('-n', '--count', type=positive_int, default=1,
+                     help='palettes per base color')
+    gen.add_argument('--seed', type=int, default=0)
+    gen.add_argument('--sort', type=str.capitalize, choices=palsort.METHODS,
+                     help='reorder the swatches of every palette')
+
+    out = parser.add_argument_group('output')
+    out.add_argument('-o', '--output', default='-',
+                     help="JSON Lines file ('-' for stdout)")
+    out.add_argument('--to-db', metavar='DB',
+                     help='insert into the palettes table of DB instead')
+    out.add_argument('--pack', default='generated')
+    out.add_argument('--batch', type=positive_int, default=50000,
+                     help='rows per database transaction')
+
+    run = parser.add_argument_group('execution')
+    run.add_argument('-j', '--jobs', type=positive_int, default=None,
+                     help='worker processes (default: all cores)')
+    run.add_argument('--chunk', type=positive_int, default=1000,
+                     help='palettes per task')
+    return parser
+
+
+def main(argv=None):
+    parser = make_parser()
+    args = parser.parse_args(argv)
+    colors = read_colors(args)
+    if not colors:
+        sys.exit('No base colors given.')
+    try:
+        hex2packed(colors)
+    except ValueError as e:
+        parser.error(str(e))
+    sink = DbSink(args.to_db, args.pack, args.batch) if args.to_db \
+        else JsonlSink(args.output)
+
+    t0 = time.perf_counter()
+    total = 0
+    try:
+        with multiprocessing.Pool(args.jobs) as pool:
+            for ci, base, start, palettes in pool.imap(
+                    run_task, make_tasks(colors, args)):
+                sink.write(args, base, start, palettes)
+                total += len(palettes)
+    finally:
+        sink.close()
+    elapsed = time.perf_counter() - t0
+    print(f'{total} palettes in {elapsed:.2f}s '
+          f'({total / elapsed:.0f}/s)', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,294 @@
+"""
+Undo history for the work area palette.
+
+PaletteHistory puts every change of the work area palette (created,
+previewed, selected, sorted or a single swatch edited) on a QUndoStack. Entries
+keep compact palette states instead of copies of the palette:
+
+    Recipe   the generator, its parameters and seed (regenerated on undo)
+    Packed   a uint32 array of 0xRRGGBB colors
+    Edit     a parent state plus one changed swatch
+
+States are immutable and shared between neighbouring entries, so each
+entry only adds its new state. The stack is capped by the estimated
+size of its states rather than by entry count; when it grows past the
+cap the oldest entries are dropped by rebuilding the stack.
+
+encode_state() and decode_state() turn states into small JSON values
+for project files; an Edit is stored relative to the state before it.
+"""
+
+import numpy as np
+
+from PySide6.QtCore import QObject, Signal
+from PySide6.QtGui import QUndoCommand, QUndoStack
+
+import palsort
+from palgen import generate_many
+from vconv import hex2packed
+
+__all__ = [
+    'Recipe', 'Packed', 'Edit', 'PaletteHistory',
+    'encode_state', 'decode_state',
+]
+
+# Rough per-entry overhead of the command objects, in bytes.
+_ENTRY_BYTES = 256
+
+# Edits are chained at most this deep before being flattened.
+_MAX_DEPTH = 32
+
+
+class Recipe():
+    """A generated palette, stored as the arguments of palgen.generate()."""
+    __slots__ = ('args',)
+    depth = 0
+    cost = 128
+
+    def __init__(self, tool, n, base, mode='HSL', amount=0.5,
+                 offset='Random', edge='Clamp', seed=None):
+        self.args = (tool, n, base, mode, amount, offset, edge, seed)
+
+    def palette(self):
+        tool, n, base, mode, amount, offset, edge, seed = self.args
+        return generate_many(tool, 1, n, base, mode, amount, offset, edge,
+                             seed, packed=True)[0]
+
+
+class Packed():
+    """An explicit palette of packed 0xRRGGBB colors."""
+    __slots__ = ('colors',)
+    depth = 0
+
+    def __init__(self, colors):
+        self.colors = np.array(colors, dtype=np.uint32)
+        self.colors.flags.writeable = False
+
+    @property
+    def cost(self):
+        return 96 + self.colors.nbytes
+
+    def palette(self):
+        return self.colors
+
+
+class Edit():
+    """The parent state with swatch `index` set to `color`."""
+    __slots__ = ('parent', 'index', 'color', 'depth')
+    cost = 96
+
+    def __init__(self, parent, index, color):
+        self.parent = parent
+        self.index = index
+        self.color = color
+        self.depth = parent.depth + 1
+
+    def palette(self):
+        colors = np.array(self.parent.palette(), dtype=np.uint32)
+        colors[self.index] = self.color
+        return colors
+
+
+def encode_state(state, prev=None):
+    """Returns a JSON-able value for state; prev is the state before it."""
+    if isinstance(state, Recipe):
+        return {'recipe': list(state.args)}
+    if isinstance(state, Edit) and state.parent is prev:
+        return {'edit': [state.index, state.color]}
+    colors = np.asarray(state.palette(), dtype='<u4')
+    return {'packed': colors.tobytes().hex()}
+
+
+def decode_state(data, prev=None):
+    """Inverse of encode_state()."""
+    if 'recipe' in data:
+        return Recipe(*data['recipe'])
+    if 'edit' in data and prev is not None:
+        index, color = data['edit']
+        return Edit(prev, index, color)
+    return Packed(np.frombuffer(bytes.fromhex(data['packed']), dtype='<u4'))
+
+
+class PaletteCommand(QUndoCommand):
+    """Moves the work area palette from state `old` to state `new`."""
+    def __init__(self, history, old, new, text, key=None, colors=None):
+        super().__init__(text)
+        self.history = history
+        self.old = old
+        self.new = new
+        self.key = key
+        # The palette of `new`, if the caller already has it.
+        self.colors = colors
+
+    def id(self):
+        return -1 if self.key is None else 1
+
+    def mergeWith(self, other):
+        """Merges a run of previews, or of edits to the same swatch."""
+        if self.history.replaying or other.key != self.key \
+                or other.old is not self.new:
+            return False
+        new = other.new
+        if isinstance(new, Edit) and isinstance(self.new, Edit):
+            # Keep one edit of the swatch instead of a chain of them.
+            new = Edit(self.new.parent, new.index, new.color)
+            if self.history.current is other.new:
+                self.history.current = new
+        self.new = new
+        return True
+
+    def redo(self):
+        if not self.history.replaying:
+            self.history.apply(self.new, self.colors)
+        self.colors = None
+
+    def undo(self):
+        if not self.history.replaying:
+            self.history.apply(self.old)
+
+
+class PaletteHistory(QObject):
+    """Undo/redo of the palette shown by a PaletteDisplay."""
+    # (command, merged, number of undone entries dropped) after a push.
+    entryPushed = Signal(object, bool, int)
+    def __init__(self, display, limit=4 << 20):
+        super().__init__()
+        self.display = display
+        self.limit = limit
+        self.stack = QUndoStack(self)
+        self.replaying = False
+        # Estimated bytes of each entry on the stack, bottom first.
+        self.costs = []
+        self.current = Packed(hex2packed(display.hexes))
+        self.colors = self.current.palette()
+
+    def apply(self, state, colors=None):
+        self.current = state
+        self.colors = state.palette() if colors is None else colors
+        self.display.setPalette(np.asarray(self.colors))
+
+    def push(self, state, text, key=None, colors=None):
+        index = self.stack.index()
+        undone = self.stack.count() - index
+        self.stack.push(PaletteCommand(self, self.current, state, text, key,
+                                       colors))
+        # Pushing drops the undone entries; a merge replaces the top one.
+        del self.costs[index:]
+        if self.stack.count() == index:
+            self.costs.pop()
+        top = self.stack.command(self.stack.count() - 1)
+        self.costs.append(top.new.cost + _ENTRY_BYTES)
+        if self.size() > self.limit:
+            self.trim(self.limit * 3 // 4)
+        self.entryPushed.emit(top, self.stack.count() == index, undone)
+
+    ### Recording
+
+    def watchTool(self, tool, name):
+        """Records the palettes created and previewed by a generator tool."""
+        tool.paletteCreated.connect(
+            lambda pal: self.created(tool.recipe, pal, f'Create {name}'))
+        tool.palettePreviewed.connect(
+            lambda pal: self.created(tool.recipe, pal, f'Adjust {name}',
+                                     key=('preview', id(tool))))
+
+    def created(self, recipe, palette, text='Create', key=None):
+        """
+        Records a tool's palette, as its recipe if the tool has one (the
+        generators) or else as the colors.
+        """
+        colors = hex2packed(palette)
+        state = Recipe(**recipe) if recipe else Packed(colors)
+        self.push(state, text, key, colors)
+
+    def select(self, palette):
+        """Records a palette chosen from the database or a search."""
+        state = Packed(hex2packed(palette))
+        self.push(state, 'Select Palette', colors=state.colors)
+
+    def editSwatch(self, index, color):
+        """Records setting swatch `index` to the hex color."""
+        if not 0 <= index < len(self.colors):
+            return
+        color = int(hex2packed([color])[0])
+        colors = np.array(self.colors, dtype=np.uint32)
+        colors[index] = color
+        if self.current.depth >= _MAX_DEPTH:
+            state = Packed(colors)
+        else:
+            state = Edit(self.current, index, color)
+        self.push(state, 'Edit Swatch', ('swatch', index), colors)
+
+    def sort(self, method):
+        """Records sorting the swatches by a palsort method."""
+        colors = palsort.sort_packed(self.colors, method, palsort.BUDGET)
+        self.push(Packed(colors), f'Sort by {method}', colors=colors)
+
+    ### Memory cap
+
+    def size(self):
+        """Estimated bytes held by the history."""
+        return sum(self.costs)
+
+    def trim(self, target):
+        """
+        Drops the oldest entries until the history is below target bytes.
+        QUndoStack cannot drop from the bottom, so the kept entries are
+        pushed onto a cleared stack again without being re-applied.
+        """
+        index = self.stack.index()
+        size = self.size()
+        drop = 0
+        # Never drop entries that are undone and waiting to be redone.
+        while drop < index and size > target:
+            size -= self.costs[drop]
+            drop += 1
+        if drop == 0:
+            return
+        keep = []
+        for i in range(drop, self.stack.count()):
+            cmd = self.stack.command(i)
+            keep.append((cmd.old, cmd.new, cmd.text(), cmd.key))
+        del self.costs[:drop]
+        self.replaying = True
+        try:
+            self.stack.clear()
+            for old, new, text, key in keep:
+                self.stack.push(PaletteCommand(self, old, new, text, key))
+            self.stack.setIndex(index - drop)
+        finally:
+            self.replaying = False
+
+    ### Saving and restoring
+
+    def snapshot(self):
+        """
+        Returns the history as (base, entries, index): the state below the
+        first entry, a list of (text, key, state) and the stack index.
+        """
+        count = self.stack.count()
+        if count == 0:
+            return self.current, [], 0
+        entries = []
+        for i in range(count):
+            cmd = self.stack.command(i)
+            entries.append((cmd.text(), cmd.key, cmd.new))
+        return self.stack.command(0).old, entries, self.stack.index()
+
+    def restore(self, base, entries, index):
+        """Replaces the history with a snapshot() and shows its palette."""
+        self.replaying = True
+        try:
+            self.stack.clear()
+            self.costs = []
+            old = base
+            for text, key, new in entries:
+                self.stack.push(PaletteCommand(self, old, new, text, key))
+                self.costs.append(new.cost + _ENTRY_BYTES)
+                old = new
+            self.stack.setIndex(index)
+        finally:
+            self.replaying = False
+        self.apply(entries[index - 1][2] if index > 0 else base)
+        if self.size() > self.limit:
+            self.trim(self.limit * 3 // 4)
@@ -0,0 +1,192 @@
+"""
+Background jobs for the GUI.
+
+JobRunner runs plain Python callables on a QThreadPool and hands their
+results back on the GUI thread. Jobs submitted under the same key
+supersede each other: a newer job cancels an older one that has not
+started yet, and the result of an older job that already ran is dropped,
+so only the latest Create click (or query) ever reaches the widgets.
+
+LatencyMonitor measures how late the GUI event loop services a short
+timer, which is what the user feels as input latency.
+"""
+
+import traceback
+from collections import deque
+
+from PySide6.QtCore import (
+    Qt,
+    QElapsedTimer,
+    QObject,
+    QRunnable,
+    QThreadPool,
+    QTimer,
+    Signal,
+    Slot,
+)
+
+from objregistry import ObjRegistry
+
+__all__ = ['Job', 'JobRunner', 'LatencyMonitor', 'Progress', 'jobRunner']
+
+
+class JobSignals(QObject):
+    """Signals of a Job; they live on the GUI thread."""
+    finished = Signal(object, object)
+    failed = Signal(object, str)
+
+
+class Job(QRunnable):
+    """A callable with arguments, run once on a pool thread."""
+    def __init__(self, fn, args, kwargs, key=None, onResult=None,
+                 onError=None):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.key = key
+        self.onResult = onResult
+        self.onError = onError
+        self.cancelled = False
+        self.signals = JobSignals()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        # Always report back, cancelled or not, so the runner lets go of
+        # the job; it drops the result of a cancelled one.
+        if self.cancelled:
+            self.signals.finished.emit(self, None)
+            return
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except Exception:
+            self.signals.failed.emit(self, traceback.format_exc())
+        else:
+            self.signals.finished.emit(self, result)
+
+
+class JobRunner(QObject):
+    """Runs jobs off the GUI thread and delivers results on it."""
+    def __init__(self, pool=None):
+        super().__init__()
+        self.pool = pool or QThreadPool.globalInstance()
+        self.latest = dict()
+        self.running = set()
+
+    def submit(self, fn, *args, key=None, onResult=None, onError=None,
+               **kwargs):
+        """
+        Runs fn(*args, **kwargs) on the pool. onResult(result) or
+        onError(traceback_text) is called on the GUI thread afterwards,
+        unless a newer job was submitted with the same key.
+        """
+        job = Job(fn, args, kwargs, key, onResult, onError)
+        job.setAutoDelete(False)
+        if key is not None:
+            old = self.latest.get(key)
+            if old is not None:
+                old.cancel()
+                if self.pool.tryTake(old):
+                    self.running.discard(old)
+            self.latest[key] = job
+        job.signals.finished.connect(self.onFinished)
+        job.signals.failed.connect(self.onFailed)
+        self.running.add(job)
+        self.pool.start(job)
+        return job
+
+    def cancel(self, key):
+        """Drops the pending job submitted under key, if any."""
+        job = self.latest.pop(key, None)
+        if job is not None:
+            job.cancel()
+            if self.pool.tryTake(job):
+                self.running.discard(job)
+
+    def _retire(self, job):
+        """Forgets a job that ran; True if its outcome is to be delivered."""
+        self.running.discard(job)
+        if job.key is not None and self.latest.get(job.key) is job:
+            del self.latest[job.key]
+            return not job.cancelled
+        return job.key is None and not job.cancelled
+
+    @Slot(object, object)
+    def onFinished(self, job, result):
+        if self._retire(job) and job.onResult is not None:
+            job.onResult(result)
+
+    @Slot(object, str)
+    def onFailed(self, job, text):
+        if self._retire(job):
+            if job.onError is not None:
+                job.onError(text)
+            else:
+                print(text)
+
+    def waitForDone(self, msecs=-1):
+        return self.pool.waitForDone(msecs)
+
+
+class Progress(QObject):
+    """
+    A callable for jobs to report progress with. Every call emits
+    `reported` with its argument; slots of objects on the GUI thread get
+    it there.
+    """
+    reported = Signal(object)
+
+    def __call__(self, value):
+        self.reported.emit(value)
+
+
+def jobRunner():
+    """Returns the application's shared JobRunner."""
+    runner = ObjRegistry.get('job-runner')
+    if runner is None:
+        runner = JobRunner()
+        ObjRegistry.add('job-runner', runner)
+    return runner
+
+
+class LatencyMonitor(QObject):
+    """
+    Measures event loop latency: a timer is scheduled every `interval` ms
+    and the delay past its due time is recorded, in milliseconds.
+    """
+    def __init__(self, interval=5, window=2000):
+        super().__init__()
+        self.interval = interval
+        self.samples = deque(maxlen=window)
+        self.clock = QElapsedTimer()
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.onTimeout)
+
+    def start(self):
+        self.clock.start()
+        self.timer.start(self.interval)
+
+    def stop(self):
+        self.timer.stop()
+
+    def onTimeout(self):
+        late = self.clock.nsecsElapsed() / 1e6 - self.interval
+        self.samples.append(max(late, 0.0))
+        self.clock.restart()
+        self.timer.start(self.interval)
+
+    def stats(self):
+        """Returns p50, p95 and max latency in ms over the window."""
+        if not self.samples:
+            return {'p50': 0.0, 'p95': 0.0, 'max': 0.0, 'count': 0}
+        s = sorted(self.samples)
+        return {
+            'p50': s[len(s) // 2],
+            'p95': s[min(len(s) - 1, int(len(s) * 0.95))],
+            'max': s[-1],
+            'count': len(s),
+        }
@@ -1,48 +1,57 @@
-
 import json
+import os
+import time
+import numpy as np
+import metrics
 from objregistry import ObjRegistry
 
 from PySide6.QtWidgets import (
     QApplication, 
-    QColorDialog, 
+    QCheckBox,
     QComboBox,
     QDial,
+    QFileDialog,
     QHBoxLayout,
-    QMainWindow, 
     QLabel,
+    QLineEdit,
+    QListWidget,
+    QListWidgetItem,
+    QMenu,
     QPushButton,
     QSizePolicy,
     QSlider,
     QSpacerItem,
+    QSpinBox,
+    QTabWidget,
+    QToolTip,
     QVBoxLayout,
     QWidget, 
 )
 
 from PySide6.QtGui import (
-    QBrush, 
+    QActionGroup,
     QColor, 
-    QIcon, 
+    QImage,
     QPainter, 
-    QPen, 
+    QPixmap,
 )
 
 from PySide6.QtCore import (
     Qt, 
+    QEvent,
     QRect,
     Signal,
-    QSize, 
-)
-
-from PySide6.QtSql import (
-    QSqlDatabase, 
-    QSqlTableModel,
-    QSqlQuery, 
-    QSqlQueryModel,
+    QTimer,
 )
 
+import contrast
+import cvd
+import harmony
+import imgpal
 from GuiBones import ColorPatch
-
-from colorways import *
+from CWJobs import jobRunner
+from palgen import PaletteStream, generate, new_seed
+from vconv import hex2packed, hsl2hex, packed2hex
 
 class ColorModeCB(QComboBox):
     """ColorModeCB"""
@@ -51,6 +60,8 @@ class ColorModeCB(QComboBox):
         self.addItem('RGB')
         self.addItem('HSL')
         self.addItem('HSV')
+        self.addItem('OKLab')
+        self.addItem('OKLCH')
 
 class OffsetTypeCB(QComboBox):
     """OffsetTypeCB"""
@@ -84,47 +95,359 @@ class NormDial(QDial):
         self.setNotchesVisible(True)
         self.setValue(50)
 
+class FrameThrottle(QTimer):
+    """Coalesces requests into at most one call per display frame."""
+    def __init__(self, slot, parent):
+        super().__init__(parent)
+        self.setSingleShot(True)
+        self.timeout.connect(slot)
+
+    def request(self):
+        if self.isActive():
+            return
+        screen = self.parent().screen()
+        rate = screen.refreshRate() if screen is not None else 0
+        self.start(int(1000 / rate) if rate > 0 else 16)
+
 class PaletteDisplay(QWidget):
     """PaletteDisplay Class"""
+    swatchClicked = Signal(int)
+    swatchDoubleClicked = Signal(int)
+    paletteChanged = Signal()
     def __init__(self):
         super().__init__()
         self.colorfg = QColor('#000000')
-        self.palette = [[0,0,0], [0, 0,.5], [0,0,1]]
         self.painter = QPainter()
-        self.nopen = QPen()
-        self.nopen.setStyle(Qt.NoPen)
+        # Color vision deficiency shown (a cvd.MODES key), or None.
+        self.mode = None
+        self.setStatusTip('Right-click to simulate color vision deficiencies')
+        self.setPalette([[0,0,0], [0, 0,.5], [0,0,1]])
     
     def setPalette(self, pal):
-        self.palette = pal
-        self.repaint()
+        """
+        Sets the palette (hex strings, HSL lists or a uint32 array of
+        0xRRGGBB values). Colors are converted once here; the swatches are
+        rendered on the next paint.
+        """
+        if isinstance(pal, np.ndarray):
+            self.hexes = self.palette = packed2hex(pal)
+            self.colors = [QColor.fromRgb(v) for v in pal.tolist()]
+        else:
+            self.palette = pal
+            self.hexes = pal
+            if len(pal)>0 and isinstance(pal[0], list):
+                self.hexes = hsl2hex(pal)
+            self.colors = [QColor(s) for s in self.hexes]
+        self.labels = None
+        # Swatch colors and rendered pixmaps of this palette, by mode.
+        self.simulated = {None: self.colors}
+        self.cache = {}
+        self.update()
+        self.paletteChanged.emit()
+
+    def setMode(self, mode):
+        """Shows the palette as seen with a cvd.MODES deficiency, or not."""
+        self.mode = mode
+        self.update()
+
+    def shownColors(self):
+        """The swatch colors as drawn in the current mode."""
+        colors = self.simulated.get(self.mode)
+        if colors is None:
+            packed = cvd.simulate(hex2packed(self.hexes), self.mode)
+            colors = [QColor.fromRgb(v) for v in packed.tolist()]
+            self.simulated[self.mode] = colors
+        return colors
+
+    def contextMenuEvent(self, event):
+        menu = QMenu(self)
+        group = QActionGroup(menu)
+        for mode in [None] + list(cvd.MODES):
+            act = menu.addAction(mode or 'Normal Vision')
+            act.setCheckable(True)
+            act.setChecked(mode == self.mode)
+            act.triggered.connect(lambda _, m=mode: self.setMode(m))
+            group.addAction(act)
+        menu.exec(event.globalPos())
+
+    def swatchLabels(self):
+        """
+        Names of the nearest named colors, one per swatch, or just the hex
+        codes while the color index is still loading.
+        """
+        nc = ObjRegistry.get('nearest-colors')
+        if self.labels is None and nc is not None:
+            p = self.hexes
+            self.labels = [f'{s} ~ {name}' for s, name in zip(p, nc.label(p))]
+        return self.labels or self.hexes
+
+    def swatchAt(self, x):
+        """Index of the swatch at x, or -1."""
+        n = len(self.palette)
+        if n>0 and self.width()>0:
+            return max(0, min(int(x) * n // self.width(), n-1))
+        return -1
+
+    def event(self, event):
+        if event.type() == QEvent.ToolTip:
+            i = self.swatchAt(event.pos().x())
+            if i >= 0:
+                QToolTip.showText(event.globalPos(), self.swatchLabels()[i], self)
+            return True
+        return super().event(event)
+
+    def mousePressEvent(self, event):
+        i = self.swatchAt(event.position().x())
+        if i >= 0 and event.button() == Qt.LeftButton:
+            self.swatchClicked.emit(i)
+
+    def mouseDoubleClickEvent(self, event):
+        i = self.swatchAt(event.position().x())
+        if i >= 0 and event.button() == Qt.LeftButton:
+            self.swatchDoubleClicked.emit(i)
 
     def paintEvent(self, event):
-        self.drawPalette()
-        self.painter.begin(self)
-        self.painter.setPen(QPen(QColor('#000000')))
-        self.painter.end()
+        with metrics.timer('display.paint'):
+            ratio = self.devicePixelRatioF()
+            size = self.size() * ratio
+            pixmap = self.cache.get(self.mode)
+            if pixmap is None or pixmap.size() != size:
+                pixmap = self.cache[self.mode] = QPixmap(size)
+                pixmap.setDevicePixelRatio(ratio)
+                pixmap.fill(Qt.transparent)
+                self.drawPalette(target=pixmap)
+            self.painter.begin(self)
+            self.painter.drawPixmap(0, 0, pixmap)
+            if self.mode is not None:
+                rect = self.painter.boundingRect(self.rect().adjusted(
+                    4, 4, -4, -4), Qt.AlignLeft | Qt.AlignTop, self.mode)
+                self.painter.fillRect(rect.adjusted(-2, 0, 2, 0),
+                                      QColor(255, 255, 255, 192))
+                self.painter.setPen(Qt.black)
+                self.painter.drawText(rect, self.mode)
+            self.painter.end()
 
-    def drawPalette(self, w=None, h=None):
-        self.painter.begin(self)
+    def drawPalette(self, w=None, h=None, target=None):
+        """
+        Paints the swatches as equal-width vertical bars onto target (a
+        QPixmap, QImage or the widget itself) sized w x h, as seen in the
+        current mode.
+        """
+        if target is None:
+            target = self
         if w is None:
             w = self.width()
         if h is None:
             h = self.height()
-        width = w
-        height = h
-        brush = QBrush()
-        brush.setStyle(Qt.SolidPattern)
-        self.painter.setPen(self.nopen)
-        n = len(self.palette)
-        p = self.palette
-        
-        if n>0 and isinstance(p[0], list): 
-            p = hsl2hex(p)
-        for i, s in enumerate(p): 
-            brush.setColor(QColor(s))
-            self.painter.setBrush(brush)
-            self.painter.drawRect(i*width//n, 0, width//n+1, height)
-        self.painter.end()
+        colors = self.shownColors()
+        n = len(colors)
+        painter = QPainter(target)
+        for i, c in enumerate(colors): 
+            painter.fillRect(i*w//n, 0, w//n+1, h, c)
+        painter.end()
+
+
+class ContrastMatrix(QWidget):
+    """
+    Pairwise WCAG contrast of a palette as a grid: cell (i, j) is swatch i
+    on swatch j, colored by the level the pair reaches, or red when it
+    falls short of the selected level. The first row and column show the
+    swatches.
+    """
+    # Fails, then reaches AA Large, AA, AAA; and the diagonal.
+    GRADE_COLORS = np.array([0xFFC62828, 0xFFF9A825, 0xFF9CCC65,
+                             0xFF2E7D32, 0xFF9E9E9E], dtype=np.uint32)
+    def __init__(self):
+        super().__init__()
+        self.setMinimumSize(120, 120)
+        self.hexes = []
+        self.ratios = np.ones((0, 0))
+        self.image = None
+
+    def setContrast(self, hexes, ratios, level):
+        """
+        Shows the contrast matrix ratios of the colors hexes, flagging the
+        pairs below level (an index into contrast.LEVELS, from 1).
+        """
+        self.hexes = hexes
+        self.ratios = ratios
+        n = len(hexes)
+        grades = contrast.grades(ratios)
+        grades[grades < level] = 0
+        grades[np.diag_indices(n)] = 4
+        cells = np.empty((n + 1, n + 1), dtype=np.uint32)
+        cells[0, 0] = 0
+        cells[0, 1:] = cells[1:, 0] = hex2packed(hexes) | 0xFF000000
+        cells[1:, 1:] = self.GRADE_COLORS[grades]
+        self.image = QImage(cells.data, n + 1, n + 1, (n + 1) * 4,
+                            QImage.Format_ARGB32).copy()
+        self.update()
+
+    def cellRect(self):
+        side = min(self.width(), self.height())
+        return (self.width() - side) // 2, (self.height() - side) // 2, side
+
+    def cellAt(self, pos):
+        """(row, column) of the pair under pos, or None."""
+        n = len(self.hexes)
+        x0, y0, side = self.cellRect()
+        if n == 0 or side <= 0:
+            return None
+        i = int((pos.y() - y0) * (n + 1) // side) - 1
+        j = int((pos.x() - x0) * (n + 1) // side) - 1
+        if 0 <= i < n and 0 <= j < n:
+            return i, j
+        return None
+
+    def event(self, event):
+        if event.type() == QEvent.ToolTip:
+            cell = self.cellAt(event.pos())
+            if cell is not None:
+                i, j = cell
+                ratio = self.ratios[i, j]
+                grade = int(contrast.grades(ratio))
+                level = list(contrast.LEVELS)[grade - 1] if grade else 'fail'
+                QToolTip.showText(event.globalPos(),
+                    f'{self.hexes[i]} on {self.hexes[j]}: '
+                    f'{ratio:.2f}:1 ({level})', self)
+            else:
+                QToolTip.hideText()
+            return True
+        return super().event(event)
+
+    def paintEvent(self, event):
+        if self.image is None:
+            return
+        x0, y0, side = self.cellRect()
+        painter = QPainter(self)
+        painter.drawImage(QRect(x0, y0, side, side), self.image)
+        painter.end()
+
+
+class ContrastPanel(QWidget):
+    """
+    WCAG contrast of every pair of swatches of a palette, updated at most
+    once per frame while the palette changes.
+    """
+    def __init__(self):
+        super().__init__()
+        self.hexes = []
+        self.throttle = FrameThrottle(self.refresh, self)
+
+        self.level_cb = QComboBox()
+        self.level_cb.addItems(list(contrast.LEVELS))
+        self.level_cb.setCurrentText('AA')
+        self.level_cb.setStatusTip('WCAG level pairs have to reach')
+        self.level_cb.currentIndexChanged.connect(self.refresh)
+        self.matrix = ContrastMatrix()
+        self.summary = QLabel()
+        self.summary.setWordWrap(True)
+
+        main_layout = QVBoxLayout(self)
+        main_layout.setContentsMargins(0, 0, 0, 0)
+        main_layout.addWidget(self.level_cb)
+        main_layout.addWidget(self.matrix, 1)
+        main_layout.addWidget(self.summary)
+
+    def setPalette(self, hexes):
+        self.hexes = hexes
+        self.throttle.request()
+
+    def refresh(self):
+        with metrics.timer('contrast.panel'):
+            ratios = contrast.contrast_matrix(hex2packed(self.hexes))
+            level = self.level_cb.currentText()
+            self.matrix.setContrast(self.hexes, ratios,
+                                    self.level_cb.currentIndex() + 1)
+            s = contrast.summary(ratios)
+            self.summary.setText(
+                f"{s[level]} of {s['pairs']} pairs pass {level}, "
+                f"{s['pairs'] - s[level]} fail. "
+                f"Best {s['best']:.2f}:1, worst {s['worst']:.2f}:1")
+
+
+class PaletteSearchPanel(QWidget):
+    """
+    Searches palettes by pack and name words and, optionally, by a color
+    they contain, using the 'palette-search' index.
+    """
+    paletteChosen = Signal(str, str)
+    paletteActivated = Signal(str, str)
+    def __init__(self):
+        super().__init__()
+        self.throttle = FrameThrottle(self.runSearch, self)
+        self.initGui()
+
+    def initGui(self):
+        main_layout = QVBoxLayout(self)
+        main_layout.setContentsMargins(0, 0, 0, 0)
+
+        self.text_le = QLineEdit()
+        self.text_le.setPlaceholderText('Search packs and names')
+        self.text_le.setClearButtonEnabled(True)
+        self.text_le.textChanged.connect(self.requestSearch)
+
+        near_layout = QHBoxLayout()
+        self.near_cb = QCheckBox('Near color')
+        self.near_cb.setStatusTip('Only palettes containing a similar color')
+        self.near_cb.toggled.connect(self.requestSearch)
+        self.nearclr = ColorPatch()
+        self.nearclr.colorChanged.connect(self.requestSearch)
+        self.radius_sb = QSpinBox()
+        self.radius_sb.setRange(1, 100)
+        self.radius_sb.setValue(10)
+        self.radius_sb.setPrefix('\u0394E ')
+        self.radius_sb.setStatusTip('Maximum color difference (CIE76)')
+        self.radius_sb.valueChanged.connect(self.requestSearch)
+        near_layout.addWidget(self.near_cb)
+        near_layout.addWidget(self.nearclr)
+        near_layout.addWidget(self.radius_sb)
+        near_layout.addStretch()
+
+        self.results = QListWidget()
+        self.results.currentItemChanged.connect(self.onCurrentChanged)
+        self.results.itemActivated.connect(self.onActivated)
+
+        main_layout.addWidget(self.text_le)
+        main_layout.addLayout(near_layout)
+        main_layout.addWidget(self.results, 1)
+
+    def requestSearch(self):
+        self.throttle.request()
+
+    def runSearch(self):
+        ps = ObjRegistry.get('palette-search')
+        text = self.text_le.text()
+        color = self.nearclr.getHex() if self.near_cb.isChecked() else None
+        if ps is None or (not ps.fts_query(text) and color is None):
+            jobRunner().cancel(self)
+            self.results.clear()
+            return
+        jobRunner().submit(ps.search, text, color, self.radius_sb.value(),
+                           key=self, onResult=self.onResults,
+                           onError=self.onSearchError)
+
+    def onSearchError(self, text):
+        self.results.clear()
+        self.results.setStatusTip(text.strip().splitlines()[-1])
+
+    def onResults(self, rows):
+        self.results.clear()
+        for pack, name, d in rows:
+            label = f'{pack} / {name}'
+            if d is not None:
+                label += f'  (\u0394E {d:.1f})'
+            item = QListWidgetItem(label)
+            item.setData(Qt.UserRole, (pack, name))
+            self.results.addItem(item)
+        self.results.setStatusTip(f'{len(rows)} palettes found')
+
+    def onCurrentChanged(self, item, previous):
+        if item is not None:
+            self.paletteChosen.emit(*item.data(Qt.UserRole))
+
+    def onActivated(self, item):
+        self.paletteActivated.emit(*item.data(Qt.UserRole))
 
 
 class PaletteSelector(QWidget): 
@@ -132,42 +455,79 @@ class PaletteSelector(QWidget):
     def __init__(self):
         super().__init__()
         self.pal = [[0,1,.5], [.333,1,.5], [.666,1,.5]]
-        self.initData()
+        self.repo = None
+        self.current = None
+        self.current_repo = None
         self.initGui()
         ObjRegistry.add('main-palette-selector', self)
 
-    def initData(self):
-        self.pack_mdl = QSqlQueryModel()
-        self.pack_mdl.setQuery('''
-            SELECT DISTINCT pack 
-              FROM palettes ORDER BY pack;''')
-        self.pal_mdl = QSqlQueryModel()
-        self.pal_mdl.setQuery(f"""
-            SELECT pack,name,json 
-              FROM palettes 
-             WHERE pack='nfl' ORDER BY name ASC;""")
-        
+    def setRepository(self, repo):
+        """
+        Loads the pack list from repo (a PaletteRepository or a
+        PaletteStore) in the background.
+        """
+        self.repo = repo
+        self.updateFilter()
+        jobRunner().submit(repo.packs, key=(self, 'packs'),
+                           onResult=self.onPacksLoaded)
+
+    def contrastIndex(self):
+        """The 'palette-contrast' index, if browsing color.db."""
+        index = ObjRegistry.get('palette-contrast')
+        if index is not None and self.repo is not None \
+                and self.repo is ObjRegistry.get('palette-repository'):
+            return index
+        return None
+
+    def updateFilter(self):
+        """Enables the contrast filter once it can be applied."""
+        self.contrast_cb.setEnabled(self.contrastIndex() is not None)
+
+    def onPacksLoaded(self, packs):
+        self.pack_cbox.clear()
+        self.pack_cbox.addItems(packs)
+        self.pack_cbox.setCurrentIndex(0 if packs else -1)
+        self.onPackChange()
 
     def initGui(self):
         self.main_layout = QVBoxLayout(self)
 
         self.pack_cbox = QComboBox()
-        self.pack_cbox.setModel(self.pack_mdl)
-        self.pack_cbox.setModelColumn(0)
         self.pack_cbox.setPlaceholderText('Select Palette Pack')
         self.pack_cbox.setStatusTip('Select Palette Pack')
         self.pack_cbox.activated.connect(self.onPackChange)
 
         self.pal_cbox = QComboBox()
-        self.pal_cbox.setModel(self.pal_mdl)
-        self.pal_cbox.setModelColumn(1)
         self.pal_cbox.setPlaceholderText('Select Palette')
         self.pal_cbox.setStatusTip('Select Palette')
         self.pal_cbox.currentIndexChanged.connect(self.onPalChange)
 
+        self.contrast_cb = QComboBox()
+        self.contrast_cb.addItem('Any contrast', 0.0)
+        for name, level in contrast.LEVELS.items():
+            self.contrast_cb.addItem(f'{name} pair', level)
+        self.contrast_cb.setStatusTip(
+            'Only palettes with a pair of swatches reaching this WCAG level')
+        self.contrast_cb.setEnabled(False)
+        self.contrast_cb.activated.connect(self.onPackChange)
+
+        browse = QWidget()
+        browse_layout = QVBoxLayout(browse)
+        browse_layout.setContentsMargins(0, 0, 0, 0)
         cb_layout = QHBoxLayout()
         cb_layout.addWidget(self.pack_cbox)
         cb_layout.addWidget(self.pal_cbox)
+        browse_layout.addLayout(cb_layout)
+        browse_layout.addWidget(self.contrast_cb)
+        browse_layout.setAlignment(Qt.AlignTop)
+
+        self.search = PaletteSearchPanel()
+        self.search.paletteChosen.connect(self.onSearchChosen)
+        self.search.paletteActivated.connect(self.onSearchActivated)
+
+        self.tabs = QTabWidget()
+        self.tabs.addTab(browse, 'Browse')
+        self.tabs.addTab(self.search, 'Search')
 
         btn_layout = QHBoxLayout()
         btn1 = QPushButton("Copy")
@@ -179,27 +539,58 @@ class PaletteSelector(QWidget):
         
         #self.main_layout.addWidget(self.pack_cbox,1)
         #self.main_layout.addWidget(self.pal_cbox,1)
-        self.main_layout.addLayout(cb_layout)
+        self.main_layout.addWidget(self.tabs,1)
         self.pd = PaletteDisplay()
         self.pd.setPalette(self.pal)
         self.main_layout.addWidget(self.pd,1)
         self.main_layout.addLayout(btn_layout)
-        self.onPackChange()
 
     def onPackChange(self):
+        if self.repo is None:
+            return
         pack = self.pack_cbox.currentText()
-        self.pal_mdl.setQuery(f"""
-            SELECT pack, name, json
-              FROM palettes
-             WHERE pack='{pack}' ORDER BY name;
-        """)
-        if self.pal_mdl.lastError().isValid():
-            print(self.pal_mdl.lastError())
+        level = self.contrast_cb.currentData()
+        index = self.contrastIndex()
+        if level and index is not None:
+            jobRunner().submit(index.names, pack, level, key=(self, 'names'),
+                               onResult=self.onNamesLoaded)
+        else:
+            jobRunner().submit(self.repo.names, pack, key=(self, 'names'),
+                               onResult=self.onNamesLoaded)
+
+    def onNamesLoaded(self, names):
+        self.pal_cbox.clear()
+        self.pal_cbox.addItems(names)
+
+    def loadCurrent(self, key, onResult):
+        """Fetches the current palette in the background."""
+        if self.current_repo is None or self.current is None:
+            return
+        jobRunner().submit(self.current_repo.packed, *self.current,
+                           key=(self, key), onResult=onResult)
 
     def onPalChange(self):
-        rcd = self.pal_mdl.record(self.pal_cbox.currentIndex())
-        pal = json.loads(rcd.value(2))
-        self.pd.setPalette(pal)
+        self.current = None
+        self.current_repo = self.repo
+        if self.pal_cbox.currentIndex() >= 0:
+            self.current = (self.pack_cbox.currentText(),
+                            self.pal_cbox.currentText())
+        self.loadCurrent('preview', self.onPreviewLoaded)
+
+    def onSearchChosen(self, pack, name):
+        # Search results always come from color.db.
+        self.current = (pack, name)
+        self.current_repo = ObjRegistry.get('palette-repository')
+        self.loadCurrent('preview', self.onPreviewLoaded)
+
+    def onSearchActivated(self, pack, name):
+        self.current = (pack, name)
+        self.current_repo = ObjRegistry.get('palette-repository')
+        self.onSelect()
+
+    def onPreviewLoaded(self, pal):
+        if pal is not None:
+            self.pd.setPalette(pal)
         #print(pal)
 
     def onCopy(self):
@@ -207,18 +598,23 @@ class PaletteSelector(QWidget):
         clipboard.setText(json.dumps(self.pd.palette))
 
     def onSelect(self):
-        rcd = self.pal_mdl.record(self.pal_cbox.currentIndex())
-        pal = json.loads(rcd.value(2))
-        self.paletteSelected.emit(pal)
+        self.loadCurrent('select', self.onSelectLoaded)
+
+    def onSelectLoaded(self, pal):
+        if pal is not None:
+            self.paletteSelected.emit(packed2hex(pal))
 
 
 class RandMixTool(QWidget):
     """RandomMixTool"""
     paletteCreated = Signal(list)
+    palettePreviewed = Signal(list)
     def __init__(self):
         super().__init__()
         self.baseclr = ColorPatch()
         self.clrmode = ColorModeCB() 
+        self.stream = None
+        self.throttle = FrameThrottle(self.onPreview, self)
 
         main_layout = QVBoxLayout(self)
 #        main_layout.addWidget(QLabel('Random Mix'),0, Qt.AlignCenter)
@@ -256,12 +652,22 @@ class RandMixTool(QWidget):
         row2_layout.setStretch(0,1)
         row2_layout.setStretch(1,1)
 
-        create_btn = QPushButton("Create")
-        create_btn.clicked.connect(self.onCreate)
+        self.create_btn = QPushButton("Create")
+        self.create_btn.clicked.connect(self.onCreate)
+        self.live_cb = QCheckBox('Live')
+        self.live_cb.setChecked(True)
+        self.live_cb.setStatusTip('Update the palette as the controls move')
+        btn_layout = QHBoxLayout()
+        btn_layout.addWidget(self.live_cb)
+        btn_layout.addWidget(self.create_btn, 1)
+        self.sizesl.valueChanged.connect(self.requestPreview)
+        self.cw_dial.valueChanged.connect(self.requestPreview)
+        self.baseclr.colorChanged.connect(self.requestPreview)
+        self.clrmode.currentIndexChanged.connect(self.requestPreview)
         main_layout.addLayout(row1_layout)
         main_layout.addLayout(row2_layout)
         main_layout.addLayout(row3_layout)
-        main_layout.addWidget(create_btn)
+        main_layout.addLayout(btn_layout)
         main_layout.addStretch()
         self.setLayout(main_layout)
         
@@ -270,22 +676,61 @@ class RandMixTool(QWidget):
         weight = self.cw_dial.value()/100
         base = self.baseclr.getHex()
         mode = self.clrmode.currentText()
-        if mode == 'HSL':
-            base = hex2hsl(base)
-            palette = hsl2hex(randmix_palette(n, base, weight))
-        elif mode == 'HSV':
-            base = hex2hsv(base)
-            palette = hsv2hex(randmix_palette(n, base, weight))
-        elif mode == 'RGB': 
-            base = hex2rgb(base)
-            palette = rgb2hex(randmix_palette(n, base, weight))
+        self.seed = new_seed()
+        self.stream = PaletteStream('randmix', self.seed)
+        self.recipe = dict(tool='randmix', n=n, base=base, mode=mode,
+                           amount=weight, seed=self.seed)
+        self.create_btn.setStatusTip(f'Create (last seed: {self.seed})')
+        self.create_start = time.perf_counter()
+        jobRunner().submit(generate, key=self, onResult=self.onCreated,
+                           **self.recipe)
+
+    def onCreated(self, palette):
+        metrics.record('tool.create', self.create_start)
         self.palette = palette
         self.paletteCreated.emit(self.palette)
 
+    def params(self):
+        """The control values, for saving in a project."""
+        return dict(mode=self.clrmode.currentText(),
+                    weight=self.cw_dial.value(), size=self.sizesl.value(),
+                    base=self.baseclr.getHex(), live=self.live_cb.isChecked())
+
+    def setParams(self, params):
+        """Sets the controls from params() without previewing."""
+        self.live_cb.setChecked(False)
+        self.clrmode.setCurrentText(params.get('mode', 'RGB'))
+        self.cw_dial.setValue(params.get('weight', 50))
+        self.sizesl.setValue(params.get('size', 1))
+        self.baseclr.setColor(params.get('base', '#FF00FF'))
+        self.live_cb.setChecked(params.get('live', True))
+
+    def requestPreview(self):
+        if self.live_cb.isChecked():
+            self.throttle.request()
+
+    def onPreview(self):
+        """
+        Updates the palette from the current controls, continuing the
+        seeded stream of the last Create.
+        """
+        n = self.sizesl.value()
+        weight = self.cw_dial.value()/100
+        base = self.baseclr.getHex()
+        mode = self.clrmode.currentText()
+        if self.stream is None:
+            self.stream = PaletteStream('randmix', new_seed())
+        self.seed = self.stream.seed
+        self.recipe = dict(tool='randmix', n=n, base=base, mode=mode,
+                           amount=weight, seed=self.seed)
+        self.palette = self.stream.palette(n, base, mode, weight)
+        self.palettePreviewed.emit(self.palette)
+
 
 class OffsetPalTool(QWidget):
     """OffsetPalTool"""
     paletteCreated = Signal(list)
+    palettePreviewed = Signal(list)
     def __init__(self):
         super().__init__()
         self.baseclr = ColorPatch()
@@ -294,6 +739,8 @@ class OffsetPalTool(QWidget):
         self.edgefun = EdgeFuncCB()
         self.rngdial = NormDial()
         self.sizesld = PaletteSizeSlider()
+        self.stream = None
+        self.throttle = FrameThrottle(self.onPreview, self)
 
         main_layout = QVBoxLayout(self)
 #        main_layout.addWidget(QLabel('Offset Palette'),0, Qt.AlignCenter)
@@ -335,13 +782,25 @@ class OffsetPalTool(QWidget):
         row2_layout.addLayout(rg_layout)
         row2_layout.addLayout(bc_layout)
         row2_layout.setStretch(0,1)
-        create_btn = QPushButton("Create")
-        create_btn.clicked.connect(self.onCreate)
+        self.create_btn = QPushButton("Create")
+        self.create_btn.clicked.connect(self.onCreate)
+        self.live_cb = QCheckBox('Live')
+        self.live_cb.setChecked(True)
+        self.live_cb.setStatusTip('Update the palette as the controls move')
+        btn_layout = QHBoxLayout()
+        btn_layout.addWidget(self.live_cb)
+        btn_layout.addWidget(self.create_btn, 1)
+        self.sizesld.valueChanged.connect(self.requestPreview)
+        self.rngdial.valueChanged.connect(self.requestPreview)
+        self.baseclr.colorChanged.connect(self.requestPreview)
+        self.clrmode.currentIndexChanged.connect(self.requestPreview)
+        self.offtype.currentIndexChanged.connect(self.requestPreview)
+        self.edgefun.currentIndexChanged.connect(self.requestPreview)
         main_layout.addLayout(row1_layout)
         main_layout.addLayout(row1b_layout)
         main_layout.addLayout(row2_layout)
         main_layout.addLayout(row3_layout)
-        main_layout.addWidget(create_btn)
+        main_layout.addLayout(btn_layout)
         main_layout.addStretch()
         self.setLayout(main_layout)
         
@@ -352,25 +811,271 @@ class OffsetPalTool(QWidget):
         mode = self.clrmode.currentText()
         offset = self.offtype.currentText()
         edge = self.edgefun.currentText()
-        
-        edgefn = clamp01
-        if edge == 'Reflect':
-            edgefn = reflect
-
-        palette_generator = random_offset_palette
-        if offset == 'Value':
-            palette_generator = value_offset_palette
-
-        if mode == 'HSL':
-            base = hex2hsl(base)
-            palette = hsl2hex(palette_generator(n, base, rng, edgefn))
-        elif mode == 'HSV':
-            base = hex2hsv(base)
-            palette = hsv2hex(palette_generator(n, base, rng, edgefn))
-        elif mode == 'RGB': 
-            base = hex2rgb(base)
-            palette = rgb2hex(palette_generator(n, base, rng, edgefn))
+        self.seed = new_seed()
+        self.stream = PaletteStream('offset', self.seed, offset)
+        self.recipe = dict(tool='offset', n=n, base=base, mode=mode,
+                           amount=rng, offset=offset, edge=edge,
+                           seed=self.seed)
+        self.create_btn.setStatusTip(f'Create (last seed: {self.seed})')
+        self.create_start = time.perf_counter()
+        jobRunner().submit(generate, key=self, onResult=self.onCreated,
+                           **self.recipe)
 
+    def onCreated(self, palette):
+        metrics.record('tool.create', self.create_start)
         self.palette = palette
         self.paletteCreated.emit(self.palette)
 
+    def params(self):
+        """The control values, for saving in a project."""
+        return dict(mode=self.clrmode.currentText(),
+                    offset=self.offtype.currentText(),
+                    edge=self.edgefun.currentText(),
+                    range=self.rngdial.value(), size=self.sizesld.value(),
+                    base=self.baseclr.getHex(), live=self.live_cb.isChecked())
+
+    def setParams(self, params):
+        """Sets the controls from params() without previewing."""
+        self.live_cb.setChecked(False)
+        self.clrmode.setCurrentText(params.get('mode', 'RGB'))
+        self.offtype.setCurrentText(params.get('offset', 'Random'))
+        self.edgefun.setCurrentText(params.get('edge', 'Clamp'))
+        self.rngdial.setValue(params.get('range', 50))
+        self.sizesld.setValue(params.get('size', 1))
+        self.baseclr.setColor(params.get('base', '#FF00FF'))
+        self.live_cb.setChecked(params.get('live', True))
+
+    def requestPreview(self):
+        if self.live_cb.isChecked():
+            self.throttle.request()
+
+    def onPreview(self):
+        """
+        Updates the palette from the current controls, continuing the
+        seeded stream of the last Create.
+        """
+        n = self.sizesld.value()
+        rng = self.rngdial.value()/100
+        base = self.baseclr.getHex()
+        mode = self.clrmode.currentText()
+        offset = self.offtype.currentText()
+        edge = self.edgefun.currentText()
+        if self.stream is None:
+            self.stream = PaletteStream('offset', new_seed(), offset)
+        elif self.stream.offset != offset:
+            # Value offsets draw one number per swatch, random offsets three.
+            self.stream = PaletteStream('offset', self.stream.seed, offset)
+        self.seed = self.stream.seed
+        self.recipe = dict(tool='offset', n=n, base=base, mode=mode,
+                           amount=rng, offset=offset, edge=edge,
+                           seed=self.seed)
+        self.palette = self.stream.palette(n, base, mode, rng, edge)
+        self.palettePreviewed.emit(self.palette)
+
+
+
+class ImagePalTool(QWidget):
+    """Extracts the dominant colors of an image."""
+    paletteCreated = Signal(list)
+    palettePreviewed = Signal(list)
+    # Extracted palettes are kept as colors, not regenerated.
+    recipe = None
+    def __init__(self):
+        super().__init__()
+        self.path = None
+        self.samples = None
+        self.seed = None
+        self.throttle = FrameThrottle(self.onPreview, self)
+
+        main_layout = QVBoxLayout(self)
+        row1_layout = QHBoxLayout()
+        self.open_btn = QPushButton('Image...')
+        self.open_btn.clicked.connect(self.onOpen)
+        self.file_label = QLabel('No image')
+        row1_layout.addWidget(self.open_btn)
+        row1_layout.addWidget(self.file_label, 1)
+
+        self.thumb = QLabel()
+        self.thumb.setAlignment(Qt.AlignCenter)
+        self.thumb.setMinimumHeight(80)
+
+        row3_layout = QHBoxLayout()
+        label_ps = QLabel('Size:')
+        row3_layout.addWidget(label_ps)
+        self.sizesl = PaletteSizeSlider()
+        self.sizesl.setValue(5)
+        row3_layout.addWidget(self.sizesl)
+
+        self.create_btn = QPushButton("Create")
+        self.create_btn.clicked.connect(self.onCreate)
+        self.create_btn.setEnabled(False)
+        self.live_cb = QCheckBox('Live')
+        self.live_cb.setChecked(True)
+        self.live_cb.setStatusTip('Update the palette as the size changes')
+        btn_layout = QHBoxLayout()
+        btn_layout.addWidget(self.live_cb)
+        btn_layout.addWidget(self.create_btn, 1)
+        self.sizesl.valueChanged.connect(self.requestPreview)
+        main_layout.addLayout(row1_layout)
+        main_layout.addWidget(self.thumb, 1)
+        main_layout.addLayout(row3_layout)
+        main_layout.addLayout(btn_layout)
+        self.setLayout(main_layout)
+
+    def onOpen(self):
+        path, _ = QFileDialog.getOpenFileName(self, 'Open Image', '',
+            'Images (*.png *.jpg *.jpeg *.bmp *.gif *.webp *.tif *.tiff)')
+        if path:
+            self.loadImage(path)
+
+    def loadImage(self, path):
+        """Decodes and samples the image at path in the background."""
+        self.path = path
+        self.samples = None
+        self.create_btn.setEnabled(False)
+        self.file_label.setText(os.path.basename(path))
+        self.file_label.setToolTip(path)
+        jobRunner().submit(self.loadJob, path, key=(self, 'load'),
+                           onResult=self.onLoaded, onError=self.onLoadError)
+
+    @staticmethod
+    def loadJob(path):
+        return imgpal.sample(imgpal.load_pixels(path)), \
+            imgpal.thumbnail(path)
+
+    def onLoaded(self, result):
+        self.samples, thumb = result
+        self.thumb.setPixmap(QPixmap.fromImage(thumb))
+        self.create_btn.setEnabled(True)
+        self.requestPreview()
+
+    def onLoadError(self, text):
+        self.path = None
+        self.file_label.setText('No image')
+        self.thumb.clear()
+        self.file_label.setToolTip(text.strip().splitlines()[-1])
+
+    def onCreate(self):
+        if self.samples is None:
+            return
+        self.seed = new_seed()
+        self.create_btn.setStatusTip(f'Create (last seed: {self.seed})')
+        self.create_start = time.perf_counter()
+        jobRunner().submit(imgpal.palette, self.samples, self.sizesl.value(),
+                           self.seed, key=self, onResult=self.onCreated)
+
+    def onCreated(self, palette):
+        metrics.record('tool.create', self.create_start)
+        self.palette = palette
+        self.paletteCreated.emit(self.palette)
+
+    def params(self):
+        """The control values, for saving in a project."""
+        return dict(path=self.path, size=self.sizesl.value(),
+                    live=self.live_cb.isChecked())
+
+    def setParams(self, params):
+        """Sets the controls from params() without previewing."""
+        self.live_cb.setChecked(False)
+        self.sizesl.setValue(params.get('size', 5))
+        self.live_cb.setChecked(params.get('live', True))
+        path = params.get('path')
+        if path and os.path.exists(path) and path != self.path:
+            self.loadImage(path)
+
+    def requestPreview(self):
+        if self.live_cb.isChecked() and self.samples is not None:
+            self.throttle.request()
+
+    def onPreview(self):
+        """Re-clusters the sampled pixels for the current size."""
+        if self.seed is None:
+            self.seed = new_seed()
+        jobRunner().submit(imgpal.palette, self.samples, self.sizesl.value(),
+                           self.seed, key=(self, 'preview'),
+                           onResult=self.palettePreviewed.emit)
+
+
+class HarmonyTool(QWidget):
+    """Builds a color harmony scheme around the base color."""
+    paletteCreated = Signal(list)
+    palettePreviewed = Signal(list)
+    # Schemes are cheap and exact; they are kept as colors.
+    recipe = None
+    def __init__(self):
+        super().__init__()
+        self.baseclr = ColorPatch()
+        self.clrmode = ColorModeCB()
+        self.clrmode.setCurrentText('HSL')
+        self.scheme_cb = QComboBox()
+        self.scheme_cb.addItems(harmony.SCHEMES)
+        self.scheme_cb.setStatusTip('Hue angles of the scheme, turned in '
+                                    'the color mode')
+        self.throttle = FrameThrottle(self.onPreview, self)
+
+        main_layout = QVBoxLayout(self)
+        row1_layout = QHBoxLayout()
+        row1_layout.addWidget(QLabel('Color Mode:'))
+        row1_layout.addWidget(self.clrmode)
+
+        row1b_layout = QHBoxLayout()
+        row1b_layout.addWidget(QLabel('Scheme:'))
+        row1b_layout.addWidget(self.scheme_cb, 1)
+
+        bc_layout = QVBoxLayout()
+        label_bc = QLabel('Base')
+        label_bc.setAlignment(Qt.AlignCenter)
+        bc_layout.addWidget(self.baseclr, 0, Qt.AlignCenter)
+        bc_layout.addWidget(label_bc)
+
+        self.create_btn = QPushButton("Create")
+        self.create_btn.clicked.connect(self.onCreate)
+        self.live_cb = QCheckBox('Live')
+        self.live_cb.setChecked(True)
+        self.live_cb.setStatusTip('Update the palette as the controls change')
+        btn_layout = QHBoxLayout()
+        btn_layout.addWidget(self.live_cb)
+        btn_layout.addWidget(self.create_btn, 1)
+        self.baseclr.colorChanged.connect(self.requestPreview)
+        self.clrmode.currentIndexChanged.connect(self.requestPreview)
+        self.scheme_cb.currentIndexChanged.connect(self.requestPreview)
+        main_layout.addLayout(row1_layout)
+        main_layout.addLayout(row1b_layout)
+        main_layout.addLayout(bc_layout)
+        main_layout.addLayout(btn_layout)
+        main_layout.addStretch()
+        self.setLayout(main_layout)
+
+    def scheme(self):
+        """The scheme of the current controls, as hex strings."""
+        return harmony.harmony(self.baseclr.getHex(),
+                               self.scheme_cb.currentText(),
+                               self.clrmode.currentText())
+
+    def onCreate(self):
+        self.create_start = time.perf_counter()
+        self.palette = self.scheme()
+        metrics.record('tool.create', self.create_start)
+        self.paletteCreated.emit(self.palette)
+
+    def params(self):
+        """The control values, for saving in a project."""
+        return dict(mode=self.clrmode.currentText(),
+                    scheme=self.scheme_cb.currentText(),
+                    base=self.baseclr.getHex(), live=self.live_cb.isChecked())
+
+    def setParams(self, params):
+        """Sets the controls from params() without previewing."""
+        self.live_cb.setChecked(False)
+        self.clrmode.setCurrentText(params.get('mode', 'HSL'))
+        self.scheme_cb.setCurrentText(params.get('scheme', 'Complementary'))
+        self.baseclr.setColor(params.get('base', '#FF00FF'))
+        self.live_cb.setChecked(params.get('live', True))
+
+    def requestPreview(self):
+        if self.live_cb.isChecked():
+            self.throttle.request()
+
+    def onPreview(self):
+        self.palette = self.scheme()
+        self.palettePreviewed.emit(self.palette)
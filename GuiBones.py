@@ -1,9 +1,10 @@
 
 from PySide6.QtWidgets import ( QColorDialog, QPushButton, QSizePolicy)
 from PySide6.QtGui import ( QColor, )
-from PySide6.QtCore import ( QSize, )
+from PySide6.QtCore import ( QSize, Signal, )
 
 class ColorPatch(QPushButton):
+    colorChanged = Signal(str)
 
     def __init__(self):
         super().__init__()
@@ -31,9 +32,15 @@ class ColorPatch(QPushButton):
         if color.isValid():
             self.color = color.name()
             self.setStyleSheet(f'background-color: {self.color}; border: none;')
+            self.colorChanged.emit(self.color)
         else: 
             pass
 
+    def setColor(self, color):
+        """Shows color (a hex string) without emitting colorChanged."""
+        self.color = color
+        self.setStyleSheet(f'background-color: {self.color}; border: none;')
+
     def getHex(self):
         return self.color
 
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""
+Scrolling the palette browser.
+
+Usage: python bench/bench_browser.py [--pack brands] [--passes 3]
+
+Opens the PaletteBrowser on the offscreen QPA platform, then scrolls the
+pack from top to bottom one page step per frame, rendering the view each
+step, for both the list and the grid layout. Reports frame times against
+the 60 fps budget (16.7 ms) and the process RSS after every pass, which
+should stay flat once the thumbnail cache is full.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PySide6.QtWidgets import QApplication
+
+from CWBrowser import PaletteBrowser
+from palrepo import PaletteRepository
+
+
+def rss_mb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+
+
+def scroll(app, browser):
+    """Scrolls to the end a page at a time; returns the frame times."""
+    bar = browser.view.verticalScrollBar()
+    bar.setValue(0)
+    times = []
+    while True:
+        t0 = time.perf_counter()
+        bar.setValue(bar.value() + bar.pageStep())
+        app.processEvents()
+        browser.view.viewport().grab()
+        times.append((time.perf_counter() - t0) * 1e3)
+        if bar.value() >= bar.maximum() and not browser.model.canFetchMore():
+            return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--pack', default='brands')
+    parser.add_argument('--passes', type=int, default=3)
+    args = parser.parse_args()
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    browser = PaletteBrowser()
+    browser.model.setPack(PaletteRepository('color.db'), args.pack)
+    browser.show()
+    app.processEvents()
+    for grid in (False, True):
+        browser.setGrid(grid)
+        for p in range(args.passes):
+            times = sorted(scroll(app, browser))
+            print(f"{'grid' if grid else 'list'} pass {p + 1}: "
+                  f'{browser.model.rowCount()} rows, {len(times)} frames, '
+                  f'p50 {times[len(times) // 2]:.2f} ms, '
+                  f'p95 {times[int(len(times) * 0.95)]:.2f} ms, '
+                  f'max {times[-1]:.2f} ms, rss {rss_mb():.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""
+Frames per second of PaletteDisplay while the window is being resized.
+
+Usage: python bench/bench_display.py [--frames 300]
+
+Runs headless on the offscreen QPA platform. For palettes of 1, 50 and
+250 colors it reports:
+
+    resize   every frame has a new size, so the swatch cache is rebuilt
+    static   same size every frame, so only the cached pixmap is blitted
+    direct   drawPalette() into a QImage every frame (the uncached cost)
+"""
+
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from PySide6.QtGui import QImage
+from PySide6.QtWidgets import QApplication
+
+from CWWidgets import PaletteDisplay
+from vconv import packed2hex
+
+
+def fps(frames, fn):
+    t0 = time.perf_counter()
+    for i in range(frames):
+        fn(i)
+    return frames / (time.perf_counter() - t0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--frames', type=int, default=300)
+    args = parser.parse_args()
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    pd = PaletteDisplay()
+    pd.resize(800, 200)
+    pd.show()
+    app.processEvents()
+    image = QImage(800, 200, QImage.Format_ARGB32_Premultiplied)
+    rng = np.random.default_rng(0)
+
+    def resize(i):
+        pd.resize(600 + i % 400, 150 + i % 100)
+        pd.repaint()
+
+    def static(i):
+        pd.repaint()
+
+    def direct(i):
+        pd.drawPalette(800, 200, target=image)
+
+    print(f"{'colors':>6} {'resize':>10} {'static':>10} {'direct':>10}")
+    for n in (1, 50, 250):
+        pd.setPalette(packed2hex(rng.integers(0, 1 << 24, n, dtype=np.uint32)))
+        rates = [fps(args.frames, fn) for fn in (resize, static, direct)]
+        print(f'{n:>6}' + ''.join(f'{r:>10.0f}' for r in rates))
+
+
+if __name__ == '__main__':
+    main()
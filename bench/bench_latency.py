@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""
+GUI event loop latency while background jobs run.
+
+Usage: python bench/bench_latency.py [--seconds 5]
+
+Builds the main window on the offscreen QPA platform and keeps the job
+pool busy with size-250 RGB generations (as from repeated Create clicks)
+and palette queries for the whole run, while a LatencyMonitor measures
+how late the event loop services a 5 ms timer. The budget is one 60 Hz
+frame, 16 ms.
+"""
+
+import argparse
+import os
+import sys
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PySide6.QtCore import QTimer
+from PySide6.QtWidgets import QApplication
+
+import CWExplorer
+from CWJobs import LatencyMonitor, jobRunner
+from objregistry import ObjRegistry
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--seconds', type=float, default=5.0)
+    args = parser.parse_args()
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    window = CWExplorer.MainWindow()
+    randmix = window.work_area.stack.widget(0)
+    randmix.sizesl.setValue(250)
+    randmix.clrmode.setCurrentText('RGB')
+    selector = ObjRegistry.get('main-palette-selector')
+    monitor = LatencyMonitor()
+    counts = {'created': 0, 'clicks': 0}
+    randmix.paletteCreated.connect(
+        lambda p: counts.__setitem__('created', counts['created'] + 1))
+
+    def click():
+        counts['clicks'] += 1
+        randmix.onCreate()
+        if selector.pal_cbox.count():
+            selector.pal_cbox.setCurrentIndex(
+                counts['clicks'] % selector.pal_cbox.count())
+
+    clicker = QTimer()
+    clicker.timeout.connect(click)
+    clicker.start(2)
+    monitor.start()
+    QTimer.singleShot(int(args.seconds * 1000), lambda: app.exit(0))
+    app.exec()
+    clicker.stop()
+    monitor.stop()
+    jobRunner().waitForDone()
+
+    s = monitor.stats()
+    print(f"clicks {counts['clicks']}, palettes delivered "
+          f"{counts['created']}")
+    print(f"latency ms: p50 {s['p50']:.2f}  p95 {s['p95']:.2f}  "
+          f"max {s['max']:.2f}  ({s['count']} samples)")
+    print('OK' if s['p95'] < 16 else 'OVER BUDGET')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""
+Throughput of the vectorized palette generators in palgen.
+
+Usage: python bench/bench_palgen.py [-k 10000] [-n 250]
+
+Generates k palettes of n colors in one call for every generator and
+reports the time for the (k, n, 3) array alone and including conversion
+to packed RGB. The scalar colorways generators are timed on k/100
+palettes for comparison.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import palgen
+
+CASES = [
+    ('randmix', 'Random', 'Clamp'),
+    ('offset', 'Random', 'Clamp'),
+    ('offset', 'Random', 'Reflect'),
+    ('offset', 'Value', 'Clamp'),
+    ('offset', 'Value', 'Reflect'),
+]
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+def scalar(tool, offset, edge, k, n, base):
+    import colorways
+    fn = {
+        'Random': colorways.random_offset_palette,
+        'Value': colorways.value_offset_palette,
+    }[offset]
+    edgefn = {'Clamp': colorways.clamp01, 'Reflect': colorways.reflect}[edge]
+    for _ in range(k):
+        if tool == 'randmix':
+            colorways.randmix_palette(n, base, 0.5)
+        else:
+            fn(n, base, 0.5, edgefn)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('-k', type=int, default=10000)
+    parser.add_argument('-n', type=int, default=250)
+    args = parser.parse_args()
+    k, n = args.k, args.n
+    base = [0.3, 0.6, 0.5]
+    print(f"{'generator':<22} {'array s':>9} {'packed s':>9} "
+          f"{'colorways s':>12}  (scalar time scaled to k)")
+    for tool, offset, edge in CASES:
+        rng = palgen.make_rng(0)
+        t_arr = timed(lambda: palgen.generate_array(
+            tool, k, n, base, 0.5, offset, edge, rng))
+        t_pk = timed(lambda: palgen.from_mode('HSL', palgen.generate_array(
+            tool, k, n, base, 0.5, offset, edge, rng)))
+        try:
+            t_sc = timed(lambda: scalar(tool, offset, edge, k // 100, n,
+                                        base)) * 100
+        except ImportError:
+            t_sc = float('nan')
+        name = tool if tool == 'randmix' else f'{offset}/{edge}'
+        print(f'{name:<22} {t_arr:>9.3f} {t_pk:>9.3f} {t_sc:>12.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+"""
+Cost of live preview updates with palgen.PaletteStream.
+
+Usage: python bench/bench_preview.py [-n 250]
+
+Replays a slider drag from 1 to n swatches and back, and a dial sweep
+over the amount at n swatches, once regenerating every palette from
+scratch with generate() and once with a PaletteStream.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import palgen
+
+CASES = [
+    ('randmix', 'Random', 'Clamp'),
+    ('offset', 'Random', 'Reflect'),
+    ('offset', 'Value', 'Clamp'),
+]
+
+
+def drag(n):
+    """(size, amount) pairs of a slider drag followed by a dial sweep."""
+    sizes = list(range(1, n + 1)) + list(range(n, 0, -1))
+    return [(s, 0.5) for s in sizes] + [(n, a / 100) for a in range(101)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('-n', type=int, default=250)
+    args = parser.parse_args()
+    steps = drag(args.n)
+    base, mode, seed = '#336699', 'HSL', 1
+    for tool, offset, edge in CASES:
+        t0 = time.perf_counter()
+        for n, amount in steps:
+            palgen.generate(tool, n, base, mode, amount, offset, edge, seed)
+        scratch = time.perf_counter() - t0
+        stream = palgen.PaletteStream(tool, seed, offset)
+        t0 = time.perf_counter()
+        for n, amount in steps:
+            stream.palette(n, base, mode, amount, edge)
+        live = time.perf_counter() - t0
+        print(f'{tool:8s} {offset:7s} {edge:8s} '
+              f'scratch {scratch / len(steps) * 1e6:7.1f} us/update  '
+              f'stream {live / len(steps) * 1e6:7.1f} us/update')
+
+
+if __name__ == '__main__':
+    main()
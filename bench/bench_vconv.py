@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""
+Throughput of the vectorized conversions in vconv.
+
+Usage: python bench/bench_vconv.py [--max-exp 7] [--scalar-max-exp 5]
+
+Each size from 10^3 up to 10^max-exp is run through the packed/array
+pipelines and reported in million colors per second. Hex string round
+trips allocate one Python str per color, so they are included too. The
+scalar colorways path is timed up to 10^scalar-max-exp for comparison.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import vconv
+
+
+def best_of(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def cases(n, rng):
+    packed = rng.integers(0, 1 << 24, n, dtype=np.uint32)
+    rgb = vconv.packed2rgb(packed)
+    hsl = vconv.rgb_to_hsl(rgb)
+    hsv = vconv.rgb_to_hsv(rgb)
+    hexes = vconv.packed2hex(packed)
+    return [
+        ('packed->rgb', lambda: vconv.packed2rgb(packed)),
+        ('rgb->packed', lambda: vconv.rgb2packed(rgb)),
+        ('rgb->hsl', lambda: vconv.rgb_to_hsl(rgb)),
+        ('hsl->rgb', lambda: vconv.hsl_to_rgb(hsl)),
+        ('rgb->hsv', lambda: vconv.rgb_to_hsv(rgb)),
+        ('hsv->rgb', lambda: vconv.hsv_to_rgb(hsv)),
+        ('hex->packed', lambda: vconv.hex2packed(hexes)),
+        ('packed->hex', lambda: vconv.packed2hex(packed)),
+        ('hex->hsl (lists)', lambda: vconv.hex2hsl(hexes)),
+    ]
+
+
+def scalar_cases(n, rng):
+    import colorways
+    hexes = vconv.packed2hex(rng.integers(0, 1 << 24, n, dtype=np.uint32))
+    hsl = colorways.hex2hsl(hexes)
+    return [
+        ('colorways hex2hsl', lambda: colorways.hex2hsl(hexes)),
+        ('colorways hsl2hex', lambda: colorways.hsl2hex(hsl)),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--max-exp', type=int, default=7)
+    parser.add_argument('--scalar-max-exp', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'case':<20} {'n':>10} {'seconds':>10} {'Mcolors/s':>10}")
+    for exp in range(3, args.max_exp + 1):
+        n = 10 ** exp
+        todo = cases(n, rng)
+        if exp <= args.scalar_max_exp:
+            try:
+                todo += scalar_cases(n, rng)
+            except ImportError:
+                pass
+        for name, fn in todo:
+            t = best_of(fn, args.repeat)
+            print(f'{name:<20} {n:>10} {t:>10.4f} {n / t / 1e6:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,383 @@
+#!/usr/bin/env python
+"""
+Benchmark suite with stored baselines.
+
+Usage: python bench/suite.py [-k FILTER] [--save] [--threshold 0.25]
+
+Times every case below headless (QT_QPA_PLATFORM=offscreen) and compares
+the median against bench/baseline.json. A case is flagged as a
+regression when it is more than --threshold slower than its baseline
+(and slower by more than a microsecond, to ignore timer noise); the exit
+status is 1 if any case regressed. --save writes the results as the new
+baseline. Baselines are only comparable on the same machine.
+
+Cases:
+
+    convert.*   color conversions behind the generator tools (vconv), and
+                the colorways functions they replaced, when installed
+    generate.*  the three palette generators at 1 to 250 colors (HSL), and
+                at 250 colors in OKLCH
+    contrast.*  the pairwise WCAG contrast of a 250-color palette
+    cvd.*       color vision deficiency simulation of 250 colors
+    sort.*      ordering 250 swatches along a short path (palsort)
+    harmony.*   all five harmony schemes of 40k base colors
+    db.*        pack, name and palette queries against color.db, with
+                and without the repository cache, and importing a 10k-row
+                CSV color list into a scratch database
+    draw.*      PaletteDisplay.drawPalette() into a QImage
+    export.*    a swatch sheet PNG as palexport writes it
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BASELINE = os.path.join(ROOT, 'bench', 'baseline.json')
+
+SIZES = [1, 10, 50, 250]
+GENERATORS = [
+    ('randmix', 'Random'),
+    ('offset', 'Random'),
+    ('offset', 'Value'),
+]
+
+CASES = {}
+
+
+def case(name):
+    """Registers a setup function returning the callable to time."""
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+
+### Conversions
+
+def _hexes(n, seed=0):
+    import numpy as np
+    from vconv import packed2hex
+    rng = np.random.default_rng(seed)
+    return packed2hex(rng.integers(0, 1 << 24, n, dtype=np.uint32))
+
+
+for _mode in ('RGB', 'HSL', 'HSV', 'OKLab', 'OKLCH'):
+    @case(f'convert.to_{_mode.lower()}.250')
+    def _(mode=_mode):
+        from palgen import to_mode
+        hexes = _hexes(250)
+        return lambda: to_mode(mode, hexes)
+
+    @case(f'convert.from_{_mode.lower()}.250')
+    def _(mode=_mode):
+        from palgen import from_mode, to_mode
+        colors = to_mode(mode, _hexes(250))
+        return lambda: from_mode(mode, colors)
+
+
+@case('convert.hex2packed.250')
+def _():
+    from vconv import hex2packed
+    hexes = _hexes(250)
+    return lambda: hex2packed(hexes)
+
+
+@case('convert.packed2hex.250')
+def _():
+    from vconv import hex2packed, packed2hex
+    packed = hex2packed(_hexes(250))
+    return lambda: packed2hex(packed)
+
+
+@case('convert.colorways.hex2hsl.250')
+def _():
+    import colorways
+    hexes = _hexes(250)
+    return lambda: colorways.hex2hsl(hexes)
+
+
+@case('convert.colorways.hsl2hex.250')
+def _():
+    import colorways
+    hsl = colorways.hex2hsl(_hexes(250))
+    return lambda: colorways.hsl2hex(hsl)
+
+
+### Generators
+
+for _tool, _offset in GENERATORS:
+    for _n in SIZES:
+        _name = _tool if _tool == 'randmix' else f'{_tool}_{_offset.lower()}'
+
+        @case(f'generate.{_name}.{_n}')
+        def _(tool=_tool, offset=_offset, n=_n):
+            from palgen import generate
+            return lambda: generate(tool, n, '#3366CC', 'HSL', 0.5, offset,
+                                    'Clamp', seed=1)
+
+
+# The perceptual modes at the largest size, gamut mapping included.
+for _tool, _offset in GENERATORS:
+    _name = _tool if _tool == 'randmix' else f'{_tool}_{_offset.lower()}'
+
+    @case(f'generate.{_name}.oklch.250')
+    def _(tool=_tool, offset=_offset):
+        from palgen import generate
+        return lambda: generate(tool, 250, '#3366CC', 'OKLCH', 0.5, offset,
+                                'Clamp', seed=1)
+
+
+### Contrast
+
+@case('contrast.matrix.250')
+def _():
+    from contrast import contrast_matrix, summary
+    from vconv import hex2packed
+    packed = hex2packed(_hexes(250))
+    return lambda: summary(contrast_matrix(packed))
+
+
+@case('cvd.simulate.250')
+def _():
+    from cvd import simulate
+    from vconv import hex2packed
+    packed = hex2packed(_hexes(250))
+    return lambda: simulate(packed, 'Deuteranopia')
+
+
+### Sorting
+
+@case('sort.path.250')
+def _():
+    from palsort import sort_packed
+    from vconv import hex2packed
+    packed = hex2packed(_hexes(250))
+    return lambda: sort_packed(packed, 'Path')
+
+
+### Harmonies
+
+@case('harmony.all.40k')
+def _():
+    from harmony import all_schemes
+    from vconv import hex2packed
+    packed = hex2packed(_hexes(40000))
+    return lambda: all_schemes(packed, 'HSL')
+
+
+### Database
+
+def _repo():
+    from palrepo import PaletteRepository
+    path = os.path.join(ROOT, 'color.db')
+    if not os.path.exists(path):
+        raise ImportError(f'{path} not found')
+    return PaletteRepository(path)
+
+
+@case('db.packs')
+def _():
+    repo = _repo()
+
+    def run():
+        repo.invalidate()
+        repo.packs()
+    return run
+
+
+@case('db.names')
+def _():
+    repo = _repo()
+    pack = repo.packs()[0]
+
+    def run():
+        repo.invalidate()
+        repo.names(pack)
+    return run
+
+
+@case('db.palette.uncached')
+def _():
+    repo = _repo()
+    pack = repo.packs()[0]
+    name = repo.names(pack)[0]
+
+    def run():
+        repo.cache.clear()
+        repo.packed(pack, name)
+    return run
+
+
+@case('db.palette.cached')
+def _():
+    repo = _repo()
+    pack = repo.packs()[0]
+    name = repo.names(pack)[0]
+    repo.packed(pack, name)
+    return lambda: repo.packed(pack, name)
+
+
+@case('db.page.100')
+def _():
+    repo = _repo()
+    pack = repo.packs()[0]
+    return lambda: repo.page(pack, None, 100)
+
+
+@case('db.import.10k')
+def _():
+    import itertools
+    import sqlite3
+    import tempfile
+    from swatchio import Importer
+    tmp = tempfile.TemporaryDirectory()
+    path = os.path.join(tmp.name, 'colors.csv')
+    with open(path, 'w') as f:
+        f.write('name,hex\n')
+        f.writelines(f'Color {i},{h}\n' for i, h in enumerate(_hexes(10000)))
+    db = os.path.join(tmp.name, 'color.db')
+    with sqlite3.connect(db) as conn:
+        conn.executescript('''
+            CREATE TABLE colors (topset TEXT NOT NULL, subset TEXT, name TEXT,
+                                 hex TEXT NOT NULL, valid INTEGER, notes TEXT);
+            CREATE TABLE components (hex TEXT UNIQUE NOT NULL, r INTEGER,
+                                     g INTEGER, b INTEGER);
+            CREATE TABLE palettes (pack TEXT NOT NULL, name TEXT NOT NULL,
+                                   json TEXT NOT NULL);''')
+    importer = Importer(db)
+    topsets = itertools.count()
+    # A new topset every call, so no row is skipped as a duplicate.
+    return lambda tmp=tmp: importer.import_file(path, f'bench{next(topsets)}')
+
+
+### Rendering
+
+for _n in SIZES:
+    @case(f'draw.qimage.{_n}')
+    def _(n=_n):
+        import numpy as np
+        from PySide6.QtGui import QImage
+        from PySide6.QtWidgets import QApplication
+        from CWWidgets import PaletteDisplay
+        app = QApplication.instance() or QApplication(sys.argv[:1])
+        pd = PaletteDisplay()
+        rng = np.random.default_rng(0)
+        pd.setPalette(rng.integers(0, 1 << 24, n, dtype=np.uint32))
+        image = QImage(800, 200, QImage.Format_ARGB32_Premultiplied)
+        # Keep the app and widget alive as long as the callable.
+        return lambda app=app, pd=pd: pd.drawPalette(800, 200, target=image)
+
+
+@case('export.png.50')
+def _():
+    import numpy as np
+    from palexport import png
+    packed = np.random.default_rng(0).integers(0, 1 << 24, 50,
+                                               dtype=np.uint32)
+    return lambda: png(packed)
+
+
+### Runner
+
+def measure(fn, budget, repeat):
+    """
+    Returns the per-call times of repeat rounds, each running fn enough
+    times to take about budget / repeat seconds.
+    """
+    fn()
+    loops = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        dt = time.perf_counter() - t0
+        if dt >= budget / repeat / 10 or loops >= 1 << 20:
+            break
+        loops *= 10
+    loops = max(1, int(loops * (budget / repeat) / max(dt, 1e-9)))
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        times.append((time.perf_counter() - t0) / loops)
+    return times
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f).get('results', {})
+
+
+def fmt(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f'{seconds / scale:7.2f} {unit:2s}'
+    return f'{seconds / 1e-9:7.0f} ns'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('-k', dest='filter', default='',
+                        help='only cases whose name contains this')
+    parser.add_argument('--save', action='store_true',
+                        help='store the results as the new baseline')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='slowdown that counts as a regression '
+                        '(default 0.25 = 25%%)')
+    parser.add_argument('--budget', type=float, default=0.2,
+                        help='seconds per case (default 0.2)')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    baseline = load_baseline(args.baseline)
+    results = {}
+    regressions = []
+    print(f"{'case':<34} {'median':>10} {'baseline':>10} {'change':>8}")
+    for name, setup in CASES.items():
+        if args.filter not in name:
+            continue
+        try:
+            fn = setup()
+        except ImportError as e:
+            print(f'{name:<34} skipped ({e})')
+            continue
+        median = statistics.median(measure(fn, args.budget, args.repeat))
+        results[name] = median
+        base = baseline.get(name)
+        if base is None:
+            print(f'{name:<34} {fmt(median)} {"-":>10}')
+            continue
+        change = median / base - 1
+        flag = ''
+        if change > args.threshold and median - base > 1e-6:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f'{name:<34} {fmt(median)} {fmt(base)} {change:+7.0%}{flag}')
+
+    if args.save:
+        merged = dict(load_baseline(args.baseline), **results)
+        with open(args.baseline, 'w') as f:
+            json.dump({'machine': platform.node(),
+                       'python': platform.python_version(),
+                       'results': merged}, f, indent=1, sort_keys=True)
+        print(f'Baseline written to {args.baseline}')
+    if regressions:
+        print(f'{len(regressions)} regression(s): {", ".join(regressions)}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+"""
+WCAG 2 contrast.
+
+The contrast ratio of two colors is (L1 + 0.05) / (L2 + 0.05), where L1
+is the relative luminance of the lighter one. Luminance is computed once
+per color (a byte lookup table, see vconv), so contrast_matrix() for a
+250-color palette (31125 pairs) is a single (n, n) array operation.
+
+ContrastIndex scores every palette in color.db and keeps the results in
+a side table of its cache database (see palrepo.connect) for filtering:
+
+    palette_contrast   (pal, best, worst, large, aa, aaa, pairs): the
+                       highest and lowest ratio over all pairs of
+                       swatches, and how many pairs reach each level
+
+Palettes are scored in batches of equal size, one (batch, pairs) array
+per batch. sync() scores the palettes added or edited since the last
+sync and drops the rows of palettes that are gone.
+
+    python contrast.py [--db color.db] [--level AA] [--pack PACK]
+"""
+
+import sys
+import threading
+
+import numpy as np
+
+import metrics
+from palrepo import connect, load_packed, palette_changes
+from vconv import packed2luminance
+
+__all__ = [
+    'LEVELS', 'contrast_matrix', 'grades', 'summary', 'score',
+    'ContrastIndex',
+]
+
+
+# Minimum ratios of the WCAG 2 success criteria: large text (and UI
+# components) at AA, normal text at AA and at AAA.
+LEVELS = {'AA Large': 3.0, 'AA': 4.5, 'AAA': 7.0}
+_THRESHOLDS = np.array(list(LEVELS.values()))
+
+# Ratios are compared with this much slack, so 4.4999... passes AA.
+_EPS = 1e-9
+
+# Pairs scored per batch by score().
+BATCH_PAIRS = 1 << 22
+
+
+def _ratio(a, b):
+    return (np.maximum(a, b) + 0.05) / (np.minimum(a, b) + 0.05)
+
+
+@metrics.timed('contrast.matrix')
+def contrast_matrix(packed):
+    """(n, n) contrast ratios of every pair of 0xRRGGBB colors."""
+    lum = packed2luminance(packed)
+    return _ratio(lum[:, None], lum[None, :])
+
+
+def grades(ratios):
+    """
+    Level reached by each ratio: 0 fails every level, then 1 AA Large,
+    2 AA and 3 AAA.
+    """
+    return np.searchsorted(_THRESHOLDS, ratios + _EPS, side='right')
+
+
+def summary(ratios):
+    """
+    Sums up a contrast matrix over its pairs of swatches: a dict with
+    'pairs', 'best', 'worst' and the number of pairs reaching each level.
+    """
+    n = len(ratios)
+    pairs = ratios[np.triu_indices(n, 1)]
+    result = {'pairs': len(pairs),
+              'best': float(pairs.max()) if len(pairs) else 1.0,
+              'worst': float(pairs.min()) if len(pairs) else 1.0}
+    for name, level in LEVELS.items():
+        result[name] = int((pairs + _EPS >= level).sum())
+    return result
+
+
+def score(packed, offsets):
+    """
+    Scores many palettes; palette i has the colors
+    packed[offsets[i]:offsets[i + 1]]. Returns a (palettes, 6) array of
+    best, worst, then the pairs reaching AA Large, AA and AAA, and the
+    number of pairs.
+    """
+    lum = packed2luminance(packed)
+    sizes = np.diff(offsets)
+    out = np.zeros((len(sizes), 6))
+    out[:, :2] = 1.0
+    for n in np.unique(sizes).tolist():
+        if n < 2:
+            continue
+        iu, ju = np.triu_indices(n, 1)
+        group = np.flatnonzero(sizes == n)
+        step = max(1, BATCH_PAIRS // len(iu))
+        for k in range(0, len(group), step):
+            sel = group[k:k + step]
+            pal = lum[offsets[sel][:, None] + np.arange(n)]
+            r = _ratio(pal[:, iu], pal[:, ju])
+            out[sel, 0] = r.max(1)
+            out[sel, 1] = r.min(1)
+            for j, level in enumerate(_THRESHOLDS):
+                out[sel, 2 + j] = (r + _EPS >= level).sum(1)
+            out[sel, 5] = len(iu)
+    return out
+
+
+class ContrastIndex():
+    """Contrast scores of the palettes in color.db, for filtering."""
+
+    def __init__(self, path='color.db', cache=None):
+        self.path = path
+        self.conn = connect(path, 'contrast', cache)
+        self.lock = threading.RLock()
+        self.sync()
+
+    def close(self):
+        self.conn.close()
+
+    def sync(self):
+        """
+        Scores the palettes added or edited since the last sync. Returns
+        the number of palettes scored.
+        """
+        with self.lock, self.conn:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS cache.palette_contrast (
+                    pal   INTEGER PRIMARY KEY,
+                    best  REAL NOT NULL,
+                    worst REAL NOT NULL,
+                    large INTEGER NOT NULL,
+                    aa    INTEGER NOT NULL,
+                    aaa   INTEGER NOT NULL,
+                    pairs INTEGER NOT NULL
+                );''')
+            rows, deleted = palette_changes(self.conn)
+            self.conn.executemany(
+                'DELETE FROM cache.palette_contrast WHERE pal = ?;',
+                ((pal,) for pal in deleted))
+            if not rows:
+                return 0
+            offsets, packed = load_packed(row[3] for row in rows)
+            with metrics.timer('contrast.score'):
+                scores = score(packed, offsets)
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO cache.palette_contrast '
+                'VALUES (?, ?, ?, ?, ?, ?, ?);',
+                ((row[0], best, worst, int(large), int(aa), int(aaa),
+                  int(pairs)) for row, (best, worst, large, aa, aaa, pairs)
+                 in zip(rows, scores)))
+        return len(rows)
+
+    def names(self, pack, level=0.0):
+        """
+        Returns the sorted names of the palettes in pack that have at
+        least one pair of swatches with a contrast ratio of level.
+        """
+        with self.lock:
+            return [row[0] for row in self.conn.execute('''
+                SELECT p.name FROM palettes p
+                  JOIN cache.palette_contrast c ON c.pal = p.rowid
+                 WHERE p.pack = ? AND c.best >= ?
+                 ORDER BY p.name;''', (pack, level - _EPS))]
+
+    def counts(self):
+        """Number of palettes with a pair reaching each level."""
+        with self.lock:
+            return {name: self.conn.execute(
+                'SELECT count(*) FROM cache.palette_contrast '
+                'WHERE best >= ?;',
+                (level - _EPS,)).fetchone()[0]
+                for name, level in LEVELS.items()}
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+    parser = argparse.ArgumentParser(description='Score the contrast of '
+                                     'every palette.')
+    parser.add_argument('--db', default='color.db')
+    parser.add_argument('--level', choices=list(LEVELS), default='AA')
+    parser.add_argument('--pack', help='list the palettes of this pack '
+                        'with a pair reaching --level')
+    args = parser.parse_args()
+    t0 = time.perf_counter()
+    index = ContrastIndex(args.db)
+    print(f'index ready in {(time.perf_counter() - t0) * 1e3:.1f} ms',
+          file=sys.stderr)
+    for name, n in index.counts().items():
+        print(f'{n:8d} palettes with a pair reaching {name}')
+    if args.pack:
+        for name in index.names(args.pack, LEVELS[args.level]):
+            print(f'{args.pack}/{name}')
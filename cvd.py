@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+"""
+Color vision deficiency simulation.
+
+simulate() shows colors as seen with protanopia, deuteranopia or
+tritanopia, with the full-severity matrices of Machado, Oliveira and
+Fernandes (2009) applied in linear RGB. Both ends of the gamma curve are
+256-entry tables: bytes are linearized by lookup, and linear values are
+encoded back by a binary search of the midpoints between the linearized
+bytes, which gives the nearest byte without a power function.
+
+CvdIndex flags the palettes in color.db whose swatches collapse under a
+deficiency, in a side table of its cache database (see palrepo.connect):
+
+    palette_cvd   (pal, protan, deutan, tritan): for every palette, the
+                  number of pairs of swatches that are distinct (CIE76
+                  delta E of at least `threshold`) but not once simulated
+
+    python cvd.py [--db color.db] [--threshold 6] [--show 10]
+"""
+
+import sys
+import threading
+
+import numpy as np
+
+import metrics
+from palrepo import connect, load_packed, palette_changes
+from vconv import packed2lab
+
+__all__ = ['MODES', 'simulate', 'collapsed', 'CvdIndex']
+
+
+# Linear RGB matrices for full severity.
+MODES = {
+    'Protanopia': np.array([
+        [0.152286, 1.052583, -0.204868],
+        [0.114503, 0.786281, 0.099216],
+        [-0.003882, -0.048116, 1.051998]]),
+    'Deuteranopia': np.array([
+        [0.367322, 0.860646, -0.227968],
+        [0.280085, 0.672501, 0.047413],
+        [-0.011820, 0.042940, 0.968881]]),
+    'Tritanopia': np.array([
+        [1.255528, -0.076749, -0.178779],
+        [-0.078411, 0.930809, 0.147602],
+        [0.004733, 0.691367, 0.303900]]),
+}
+
+# Byte -> linear value, and the linear values halfway between bytes.
+_b = np.arange(256) / 255.0
+_DECODE = np.where(_b > 0.04045, ((_b + 0.055) / 1.055) ** 2.4, _b / 12.92)
+_MIDPOINTS = (_DECODE[1:] + _DECODE[:-1]) / 2
+del _b
+
+# Pairs of swatches closer than this (CIE76 delta E) look the same.
+THRESHOLD = 6.0
+
+# Pairs compared per batch by collapsed().
+BATCH_PAIRS = 1 << 21
+
+
+@metrics.timed('cvd.simulate')
+def simulate(packed, mode):
+    """0xRRGGBB colors as seen with the deficiency mode (a MODES key)."""
+    packed = np.asarray(packed, dtype=np.uint32)
+    lin = np.stack([_DECODE[(packed >> 16) & 0xFF],
+                    _DECODE[(packed >> 8) & 0xFF],
+                    _DECODE[packed & 0xFF]], axis=-1)
+    b = np.searchsorted(_MIDPOINTS, lin @ MODES[mode].T).astype(np.uint32)
+    return (b[..., 0] << 16) | (b[..., 1] << 8) | b[..., 2]
+
+
+def collapsed(packed, offsets, threshold=THRESHOLD):
+    """
+    For palettes packed[offsets[i]:offsets[i + 1]], returns a
+    (palettes, len(MODES)) array counting the pairs of swatches that are
+    at least threshold apart but closer than that under each mode.
+    """
+    labs = [packed2lab(packed)]
+    labs += [packed2lab(simulate(packed, mode)) for mode in MODES]
+    labs = np.stack(labs)
+    sizes = np.diff(offsets)
+    out = np.zeros((len(sizes), len(MODES)), dtype=np.int64)
+    for n in np.unique(sizes).tolist():
+        if n < 2:
+            continue
+        iu, ju = np.triu_indices(n, 1)
+        group = np.flatnonzero(sizes == n)
+        step = max(1, BATCH_PAIRS // len(iu))
+        for k in range(0, len(group), step):
+            sel = group[k:k + step]
+            idx = offsets[sel][:, None] + np.arange(n)
+            lab = labs[:, idx]
+            d = ((lab[:, :, iu] - lab[:, :, ju]) ** 2).sum(-1)
+            distinct = d[0] >= threshold * threshold
+            out[sel] = (distinct & (d[1:] < threshold * threshold)) \
+                .sum(-1).T
+    return out
+
+
+class CvdIndex():
+    """Palettes of color.db that collapse under a deficiency."""
+
+    def __init__(self, path='color.db', threshold=THRESHOLD, cache=None):
+        self.path = path
+        self.threshold = float(threshold)
+        self.conn = connect(path, 'cvd', cache)
+        self.lock = threading.RLock()
+        self.sync()
+
+    def close(self):
+        self.conn.close()
+
+    def sync(self):
+        """
+        Checks the palettes added or edited since the last sync, or all of
+        them if the threshold changed. Returns the number of palettes
+        checked.
+        """
+        with self.lock, self.conn:
+            self.conn.executescript('''
+                CREATE TABLE IF NOT EXISTS cache.cvd_meta (
+                    key TEXT PRIMARY KEY,
+                    value
+                );
+                CREATE TABLE IF NOT EXISTS cache.palette_cvd (
+                    pal    INTEGER PRIMARY KEY,
+                    protan INTEGER NOT NULL,
+                    deutan INTEGER NOT NULL,
+                    tritan INTEGER NOT NULL
+                );''')
+            meta = dict(self.conn.execute(
+                'SELECT key, value FROM cache.cvd_meta;'))
+            forget = meta.get('threshold') != self.threshold
+            if forget:
+                self.conn.execute('DELETE FROM cache.palette_cvd;')
+                self.conn.execute(
+                    'INSERT OR REPLACE INTO cache.cvd_meta VALUES (?, ?);',
+                    ('threshold', self.threshold))
+            rows, deleted = palette_changes(self.conn, forget)
+            self.conn.executemany(
+                'DELETE FROM cache.palette_cvd WHERE pal = ?;',
+                ((pal,) for pal in deleted))
+            if not rows:
+                return 0
+            offsets, packed = load_packed(row[3] for row in rows)
+            with metrics.timer('cvd.check'):
+                counts = collapsed(packed, offsets, self.threshold)
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO cache.palette_cvd '
+                'VALUES (?, ?, ?, ?);',
+                ((row[0],) + tuple(c) for row, c
+                 in zip(rows, counts.tolist())))
+        return len(rows)
+
+    def flagged(self, limit=None):
+        """
+        Returns (pack, name, protan, deutan, tritan) of the palettes with
+        collapsing pairs, most pairs first.
+        """
+        with self.lock:
+            return self.conn.execute('''
+                SELECT p.pack, p.name, c.protan, c.deutan, c.tritan
+                  FROM cache.palette_cvd c JOIN palettes p ON p.rowid = c.pal
+                 WHERE c.protan + c.deutan + c.tritan > 0
+                 ORDER BY c.protan + c.deutan + c.tritan DESC, p.pack, p.name
+                 LIMIT ?;''', (-1 if limit is None else limit,)).fetchall()
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+    parser = argparse.ArgumentParser(description='Flag palettes whose '
+                                     'swatches collapse under a color '
+                                     'vision deficiency.')
+    parser.add_argument('--db', default='color.db')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help='delta E below which swatches look the same '
+                        f'(default {THRESHOLD:g})')
+    parser.add_argument('--show', type=int, default=10, metavar='N',
+                        help='print the N palettes with most collapsing '
+                        'pairs')
+    args = parser.parse_args()
+    t0 = time.perf_counter()
+    index = CvdIndex(args.db, args.threshold)
+    flagged = index.flagged()
+    print(f'{len(flagged)} palettes flagged in '
+          f'{(time.perf_counter() - t0) * 1e3:.1f} ms', file=sys.stderr)
+    for pack, name, protan, deutan, tritan in flagged[:args.show]:
+        print(f'{pack}/{name}  protan {protan}  deutan {deutan}  '
+              f'tritan {tritan}')
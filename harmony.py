@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+"""
+Color harmonies.
+
+A harmony scheme is the base color plus copies of it with the hue turned
+by fixed angles:
+
+    Complementary        180
+    Analogous            -30, +30
+    Triadic              120, 240
+    Split-Complementary  150, 210
+    Tetradic             60, 180, 240 (a rectangle on the hue circle)
+
+The turn happens in a palgen color mode. HSL, HSV and OKLCH have a hue
+channel, which is shifted; OKLab turns its a-b plane, and RGB turns
+about the gray diagonal, each as one matrix per angle. rotate() applies
+every angle to every base in a single array operation, so all_schemes()
+makes all five schemes for any number of bases with one conversion back
+to RGB. The first swatch is always the base itself.
+
+HarmonyIndex keeps the schemes of every color of color.db in a side
+table of its cache database (see palrepo.connect), computed for one mode:
+
+    color_harmony   (hex, complementary, analogous, triadic,
+                    split_complementary, tetradic): one row per distinct
+                    hex code of `colors`, each scheme a JSON hex list
+
+    python harmony.py [--db color.db] [--mode HSL] [#RRGGBB ...]
+"""
+
+import json
+import sys
+import threading
+
+import numpy as np
+
+import metrics
+from palgen import MODES, from_mode
+from palrepo import HEXRE, connect
+from vconv import hex2packed, packed2hex, packed2rgb
+
+__all__ = ['SCHEMES', 'rotate', 'schemes', 'all_schemes', 'harmony',
+           'HarmonyIndex']
+
+# Hue turns of each scheme, in turns; the base first.
+SCHEMES = {
+    'Complementary': (0.0, 1 / 2),
+    'Analogous': (0.0, -1 / 12, 1 / 12),
+    'Triadic': (0.0, 1 / 3, 2 / 3),
+    'Split-Complementary': (0.0, 5 / 12, 7 / 12),
+    'Tetradic': (0.0, 1 / 6, 1 / 2, 2 / 3),
+}
+
+# Columns of color_harmony, by scheme.
+_COLUMNS = {name: name.lower().replace('-', '_') for name in SCHEMES}
+
+# Channel holding the hue, in [0,1), of the cylindrical modes.
+_HUE = {'HSL': 0, 'HSV': 0, 'OKLCH': 2}
+
+# Bases per batch in HarmonyIndex.sync().
+BATCH = 1 << 16
+
+
+def _matrices(turns, mode):
+    """(m, 3, 3) rotations by turns, and the center they turn about."""
+    theta = 2 * np.pi * np.asarray(turns, dtype=np.float64)
+    cos, sin = np.cos(theta)[:, None, None], np.sin(theta)[:, None, None]
+    if mode == 'RGB':
+        # Rodrigues' formula about the unit gray axis u.
+        u = np.full(3, 1 / np.sqrt(3))
+        cross = np.array([[0, -u[2], u[1]],
+                          [u[2], 0, -u[0]],
+                          [-u[1], u[0], 0]])
+        return cos * np.eye(3) + sin * cross + (1 - cos) * np.outer(u, u), \
+            np.zeros(3)
+    # OKLab a and b are scaled into [0,1] about 0.5 (see palgen).
+    rot = np.zeros((len(theta), 3, 3))
+    rot[:, 0, 0] = 1.0
+    rot[:, 1:, 1:] = np.concatenate([np.concatenate([cos, -sin], 2),
+                                     np.concatenate([sin, cos], 2)], 1)
+    return rot, np.array([0.0, 0.5, 0.5])
+
+
+def rotate(colors, turns, mode='HSL'):
+    """
+    Turns the hue of (n, 3) colors in the color mode by each of turns.
+    Returns an (n, len(turns), 3) array in the mode.
+    """
+    colors = np.asarray(colors, dtype=np.float64)
+    if mode in _HUE:
+        c = _HUE[mode]
+        out = np.repeat(colors[:, None, :], len(turns), axis=1)
+        out[..., c] += turns
+        out[..., c] %= 1.0
+        return out
+    rot, center = _matrices(turns, mode)
+    # (m, n, 3) @ (m, 3, 3)
+    out = (colors - center)[None] @ rot.transpose(0, 2, 1) + center
+    return out.transpose(1, 0, 2)
+
+
+def schemes(packed, scheme, mode='HSL'):
+    """
+    The scheme of every 0xRRGGBB base of packed, as an (n, m) uint32
+    array whose first column is the bases.
+    """
+    return all_schemes(packed, mode, (scheme,))[scheme]
+
+
+@metrics.timed('harmony.schemes')
+def all_schemes(packed, mode='HSL', names=tuple(SCHEMES)):
+    """
+    Every scheme of names for every 0xRRGGBB base of packed, as a dict of
+    (n, m) uint32 arrays, all computed together.
+    """
+    packed = np.asarray(packed, dtype=np.uint32).ravel()
+    turns = np.concatenate([SCHEMES[name] for name in names])
+    colors = MODES[mode][0](packed2rgb(packed))
+    out = from_mode(mode, rotate(colors, turns, mode))
+    result = {}
+    at = 0
+    for name in names:
+        m = len(SCHEMES[name])
+        result[name] = out[:, at:at + m].copy()
+        result[name][:, 0] = packed
+        at += m
+    return result
+
+
+def harmony(base, scheme, mode='HSL'):
+    """The scheme of the hex color base, as hex strings."""
+    return packed2hex(schemes(hex2packed([base]), scheme, mode)[0])
+
+
+class HarmonyIndex():
+    """Harmony schemes of the colors of color.db, for lookup."""
+
+    def __init__(self, path='color.db', mode='HSL', cache=None):
+        self.path = path
+        self.mode = mode
+        self.conn = connect(path, 'harmony', cache)
+        self.lock = threading.RLock()
+        self.sync()
+
+    def close(self):
+        self.conn.close()
+
+    def sync(self):
+        """
+        Computes the schemes of the hex codes added to `colors` since the
+        last sync, or of all of them if the mode changed. Returns the
+        number of colors computed.
+        """
+        columns = ', '.join(f'{col} TEXT NOT NULL'
+                            for col in _COLUMNS.values())
+        with self.lock, self.conn:
+            self.conn.executescript(f'''
+                CREATE TABLE IF NOT EXISTS cache.harmony_meta (
+                    key TEXT PRIMARY KEY,
+                    value
+                );
+                CREATE TABLE IF NOT EXISTS cache.color_harmony (
+                    hex TEXT PRIMARY KEY,
+                    {columns}
+                ) WITHOUT ROWID;''')
+            meta = dict(self.conn.execute(
+                'SELECT key, value FROM cache.harmony_meta;'))
+            if meta.get('mode') != self.mode:
+                self.conn.execute('DELETE FROM cache.color_harmony;')
+                self.conn.execute(
+                    'INSERT OR REPLACE INTO cache.harmony_meta '
+                    'VALUES (?, ?);',
+                    ('mode', self.mode))
+            hexes = [row[0] for row in self.conn.execute('''
+                SELECT DISTINCT upper(hex) FROM colors
+                 WHERE upper(hex) NOT IN (SELECT hex FROM cache.color_harmony)
+                 ORDER BY 1;''') if HEXRE.match(row[0])]
+            for i in range(0, len(hexes), BATCH):
+                chunk = hexes[i:i + BATCH]
+                with metrics.timer('harmony.sync'):
+                    result = all_schemes(hex2packed(chunk), self.mode)
+                    texts = [_json_rows(result[name]) for name in SCHEMES]
+                self.conn.executemany(
+                    f'INSERT INTO cache.color_harmony VALUES '
+                    f'({", ".join("?" * (len(SCHEMES) + 1))});',
+                    zip(chunk, *texts))
+        return len(hexes)
+
+    def lookup(self, hexcode):
+        """
+        Returns {scheme: [hex, ...]} for a color of color.db, or None if
+        it has no row.
+        """
+        with self.lock:
+            row = self.conn.execute(
+                f'SELECT {", ".join(_COLUMNS.values())} '
+                f'FROM cache.color_harmony '
+                f'WHERE hex = ?;', (hexcode.upper(),)).fetchone()
+        if row is None:
+            return None
+        return {name: json.loads(text) for name, text in zip(SCHEMES, row)}
+
+
+def _json_rows(packed):
+    """JSON hex lists of the rows of an (n, m) packed array."""
+    n, m = packed.shape
+    if n == 0:
+        return []
+    # Each swatch is '"#RRGGBB", ' (11 bytes); the last ', ' becomes ']'.
+    cells = np.empty((n, m, 11), dtype=np.uint8)
+    cells[...] = np.frombuffer(b'"#000000", ', np.uint8)
+    cells[..., 1:8] = np.frombuffer(''.join(packed2hex(packed)).encode(),
+                                    np.uint8).reshape(n, m, 7)
+    rows = np.empty((n, m * 11), dtype=np.uint8)
+    rows[:, 0] = ord('[')
+    rows[:, 1:] = cells.reshape(n, m * 11)[:, :-1]
+    rows[:, -1] = ord(']')
+    return rows.view(f'S{m * 11}').ravel().astype(f'U{m * 11}').tolist()
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+    parser = argparse.ArgumentParser(description='Harmony schemes of the '
+                                     'colors of color.db.')
+    parser.add_argument('colors', nargs='*', metavar='#RRGGBB',
+                        help='colors to show the schemes of')
+    parser.add_argument('--db', default='color.db')
+    parser.add_argument('--mode', choices=list(MODES), default='HSL')
+    args = parser.parse_args()
+    t0 = time.perf_counter()
+    index = HarmonyIndex(args.db, args.mode)
+    print(f'index ready in {(time.perf_counter() - t0) * 1e3:.1f} ms',
+          file=sys.stderr)
+    for code in args.colors:
+        found = index.lookup(code)
+        if found is None:
+            try:
+                found = {name: harmony(code, name, args.mode)
+                         for name in SCHEMES}
+            except ValueError as e:
+                parser.error(str(e))
+        for name, pal in found.items():
+            print(f'{code}  {name:20s} {" ".join(pal)}')
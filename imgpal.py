@@ -0,0 +1,201 @@
+"""
+Palettes from images.
+
+The n dominant colors of an image are found with mini-batch k-means in
+CIE L*a*b*. Large images never reach the clustering at full size:
+
+    load_pixels()  decodes through QImageReader at a reduced size (JPEG
+                   decodes straight to it) and drops transparent pixels
+    sample()       keeps an evenly strided subset of at most `samples`
+                   pixels, converted to Lab once
+    kmeans()       k-means++ seeding, then mini-batch updates; every
+                   assignment is one matrix product over the batch
+
+so the cost of a palette depends on `samples` and n, not on the image.
+Centers closer than MERGE delta E are one color, so an image with fewer
+distinct colors than asked for gives a shorter palette rather than
+repeated swatches. Clusters are returned largest first. Everything here
+is plain numpy and QImage, so it runs on worker threads.
+"""
+
+import numpy as np
+
+from PySide6.QtCore import Qt, QSize
+from PySide6.QtGui import QImage, QImageReader
+
+import metrics
+from vconv import lab_to_rgb, packed2hex, packed2lab, rgb2packed
+
+__all__ = [
+    'load_pixels', 'sample', 'kmeans', 'palette', 'extract', 'thumbnail',
+]
+
+# Decoded images are scaled down to about this many pixels.
+MAX_PIXELS = 1 << 20
+
+# Pixels kept for clustering.
+SAMPLES = 1 << 16
+
+# Centers closer than this CIE76 delta E are merged.
+MERGE = 2.3
+
+
+def _read(path, max_pixels):
+    reader = QImageReader(path)
+    reader.setAutoTransform(True)
+    size = reader.size()
+    area = size.width() * size.height()
+    if area > max_pixels:
+        scale = (max_pixels / area) ** 0.5
+        reader.setScaledSize(QSize(max(1, int(size.width() * scale)),
+                                   max(1, int(size.height() * scale))))
+    image = reader.read()
+    if image.isNull():
+        raise ValueError(f'{path}: {reader.errorString()}')
+    return image
+
+
+@metrics.timed('imgpal.load')
+def load_pixels(path, max_pixels=MAX_PIXELS):
+    """
+    Returns the opaque pixels of an image file as a flat uint32 array of
+    0xRRGGBB values, decoded at no more than about max_pixels.
+    """
+    image = _read(path, max_pixels).convertToFormat(QImage.Format_ARGB32)
+    w, h = image.width(), image.height()
+    rows = np.frombuffer(image.constBits(), dtype=np.uint32)
+    rows = rows.reshape(h, image.bytesPerLine() // 4)[:, :w]
+    argb = rows.ravel()
+    return argb[argb >= 0x80000000] & 0xFFFFFF
+
+
+def sample(packed, samples=SAMPLES, seed=None):
+    """
+    Returns at most `samples` pixels of packed as Lab, taken on an even
+    stride from a random start.
+    """
+    packed = np.asarray(packed, dtype=np.uint32).ravel()
+    if len(packed) > samples:
+        stride = len(packed) // samples
+        start = np.random.default_rng(seed).integers(stride)
+        packed = packed[start::stride][:samples]
+    return packed2lab(packed)
+
+
+def _nearest(points, centers):
+    """Index of the nearest center of every point, and its squared dist."""
+    d = (centers * centers).sum(1)[None, :] - 2.0 * points @ centers.T
+    labels = d.argmin(1)
+    return labels, d[np.arange(len(points)), labels] \
+        + (points * points).sum(1)
+
+
+def _seed_centers(points, k, rng, tries=2048):
+    """
+    k-means++ seeding on a subset of the points. Stops early once every
+    point is a center.
+    """
+    if len(points) > tries:
+        points = points[rng.choice(len(points), tries, replace=False)]
+    centers = np.empty((k, points.shape[1]))
+    centers[0] = points[rng.integers(len(points))]
+    dist = ((points - centers[0]) ** 2).sum(1)
+    for i in range(1, k):
+        total = dist.sum()
+        if total == 0:
+            return centers[:i]
+        centers[i] = points[rng.choice(len(points), p=dist / total)]
+        dist = np.minimum(dist, ((points - centers[i]) ** 2).sum(1))
+    return centers
+
+
+@metrics.timed('imgpal.kmeans')
+def kmeans(points, k, seed=None, batch=4096, iters=48):
+    """
+    Clusters points (m, d) into at most k centers with mini-batch
+    k-means. Returns the centers and the number of points in each;
+    centers within MERGE of a larger one are folded into it and empty
+    ones dropped.
+    """
+    rng = np.random.default_rng(seed)
+    points = np.asarray(points, dtype=np.float64)
+    m = len(points)
+    if m == 0:
+        raise ValueError('no pixels to cluster')
+    k = max(1, k)
+    centers = _seed_centers(points, k, rng)
+    k = len(centers)
+    seen = np.zeros(k)
+    batch = min(batch, m)
+    for it in range(iters):
+        x = points[rng.integers(m, size=batch)]
+        labels, _ = _nearest(x, centers)
+        n = np.bincount(labels, minlength=k).astype(np.float64)
+        sums = np.stack([np.bincount(labels, x[:, c], minlength=k)
+                         for c in range(x.shape[1])], axis=1)
+        seen += n
+        hit = n > 0
+        # Per-center learning rate 1/seen, applied to the batch mean.
+        centers[hit] += (sums[hit] - n[hit, None] * centers[hit]) \
+            / seen[hit, None]
+        if it == iters // 2:
+            # Move centers nothing was assigned to onto poorly fit points;
+            # the rest stay empty rather than copy a fitted one.
+            dead = np.flatnonzero(seen == 0)
+            if len(dead):
+                _, dist = _nearest(x, centers)
+                far = np.argsort(dist)[-len(dead):]
+                far = far[dist[far] > MERGE * MERGE]
+                centers[dead[len(dead) - len(far):]] = x[far]
+    counts = np.zeros(k, dtype=np.int64)
+    for i in range(0, m, batch):
+        labels, _ = _nearest(points[i:i + batch], centers)
+        counts += np.bincount(labels, minlength=k)
+    return _merge(centers, counts)
+
+
+def _merge(centers, counts):
+    """
+    Folds every center into a larger one within MERGE of it, as the
+    count-weighted mean, and drops empty centers.
+    """
+    keep = []
+    for i in np.argsort(-counts, kind='stable'):
+        if counts[i] == 0:
+            break
+        for c in keep:
+            if ((centers[i] - centers[c]) ** 2).sum() < MERGE * MERGE:
+                n = counts[c] + counts[i]
+                centers[c] = (counts[c] * centers[c]
+                              + counts[i] * centers[i]) / n
+                counts[c] = n
+                break
+        else:
+            keep.append(i)
+    kept = np.array(keep, dtype=np.int64)
+    return centers[kept], counts[kept]
+
+
+def extract(path, n, seed=None, samples=SAMPLES, max_pixels=MAX_PIXELS):
+    """
+    Returns at most n dominant colors of an image file as hex strings,
+    most common first.
+    """
+    return palette(sample(load_pixels(path, max_pixels), samples, seed), n,
+                   seed)
+
+
+def palette(lab, n, seed=None):
+    """At most n dominant colors of sampled Lab pixels, as hex strings."""
+    centers, counts = kmeans(lab, n, seed)
+    order = np.argsort(-counts, kind='stable')
+    # Gamut clipping can still put two centers on one code.
+    return list(dict.fromkeys(
+        packed2hex(rgb2packed(lab_to_rgb(centers[order])))))
+
+
+def thumbnail(path, size=160):
+    """Returns the image at path scaled to fit size x size, as a QImage."""
+    image = _read(path, size * size * 4)
+    return image.scaled(size, size, Qt.KeepAspectRatio,
+                        Qt.SmoothTransformation)
@@ -0,0 +1,166 @@
+"""
+Timings and counters for the hot paths.
+
+Metrics are off unless the CW_METRICS environment variable is set when
+the app starts; its value names the trace file written on exit ('1'
+picks cw-trace.json). While off, timed() returns the function it wraps
+unchanged and timer() a shared do-nothing context manager, so
+instrumented code runs as if it were not.
+
+    @metrics.timed('palgen.generate')
+    def generate(...): ...
+
+    with metrics.timer('display.paint'):
+        ...
+
+    metrics.count('repo.cache_hit')
+
+While on, the last WINDOW durations of every span name give rolling
+percentiles (summary()), and every span and counter update is kept (up
+to MAX_EVENTS) for dump(), which writes a Chrome trace-event file that
+chrome://tracing or Perfetto can open.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from functools import wraps
+
+__all__ = [
+    'ENABLED', 'enable', 'timer', 'timed', 'record', 'count', 'summary',
+    'counters', 'dump', 'trace_path',
+]
+
+WINDOW = 256
+MAX_EVENTS = 200000
+
+_setting = os.environ.get('CW_METRICS', '')
+ENABLED = bool(_setting)
+
+_clock = time.perf_counter
+_t0 = _clock()
+_recent = {}
+_counts = {}
+# ('X', name, start, duration, thread id) or ('C', name, time, value, 0).
+_events = deque(maxlen=MAX_EVENTS)
+_lock = threading.Lock()
+_null = nullcontext()
+
+
+def enable(on=True):
+    """
+    Turns recording on or off. Functions decorated with timed() while
+    metrics were off stay uninstrumented.
+    """
+    global ENABLED
+    ENABLED = on
+
+
+def trace_path():
+    """Where the trace is written on exit."""
+    return 'cw-trace.json' if _setting in ('', '1') else _setting
+
+
+def record(name, start, end=None):
+    """Records a span that began at perf_counter() time start."""
+    if not ENABLED:
+        return
+    if end is None:
+        end = _clock()
+    dur = end - start
+    recent = _recent.get(name)
+    if recent is None:
+        recent = _recent.setdefault(name, deque(maxlen=WINDOW))
+    recent.append(dur)
+    _events.append(('X', name, start, dur, threading.get_ident()))
+
+
+def count(name, n=1):
+    """Adds n to counter name."""
+    if not ENABLED:
+        return
+    with _lock:
+        value = _counts[name] = _counts.get(name, 0) + n
+    _events.append(('C', name, _clock(), value, 0))
+
+
+class _Timer():
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = _clock()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, self.start)
+        return False
+
+
+def timer(name):
+    """Context manager timing its block as span name."""
+    return _Timer(name) if ENABLED else _null
+
+
+def timed(name):
+    """Decorator timing every call of a function as span name."""
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = _clock()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(name, start)
+        return wrapper
+    return decorate
+
+
+def _percentile(values, q):
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def summary():
+    """
+    Returns {name: (count, p50, p95)} over the last WINDOW spans of each
+    name, with times in milliseconds.
+    """
+    result = {}
+    for name, recent in list(_recent.items()):
+        values = sorted(recent)
+        if values:
+            result[name] = (len(values), _percentile(values, 0.5) * 1e3,
+                            _percentile(values, 0.95) * 1e3)
+    return result
+
+
+def counters():
+    with _lock:
+        return dict(_counts)
+
+
+def dump(path=None):
+    """Writes everything recorded as a Chrome trace-event JSON file."""
+    path = path or trace_path()
+    pid = os.getpid()
+    events = []
+    for kind, name, t, value, tid in list(_events):
+        ts = (t - _t0) * 1e6
+        if kind == 'X':
+            events.append({'name': name, 'cat': name.split('.')[0],
+                           'ph': 'X', 'ts': ts, 'dur': value * 1e6,
+                           'pid': pid, 'tid': tid})
+        else:
+            events.append({'name': name, 'ph': 'C', 'ts': ts, 'pid': pid,
+                           'args': {'value': value}})
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms',
+                   'otherData': {'counters': counters()}}, f)
+    return path
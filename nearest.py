@@ -0,0 +1,298 @@
+#!/usr/bin/env python
+"""
+Nearest named color lookup.
+
+NearestColors holds the named colors of color.db in CIE L*a*b* and indexes
+them with a uniform voxel grid, so k-nearest queries only look at the few
+cells around the query color instead of all ~47k names.
+
+The grid is built from the `components` table (hex, r, g, b) joined to
+`colors`. Run backfill_components() (or `python nearest.py --backfill`)
+to fill in missing and NULL channels and to add the r/g/b index;
+NearestColors.from_db() opens color.db read-only and, when it finds
+gaps, uses the channels the backfill would store without writing them.
+"""
+
+import sqlite3
+import sys
+
+import numpy as np
+
+from palrepo import HEXRE, connect
+from vconv import hex2packed, packed2lab
+
+__all__ = ['NearestColors', 'backfill_components']
+
+_MAX_LABELS = 1 << 16
+
+
+
+def _block(r):
+    """Offsets of the (2r+1)^3 block of cells around a cell."""
+    axis = np.arange(-r, r + 1)
+    return np.stack(np.meshgrid(axis, axis, axis, indexing='ij'),
+                    axis=-1).reshape(-1, 3)
+
+
+def backfill_components(conn):
+    """
+    Makes `components` complete and consistent with `colors`.
+
+    Adds a row for every hex code in `colors` that is missing, recomputes
+    r, g, b from the hex code where they are NULL or wrong, and creates an
+    index on (r, g, b). Rows whose hex code is not '#RRGGBB' are left
+    untouched. Returns a dict of counts.
+    """
+    with conn:
+        added = conn.execute('''
+            INSERT OR IGNORE INTO components (hex)
+            SELECT DISTINCT hex FROM colors;''').rowcount
+        rows = conn.execute(
+            'SELECT rowid, hex, r, g, b FROM components;').fetchall()
+        valid = [row for row in rows if HEXRE.match(row[1])]
+        packed = hex2packed([row[1] for row in valid])
+        rgb = np.stack([(packed >> 16) & 0xFF, (packed >> 8) & 0xFF,
+                        packed & 0xFF], axis=-1).tolist()
+        fixes = [(r, g, b, row[0]) for row, (r, g, b) in zip(valid, rgb)
+                 if (row[2], row[3], row[4]) != (r, g, b)]
+        conn.executemany(
+            'UPDATE components SET r=?, g=?, b=? WHERE rowid=?;', fixes)
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS components_rgb
+                ON components (r, g, b);''')
+    return {
+        'rows': len(rows),
+        'added': added,
+        'fixed': len(fixes),
+        'invalid': len(rows) - len(valid),
+    }
+
+
+def _needs_backfill(conn):
+    return conn.execute('''
+        SELECT 1 FROM components WHERE r IS NULL OR g IS NULL OR b IS NULL
+        UNION ALL
+        SELECT 1 FROM colors c
+         WHERE NOT EXISTS (SELECT 1 FROM components k WHERE k.hex = c.hex)
+        LIMIT 1;''').fetchone() is not None
+
+
+class NearestColors():
+    """k-nearest named colors in L*a*b* over a uniform voxel grid."""
+
+    def __init__(self, names, packed, cell=4.0):
+        self.names = list(names)
+        self.packed = np.asarray(packed, dtype=np.uint32)
+        self.lab = packed2lab(self.packed).astype(np.float32)
+        self.cell = float(cell)
+        self._labels = {}
+        self._build()
+
+    @classmethod
+    def from_db(cls, path='color.db', valid_only=True, backfill=True, **kw):
+        """
+        Loads the named colors from color.db. Colors sharing a hex code
+        are indexed once, under the first name found. With backfill, if
+        `components` has gaps, the channels of '#RRGGBB' codes come from
+        the codes, as after backfill_components().
+        """
+        conn = connect(path)
+        try:
+            backfill = backfill and _needs_backfill(conn)
+            rows = conn.execute(f'''
+                SELECT c.name, c.topset, c.hex, k.r, k.g, k.b
+                  FROM colors c LEFT JOIN components k ON k.hex = c.hex
+                 {'WHERE c.valid = 1' if valid_only else ''}
+                 ORDER BY c.rowid;''').fetchall()
+        finally:
+            conn.close()
+        stored = np.array([None not in row[3:] for row in rows], dtype=bool)
+        coded = np.array([backfill and HEXRE.match(row[2]) is not None
+                          for row in rows], dtype=bool)
+        packed = np.zeros(len(rows), dtype=np.uint32)
+        if stored.any():
+            rgb = np.array([row[3:] for row, ok in zip(rows, stored) if ok],
+                           dtype=np.uint32)
+            packed[stored] = (rgb[:, 0] << 16) | (rgb[:, 1] << 8) | rgb[:, 2]
+        packed[coded] = hex2packed([row[2] for row, ok in zip(rows, coded)
+                                    if ok])
+        keep = np.flatnonzero(stored | coded)
+        if not len(keep):
+            return cls([], [], **kw)
+        packed, first = np.unique(packed[keep], return_index=True)
+        names = [f'{rows[i][0] or rows[i][1]} ({rows[i][1]})'
+                 for i in keep[first]]
+        return cls(names, packed, **kw)
+
+    def _build(self):
+        """Sorts the colors by voxel and records where each voxel starts."""
+        if len(self.lab) == 0:
+            self.origin = np.zeros(3, dtype=np.float32)
+            self.dims = np.ones(3, dtype=np.int64)
+            self.order = np.zeros(0, dtype=np.int64)
+            self.starts = np.zeros(2, dtype=np.int64)
+            return
+        self.origin = self.lab.min(axis=0)
+        extent = self.lab.max(axis=0) - self.origin
+        self.dims = np.floor(extent / self.cell).astype(np.int64) + 1
+        cells = self._cell_ids(self._cell_coords(self.lab))
+        self.order = np.argsort(cells, kind='stable')
+        counts = np.bincount(cells, minlength=int(np.prod(self.dims)))
+        self.starts = np.concatenate([[0], np.cumsum(counts)])
+
+    def _cell_coords(self, lab):
+        coords = np.floor((lab - self.origin) / self.cell).astype(np.int64)
+        return np.clip(coords, 0, self.dims - 1)
+
+    def _cell_ids(self, coords):
+        return (coords[..., 0] * self.dims[1] + coords[..., 1]) \
+            * self.dims[2] + coords[..., 2]
+
+    def _shell(self, center, r):
+        """Cell ids at Chebyshev distance exactly r from center."""
+        lo = np.maximum(center - r, 0)
+        hi = np.minimum(center + r, self.dims - 1)
+        axes = [np.arange(lo[i], hi[i] + 1) for i in range(3)]
+        grid = np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1)
+        grid = grid.reshape(-1, 3)
+        if r > 0:
+            grid = grid[np.abs(grid - center).max(axis=1) == r]
+        return self._cell_ids(grid)
+
+    def _members(self, cell_ids):
+        starts = self.starts[cell_ids]
+        counts = self.starts[cell_ids + 1] - starts
+        total = counts.sum()
+        if total == 0:
+            return self.order[:0]
+        offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+        return self.order[np.arange(total) + offsets]
+
+    def _query_one(self, q, k):
+        center = self._cell_coords(q)
+        reach = int(np.max(np.maximum(center, self.dims - 1 - center)))
+        found = []
+        for r in range(reach + 1):
+            found.append(self._members(self._shell(center, r)))
+            cand = np.concatenate(found)
+            if len(cand) < k and r < reach:
+                continue
+            d = np.sqrt(((self.lab[cand] - q) ** 2).sum(axis=1))
+            best = np.argsort(d, kind='stable')[:k]
+            # Anything in an unvisited cell is at least r cells away.
+            if len(best) == k and d[best[-1]] <= r * self.cell or r == reach:
+                return d[best], cand[best]
+
+    def _query_block(self, lab, k, r):
+        """
+        Searches the block of cells within r of every query at once.
+        Returns the results and a mask of the queries whose k-th neighbour
+        is close enough that no cell outside the block could beat it.
+        """
+        center = self._cell_coords(lab)
+        cells = center[:, None, :] + _block(r)
+        inside = ((cells >= 0) & (cells < self.dims)).all(axis=2)
+        ids = np.where(inside, self._cell_ids(np.clip(cells, 0, None)), 0)
+        starts = self.starts[ids]
+        counts = np.where(inside, self.starts[ids + 1] - starts, 0)
+        totals = counts.sum(axis=1)
+        # Flatten every query's cells into one candidate list.
+        rows = np.repeat(np.arange(len(lab)), totals)
+        flat = counts.ravel()
+        ends = np.cumsum(flat)
+        pos = np.arange(ends[-1]) - np.repeat(ends - flat, flat)
+        cand = self.order[np.repeat(starts.ravel(), flat) + pos]
+        d = np.sqrt(((self.lab[cand] - lab[rows]) ** 2).sum(axis=1))
+        # Rank candidates within each query and keep the first k.
+        srt = np.lexsort((d, rows))
+        row_start = np.cumsum(totals) - totals
+        rank = np.arange(len(srt)) - row_start[rows]
+        top = rank < k
+        keep = srt[top]
+        dist = np.full((len(lab), k), np.inf, dtype=np.float32)
+        idx = np.full((len(lab), k), -1, dtype=np.int64)
+        dist[rows[top], rank[top]] = d[keep]
+        idx[rows[top], rank[top]] = cand[keep]
+        return dist, idx, dist[:, -1] <= r * self.cell
+
+    def query(self, colors, k=1):
+        """
+        Finds the k nearest named colors for each query color.
+
+        colors may be a list of hex strings or a uint32 array of packed
+        0xRRGGBB values. Returns (distances, indices), both shaped (M, k);
+        distances are CIE76 delta E. Indices refer to self.names and
+        self.packed; when fewer than k names exist the rows are padded
+        with -1 and inf.
+        """
+        if len(colors) and isinstance(colors[0], str):
+            colors = hex2packed(colors)
+        lab = packed2lab(colors).astype(np.float32)
+        dist = np.full((len(lab), k), np.inf, dtype=np.float32)
+        idx = np.full((len(lab), k), -1, dtype=np.int64)
+        if len(self.lab) == 0 or len(lab) == 0:
+            return dist, idx
+        todo = np.arange(len(lab))
+        for r in (1, 2):
+            d, j, done = self._query_block(lab[todo], k, r)
+            dist[todo[done]] = d[done]
+            idx[todo[done]] = j[done]
+            todo = todo[~done]
+            if len(todo) == 0:
+                break
+        for i in todo:
+            d, j = self._query_one(lab[i], k)
+            dist[i, :len(d)] = d
+            idx[i, :len(j)] = j
+        return dist, idx
+
+    def label(self, colors):
+        """
+        Returns the name of the nearest named color for each color. Names
+        are memoized per color, since palettes mostly repeat swatches
+        between updates.
+        """
+        if len(colors) and isinstance(colors[0], str):
+            colors = hex2packed(colors)
+        colors = np.asarray(colors, dtype=np.uint32).tolist()
+        missing = list({c for c in colors if c not in self._labels})
+        if missing:
+            if len(self._labels) > _MAX_LABELS:
+                self._labels.clear()
+            _, idx = self.query(np.array(missing, dtype=np.uint32), 1)
+            for c, i in zip(missing, idx[:, 0]):
+                self._labels[c] = self.names[i] if i >= 0 else None
+        return [self._labels[c] for c in colors]
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+    parser = argparse.ArgumentParser(description='Nearest named colors.')
+    parser.add_argument('colors', nargs='*', help='#RRGGBB colors to look up')
+    parser.add_argument('--db', default='color.db')
+    parser.add_argument('-k', type=int, default=3)
+    parser.add_argument('--backfill', action='store_true',
+                        help='backfill and index the components table')
+    args = parser.parse_args()
+    if args.backfill:
+        conn = sqlite3.connect(args.db)
+        print(backfill_components(conn))
+        conn.close()
+    t0 = time.perf_counter()
+    nc = NearestColors.from_db(args.db)
+    print(f'indexed {len(nc.names)} colors in '
+          f'{(time.perf_counter() - t0) * 1e3:.1f} ms', file=sys.stderr)
+    if args.colors:
+        t0 = time.perf_counter()
+        try:
+            dist, idx = nc.query(args.colors, args.k)
+        except ValueError as e:
+            parser.error(str(e))
+        elapsed = time.perf_counter() - t0
+        for color, ds, js in zip(args.colors, dist, idx):
+            print(color, ', '.join(
+                f'{nc.names[j]} {nc.packed[j]:06X} dE={d:.2f}'
+                for d, j in zip(ds, js) if j >= 0))
+        print(f'{elapsed / len(args.colors) * 1e6:.1f} us per color',
+              file=sys.stderr)
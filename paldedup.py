@@ -0,0 +1,355 @@
+#!/usr/bin/env python
+"""
+Near-duplicate palettes.
+
+Finds groups of palettes that show practically the same colors, in any
+order, and records them in a side table of a cache database (see
+palrepo.connect):
+
+    palette_cluster   (pal, cluster): every palette that has at least one
+                      near duplicate, with the smallest rowid of its group
+                      as the cluster id
+
+The distance between two palettes is the mean CIE76 delta E of the best
+one-to-one matching of their colors (the assignment problem, solved with
+the Hungarian algorithm); colors of the larger palette left over are
+charged the distance to their nearest color in the smaller one, chosen
+together with the matching. Two palettes are duplicates when that is at
+most `threshold`, and groups are the connected components of the
+duplicate pairs.
+
+Only candidate pairs are ever compared. Each palette gets a MinHash
+signature of the Lab grid cells its colors fall in, on two grids offset
+by half a cell; palettes sharing all the values of any band of the
+signature are candidates (locality-sensitive hashing). Signatures and
+buckets are computed with whole-array numpy operations. Candidates are
+first screened with a cheap lower bound of the distance, batched by
+palette sizes; only the pairs it cannot rule out are matched, on a
+process pool. A million palettes take minutes rather than the 5 * 10**11
+comparisons of checking every pair.
+
+    python paldedup.py [--db color.db] [--threshold 3] [--show 10]
+"""
+
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from palrepo import connect, load_packed
+from vconv import packed2lab
+
+__all__ = ['load_palettes', 'palette_distance', 'candidate_pairs',
+           'cluster', 'dedup', 'clusters']
+
+# Lab grid cell size for the signatures, in delta E.
+CELL = 8.0
+
+# MinHash values per grid, and values per band.
+HASHES = 40
+BAND = 4
+
+# Buckets larger than this compare each palette with the next MAX_BUCKET
+# palettes only, instead of with every other one.
+MAX_BUCKET = 64
+
+def load_palettes(conn, batch=50000):
+    """
+    Returns (rowids, offsets, packed): palette i has the colors
+    packed[offsets[i]:offsets[i + 1]]. Palettes without a valid color are
+    left out.
+    """
+    rowids, lens, flat = [], [], []
+    cur = conn.execute('SELECT rowid, json FROM palettes ORDER BY rowid;')
+    while True:
+        block = cur.fetchmany(batch)
+        if not block:
+            break
+        offsets, packed = load_packed(text for _, text in block)
+        sizes = np.diff(offsets)
+        keep = sizes > 0
+        rowids.append(np.array([row[0] for row in block],
+                               dtype=np.int64)[keep])
+        lens.append(sizes[keep])
+        flat.append(packed)
+    if not rowids:
+        return (np.zeros(0, dtype=np.int64), np.zeros(1, dtype=np.int64),
+                np.zeros(0, dtype=np.uint32))
+    lens = np.concatenate(lens)
+    offsets = np.zeros(len(lens) + 1, dtype=np.int64)
+    np.cumsum(lens, out=offsets[1:])
+    return np.concatenate(rowids), offsets, np.concatenate(flat)
+
+
+### Distance
+
+def _assignment(cost):
+    """
+    Hungarian algorithm for a cost matrix with no more rows than
+    columns. Returns the column matched to each row.
+    """
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=np.int64)      # row matched to column j
+    way = np.zeros(m + 1, dtype=np.int64)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used
+            free[0] = False
+            cur = cost[i0 - 1] - u[i0] - v[1:]
+            better = free[1:] & (cur < minv[1:])
+            minv[1:][better] = cur[better]
+            way[1:][better] = j0
+            j1 = int(np.where(free, minv, np.inf).argmin())
+            delta = minv[j1]
+            u[p[used]] += delta
+            v[used] -= delta
+            minv[free] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    cols = np.empty(n, dtype=np.int64)
+    matched = np.flatnonzero(p[1:])
+    cols[p[1:][matched] - 1] = matched
+    return cols
+
+
+def palette_distance(a, b, limit=np.inf):
+    """
+    Order-independent distance of two palettes given as (n, 3) Lab
+    arrays: the mean delta E of the best matching, see above. Returns
+    early with a lower bound above limit when the matching cannot get
+    under it.
+    """
+    if len(a) > len(b):
+        a, b = b, a
+    d = np.sqrt(((a[:, None, :] - b[None, :, :]) ** 2).sum(-1))
+    # Every color of b pays at least its nearest distance, and every
+    # color of a is matched at no less than its nearest distance.
+    bound = max(d.min(0).sum(), d.min(1).sum()) / len(b)
+    if bound > limit:
+        return bound
+    # A zero bound only means the same colors, maybe in other counts.
+    if bound == 0.0 and len(a) == len(b) and \
+            np.array_equal(_sorted(a), _sorted(b)):
+        return 0.0
+    if len(b) > len(a):
+        # Dummy rows take the leftover colors of b at their nearest
+        # distance, so the matching and the leftovers are chosen together.
+        d = np.vstack([d, np.repeat(d.min(0)[None], len(b) - len(a), 0)])
+    cols = _assignment(d)
+    return d[np.arange(len(b)), cols].sum() / len(b)
+
+
+def _sorted(lab):
+    return lab[np.lexsort(lab.T)]
+
+
+_shared = {}
+
+
+def _init_worker(lab, offsets):
+    _shared['lab'] = lab
+    _shared['offsets'] = offsets
+
+
+def _bounds(lab, offsets, pairs):
+    """
+    The lower bound of palette_distance() for every pair, computed for
+    all pairs of the same pair of sizes at once.
+    """
+    out = np.empty(len(pairs))
+    sizes = np.diff(offsets)
+    si, sj = sizes[pairs[:, 0]], sizes[pairs[:, 1]]
+    shapes = np.stack([si, sj], 1)
+    keys, inverse = np.unique(shapes, axis=0, return_inverse=True)
+    for k, (ni, nj) in enumerate(keys.tolist()):
+        sel = np.flatnonzero(inverse.ravel() == k)
+        a = lab[offsets[pairs[sel, 0]][:, None] + np.arange(ni)]
+        b = lab[offsets[pairs[sel, 1]][:, None] + np.arange(nj)]
+        d = np.sqrt(((a[:, :, None, :] - b[:, None, :, :]) ** 2).sum(-1))
+        out[sel] = np.maximum(d.min(1).sum(1), d.min(2).sum(1)) \
+            / max(ni, nj)
+    return out
+
+
+def _distances(pairs, threshold, lab=None, offsets=None):
+    if lab is None:
+        lab, offsets = _shared['lab'], _shared['offsets']
+    out = _bounds(lab, offsets, pairs)
+    # Only pairs the bound cannot rule out need the assignment.
+    for k in np.flatnonzero(out <= threshold).tolist():
+        i, j = pairs[k]
+        out[k] = palette_distance(lab[offsets[i]:offsets[i + 1]],
+                                  lab[offsets[j]:offsets[j + 1]], threshold)
+    return out
+
+
+### Candidates
+
+def _minhash(cells, offsets, hashes, rng):
+    """(palettes, hashes) minimum of random hashes of each palette's cells."""
+    seeds = rng.integers(0, 1 << 62, hashes, dtype=np.int64).astype(np.uint64)
+    # splitmix64 finalizer of cell + seed, wrapping around.
+    with np.errstate(over='ignore'):
+        h = cells.astype(np.uint64)[:, None] + seeds
+        h ^= h >> np.uint64(30)
+        h *= np.uint64(0xbf58476d1ce4e5b9)
+        h ^= h >> np.uint64(27)
+        h *= np.uint64(0x94d049bb133111eb)
+        h ^= h >> np.uint64(31)
+    return np.minimum.reduceat(h, offsets[:-1], axis=0)
+
+
+def candidate_pairs(lab, offsets, cell=CELL, hashes=HASHES, band=BAND,
+                    seed=0):
+    """
+    Returns an (m, 2) array of palette index pairs i < j that share a
+    MinHash band on either of two Lab grids.
+    """
+    rng = np.random.default_rng(seed)
+    n = len(offsets) - 1
+    pairs = []
+    for shift in (0.0, cell / 2):
+        q = np.floor((lab + (shift, 128.0 + shift, 128.0 + shift))
+                     / cell).astype(np.int64)
+        cells = (q[:, 0] * 64 + q[:, 1]) * 64 + q[:, 2]
+        sig = _minhash(cells, offsets, hashes, rng)
+        for k in range(0, hashes - band + 1, band):
+            key = np.zeros(n, dtype=np.uint64)
+            for col in range(k, k + band):
+                key = key * np.uint64(1000003) ^ sig[:, col]
+            order = np.argsort(key, kind='stable')
+            skey = key[order]
+            # Pair every palette with the next ones in its bucket.
+            for lag in range(1, MAX_BUCKET + 1):
+                same = np.flatnonzero(skey[lag:] == skey[:-lag])
+                if len(same) == 0:
+                    break
+                pairs.append(np.stack([order[same], order[same + lag]], 1))
+    if not pairs:
+        return np.zeros((0, 2), dtype=np.int64)
+    pairs = np.sort(np.concatenate(pairs), axis=1)
+    return np.unique(pairs, axis=0)
+
+
+### Clustering
+
+def cluster(n, pairs):
+    """
+    Labels the connected components of a graph on n nodes: returns for
+    every node the smallest node of its component.
+    """
+    parent = np.arange(n)
+    if len(pairs) == 0:
+        return parent
+    a, b = pairs[:, 0], pairs[:, 1]
+    while True:
+        m = np.minimum(parent[a], parent[b])
+        before = parent.copy()
+        np.minimum.at(parent, a, m)
+        np.minimum.at(parent, b, m)
+        parent = parent[parent]
+        if np.array_equal(parent, before):
+            return parent
+
+
+def dedup(path='color.db', threshold=3.0, workers=None, chunk=20000,
+          cache=None):
+    """
+    Finds the near-duplicate palettes of color.db and rewrites the
+    palette_cluster table. Returns (palettes, candidate pairs, duplicate
+    pairs, clusters).
+    """
+    conn = connect(path, 'dedup', cache)
+    try:
+        rowids, offsets, packed = load_palettes(conn)
+        lab = packed2lab(packed).astype(np.float32)
+        pairs = candidate_pairs(lab, offsets)
+        chunks = [pairs[i:i + chunk] for i in range(0, len(pairs), chunk)]
+        if workers == 1 or len(chunks) <= 1:
+            dist = [_distances(c, threshold, lab, offsets) for c in chunks]
+        else:
+            with ProcessPoolExecutor(workers, initializer=_init_worker,
+                                     initargs=(lab, offsets)) as pool:
+                dist = list(pool.map(_distances, chunks,
+                                     [threshold] * len(chunks)))
+        dist = np.concatenate(dist) if dist else np.zeros(0)
+        dups = pairs[dist <= threshold]
+        root = cluster(len(rowids), dups)
+        size = np.bincount(root, minlength=len(rowids))
+        members = np.flatnonzero(size[root] > 1)
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS cache.palette_cluster (
+                pal     INTEGER PRIMARY KEY,
+                cluster INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS cache.palette_cluster_cluster
+                ON palette_cluster (cluster);''')
+        with conn:
+            conn.execute('DELETE FROM cache.palette_cluster;')
+            conn.executemany(
+                'INSERT INTO cache.palette_cluster VALUES (?, ?);',
+                zip(rowids[members].tolist(),
+                    rowids[root[members]].tolist()))
+        return (len(rowids), len(pairs), len(dups),
+                int((size > 1).sum()))
+    finally:
+        conn.close()
+
+
+def clusters(conn, limit=None):
+    """Yields the clusters of palette_cluster as [(pack, name), ...]."""
+    query = '''
+        SELECT c.cluster, p.pack, p.name FROM cache.palette_cluster c
+          JOIN palettes p ON p.rowid = c.pal
+         ORDER BY c.cluster, c.pal;'''
+    group, current = [], None
+    count = 0
+    for cid, pack, name in conn.execute(query):
+        if cid != current and group:
+            yield group
+            count += 1
+            if limit is not None and count >= limit:
+                return
+            group = []
+        current = cid
+        group.append((pack, name))
+    if group:
+        yield group
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+    parser = argparse.ArgumentParser(description='Find near-duplicate '
+                                     'palettes.')
+    parser.add_argument('--db', default='color.db')
+    parser.add_argument('--threshold', type=float, default=3.0,
+                        help='mean delta E of duplicates (default 3)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='processes checking candidate pairs')
+    parser.add_argument('--show', type=int, default=10, metavar='N',
+                        help='print the first N clusters')
+    args = parser.parse_args()
+    t0 = time.perf_counter()
+    n, cand, dups, groups = dedup(args.db, args.threshold, args.workers)
+    print(f'{n} palettes, {cand} candidate pairs, {dups} duplicate pairs, '
+          f'{groups} clusters', file=sys.stderr)
+    print(f'{(time.perf_counter() - t0) * 1e3:.1f} ms', file=sys.stderr)
+    conn = connect(args.db, 'dedup')
+    for group in clusters(conn, args.show):
+        print(', '.join(f'{pack}/{name}' for pack, name in group))
+    conn.close()
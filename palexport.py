@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+"""
+Bulk export of palettes.
+
+export() writes palettes of color.db or of a palette store into a zip
+archive, in any of these formats:
+
+    png   a swatch sheet drawn by PaletteDisplay.drawPalette() into a
+          QImage, the same layout as the app
+    svg   the same layout as rectangles
+    gpl   a GIMP palette
+    ase   Adobe Swatch Exchange, the palette as one group
+
+Palettes are read a page at a time and encoded by a pool of worker
+processes, a batch per task. Only a few batches per worker are in flight,
+and each is written to the archive as soon as it is its turn, so memory
+use does not depend on how many palettes are exported. Entries are named
+<pack>/<name>.<format>.
+
+    python palexport.py OUT.zip [--db color.db | --store FILE.cwp]
+        [--pack PATTERN ...] [--format png,svg,gpl,ase] [-j N]
+"""
+
+import fnmatch
+import multiprocessing
+import os
+import re
+import struct
+import sys
+import zipfile
+from collections import deque
+
+import numpy as np
+
+from vconv import packed2hex
+
+__all__ = ['FORMATS', 'SIZE', 'png', 'svg', 'gpl', 'ase', 'select_packs',
+           'export']
+
+FORMATS = ('png', 'svg', 'gpl', 'ase')
+
+# Width and height of PNG and SVG swatch sheets.
+SIZE = (800, 200)
+
+# Palettes per worker task, and tasks in flight per worker.
+BATCH = 200
+AHEAD = 2
+
+_UNSAFE = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+
+# The PaletteDisplay that draws PNGs in this process.
+_display = None
+
+
+def _painter():
+    global _display
+    if _display is None:
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        from PySide6.QtWidgets import QApplication
+        from CWWidgets import PaletteDisplay
+        app = QApplication.instance() or QApplication(sys.argv[:1])
+        _display = PaletteDisplay()
+        # The widget needs the application for as long as it lives.
+        _display.app = app
+    return _display
+
+
+def png(packed, size=SIZE):
+    """PNG bytes of the swatch sheet of a palette."""
+    from PySide6.QtCore import Qt, QBuffer, QIODevice
+    from PySide6.QtGui import QImage
+    w, h = size
+    display = _painter()
+    display.setPalette(np.asarray(packed, dtype=np.uint32))
+    image = QImage(w, h, QImage.Format_RGB32)
+    display.drawPalette(w, h, target=image)
+    if len(packed) <= 256:
+        # Every pixel is a swatch color: 8-bit PNGs encode twice as fast.
+        image = image.convertToFormat(
+            QImage.Format_Indexed8, [c.rgb() for c in display.colors],
+            Qt.ThresholdDither)
+    buf = QBuffer()
+    buf.open(QIODevice.WriteOnly)
+    image.save(buf, 'PNG')
+    return buf.data().data()
+
+
+def svg(packed, size=SIZE):
+    """SVG bytes of the swatch sheet of a palette."""
+    w, h = size
+    n = len(packed)
+    rects = ''.join(
+        f'<rect x="{i * w // n}" y="0" width="{w // n + 1}" height="{h}" '
+        f'fill="{code}"/>' for i, code in enumerate(packed2hex(packed)))
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{w}" '
+            f'height="{h}" viewBox="0 0 {w} {h}" shape-rendering="crispEdges">'
+            f'{rects}</svg>\n').encode()
+
+
+def gpl(name, packed):
+    """GIMP palette bytes; swatches are named by their hex codes."""
+    packed = np.asarray(packed, dtype=np.uint32)
+    lines = [f'{r:3d} {g:3d} {b:3d}\t{code}' for r, g, b, code in zip(
+        ((packed >> 16) & 0xFF).tolist(), ((packed >> 8) & 0xFF).tolist(),
+        (packed & 0xFF).tolist(), packed2hex(packed))]
+    header = ['GIMP Palette', f'Name: {name}',
+              f'Columns: {min(len(packed), 16)}', '#']
+    return ('\n'.join(header + lines) + '\n').encode()
+
+
+def _ase_block(kind, body):
+    return struct.pack('>HI', kind, len(body)) + body
+
+
+def _ase_string(text):
+    text += '\0'
+    return struct.pack('>H', len(text)) + text.encode('utf-16-be')
+
+
+def ase(name, packed):
+    """
+    Adobe Swatch Exchange bytes: one group holding the swatches as RGB
+    colors named by their hex codes.
+    """
+    packed = np.asarray(packed, dtype=np.uint32)
+    rgb = np.stack([(packed >> 16) & 0xFF, (packed >> 8) & 0xFF,
+                    packed & 0xFF], axis=-1) / 255.0
+    blocks = [_ase_block(0xC001, _ase_string(name))]
+    for code, values in zip(packed2hex(packed), rgb.tolist()):
+        blocks.append(_ase_block(0x0001, _ase_string(code) + b'RGB '
+                                 + struct.pack('>3fH', *values, 2)))
+    blocks.append(_ase_block(0xC002, b''))
+    return (b'ASEF' + struct.pack('>HHI', 1, 0, len(blocks))
+            + b''.join(blocks))
+
+
+def _encode(task):
+    """Worker: the files of every palette of a batch, as bytes per format."""
+    batch, formats, size = task
+    out = []
+    for name, packed in batch:
+        files = []
+        for fmt in formats:
+            if fmt == 'png':
+                files.append(png(packed, size))
+            elif fmt == 'svg':
+                files.append(svg(packed, size))
+            elif fmt == 'gpl':
+                files.append(gpl(name, packed))
+            else:
+                files.append(ase(name, packed))
+        out.append(files)
+    return out
+
+
+def _batches(source, packs, limit):
+    """
+    Yields (pack, [(name, packed), ...], read) pages: the non-empty
+    palettes of a page, and how many palettes the page had.
+    """
+    for pack in packs:
+        after = None
+        while True:
+            rows, after = source.page(pack, after, limit)
+            if not rows:
+                break
+            yield pack, [(name, np.array(packed, dtype=np.uint32))
+                         for name, packed in rows if len(packed)], len(rows)
+
+
+def _entry(pack, name, seen):
+    """A unique archive path for a palette, without unsafe characters."""
+    base = f'{_UNSAFE.sub("_", pack).strip() or "_"}/' \
+        f'{_UNSAFE.sub("_", name).strip() or "untitled"}'
+    path, k = base, 1
+    while path in seen:
+        k += 1
+        path = f'{base} ({k})'
+    seen.add(path)
+    return path
+
+
+def select_packs(source, patterns=None):
+    """The packs of source matching any of the fnmatch patterns."""
+    packs = source.packs()
+    if not patterns:
+        return packs
+    return [p for p in packs if any(fnmatch.fnmatchcase(p, pattern)
+                                    for pattern in patterns)]
+
+
+def export(source, out, packs=None, formats=FORMATS, size=SIZE, jobs=None,
+           batch=BATCH, progress=None):
+    """
+    Writes the palettes of packs (all of them by default) of source, a
+    PaletteRepository or PaletteStore, to the zip file out in formats.
+    jobs worker processes encode them (default: one per core; 0 encodes
+    in this process). progress(done, total) is called after every batch.
+    Returns the number of palettes written.
+    """
+    if packs is None:
+        packs = source.packs()
+    formats = tuple(formats)
+    total = sum(len(source.names(pack)) for pack in packs)
+    done = written = 0
+    seen = set()
+    with zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as archive:
+
+        def write(pack, rows, read, files):
+            nonlocal done, written
+            for (name, _), data in zip(rows, files):
+                path = _entry(pack, name, seen)
+                for fmt, blob in zip(formats, data):
+                    # PNG is compressed already.
+                    archive.writestr(
+                        f'{path}.{fmt}', blob, zipfile.ZIP_STORED
+                        if fmt == 'png' else zipfile.ZIP_DEFLATED)
+            written += len(rows)
+            done += read
+            if progress is not None:
+                progress(done, total)
+
+        tasks = ((pack, rows, read, (rows, formats, size))
+                 for pack, rows, read in _batches(source, packs, batch))
+        if jobs == 0:
+            for pack, rows, read, task in tasks:
+                write(pack, rows, read, _encode(task))
+            return written
+        jobs = jobs or os.cpu_count() or 1
+        # Workers start from scratch: Qt does not survive a fork.
+        ctx = multiprocessing.get_context('spawn')
+        with ctx.Pool(jobs) as pool:
+            pending = deque()
+            for pack, rows, read, task in tasks:
+                pending.append((pack, rows, read,
+                                pool.apply_async(_encode, (task,))))
+                if len(pending) >= jobs * AHEAD:
+                    pack, rows, read, result = pending.popleft()
+                    write(pack, rows, read, result.get())
+            while pending:
+                pack, rows, read, result = pending.popleft()
+                write(pack, rows, read, result.get())
+    return written
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+    parser = argparse.ArgumentParser(description='Export palettes to a '
+                                     'zip of PNG, SVG, GPL and ASE files.')
+    parser.add_argument('out', help='zip file to write')
+    src = parser.add_mutually_exclusive_group()
+    src.add_argument('--db', default='color.db')
+    src.add_argument('--store', help='a .cwp palette store instead')
+    parser.add_argument('--pack', action='append', metavar='PATTERN',
+                        help="packs to export, e.g. 'sports-*' "
+                        '(repeatable; default: all)')
+    parser.add_argument('--format', default=','.join(FORMATS),
+                        help='comma-separated formats (default: all)')
+    parser.add_argument('--size', default='x'.join(map(str, SIZE)),
+                        metavar='WxH', help='PNG and SVG size')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='worker processes (default: all cores; 0 '
+                        'for none)')
+    args = parser.parse_args()
+    formats = [f.strip().lower() for f in args.format.split(',')]
+    for fmt in formats:
+        if fmt not in FORMATS:
+            parser.error(f'unknown format {fmt}')
+    size = tuple(int(v) for v in args.size.lower().split('x'))
+    if args.store:
+        from palstore import PaletteStore
+        source = PaletteStore(args.store)
+    else:
+        from palrepo import PaletteRepository
+        source = PaletteRepository(args.db)
+    packs = select_packs(source, args.pack)
+    t0 = time.perf_counter()
+
+    def progress(done, total):
+        print(f'\r{done}/{total} palettes', end='', file=sys.stderr)
+
+    n = export(source, args.out, packs, formats, size, args.jobs,
+               progress=progress)
+    elapsed = time.perf_counter() - t0
+    print(file=sys.stderr)
+    print(f'{n} palettes from {len(packs)} packs written to {args.out} in '
+          f'{elapsed:.2f}s ({n / max(elapsed, 1e-9):.0f}/s)', file=sys.stderr)
@@ -0,0 +1,261 @@
+"""
+Palette generation shared by the tool panels and CWGenerate.py.
+
+These are vectorized, explicitly seeded versions of the colorways
+generators behind the Random Mix and Offset tools (randmix_palette,
+random_offset_palette and value_offset_palette). Every function takes a
+numpy.random.Generator or a seed, so a palette can be regenerated exactly
+from its seed and parameters.
+
+Generation is split in two steps so callers can reuse the randomness:
+
+    draw()   the uniform random numbers for k palettes of n colors
+    apply()  turns them into (k, n, 3) colors in the tool's color mode
+
+generate_array() does both, generate() and generate_many() also convert
+to hex strings. The first swatch of every palette is the base color, as
+with colorways.
+
+PaletteStream keeps the draw() output of one seeded palette around for
+live previews: growing the palette appends swatches from the same stream,
+shrinking it truncates, and new parameters re-apply the cached numbers.
+"""
+
+import secrets
+
+import numpy as np
+
+import metrics
+from vconv import (
+    hex2packed, packed2hex, packed2rgb, rgb2packed,
+    rgb_to_hsl, hsl_to_rgb, rgb_to_hsv, hsv_to_rgb,
+    rgb_to_oklab, oklab_to_rgb, rgb_to_oklch, oklch_to_rgb,
+)
+
+__all__ = [
+    'MODES', 'TOOLS', 'OFFSETS', 'EDGES',
+    'new_seed', 'make_rng', 'clamp01', 'reflect',
+    'draw', 'apply', 'generate_array', 'generate', 'generate_many',
+    'to_mode', 'from_mode', 'PaletteStream',
+]
+
+
+def _identity(arr):
+    return np.asarray(arr, dtype=np.float64)
+
+
+# The generators work in [0,1] on every channel. OKLab a and b (about
+# -0.31 to 0.28 in sRGB) and OKLCH chroma (up to about 0.32) are scaled
+# by this so that [0,1] covers the gamut; what lands outside of it is
+# mapped back by chroma reduction.
+_OK_RANGE = 0.33
+
+
+def _rgb_to_oklab_unit(rgb):
+    lab = rgb_to_oklab(rgb)
+    lab[..., 1:] = lab[..., 1:] / (2.0 * _OK_RANGE) + 0.5
+    return lab
+
+
+def _oklab_unit_to_rgb(colors):
+    lab = np.array(colors, dtype=np.float64)
+    lab[..., 1:] = (lab[..., 1:] - 0.5) * (2.0 * _OK_RANGE)
+    return oklab_to_rgb(lab)
+
+
+def _rgb_to_oklch_unit(rgb):
+    lch = rgb_to_oklch(rgb)
+    lch[..., 1] /= _OK_RANGE
+    return lch
+
+
+def _oklch_unit_to_rgb(colors):
+    lch = np.array(colors, dtype=np.float64)
+    lch[..., 1] *= _OK_RANGE
+    return oklch_to_rgb(lch)
+
+
+# Color mode -> (RGB to mode, mode to RGB), on (..., 3) arrays.
+MODES = {
+    'RGB': (_identity, _identity),
+    'HSL': (rgb_to_hsl, hsl_to_rgb),
+    'HSV': (rgb_to_hsv, hsv_to_rgb),
+    'OKLab': (_rgb_to_oklab_unit, _oklab_unit_to_rgb),
+    'OKLCH': (_rgb_to_oklch_unit, _oklch_unit_to_rgb),
+}
+
+TOOLS = ('randmix', 'offset')
+
+OFFSETS = ('Random', 'Value')
+
+
+def clamp01(x, out=None):
+    """Clips x onto [0,1]."""
+    return np.clip(x, 0.0, 1.0, out=out)
+
+
+def reflect(x, out=None):
+    """
+    Maps x onto [0,1], treating x as a distance to "walk" back and forth
+    across the interval starting at 0.
+    """
+    r = np.abs(x, out=out)
+    np.fmod(r, 2.0, out=r)
+    return np.minimum(r, 2.0 - r, out=r)
+
+
+EDGES = {
+    'Clamp': clamp01,
+    'Reflect': reflect,
+}
+
+
+def new_seed():
+    """Returns a fresh random seed suitable for recording."""
+    return secrets.randbits(63)
+
+
+def make_rng(rng=None):
+    """Returns rng if it is a Generator, else a Generator seeded with it."""
+    if isinstance(rng, np.random.Generator):
+        return rng
+    return np.random.default_rng(rng)
+
+
+def to_mode(mode, hexcodes):
+    """Converts hex strings to an (N, 3) array in the color mode."""
+    return MODES[mode][0](packed2rgb(hex2packed(hexcodes)))
+
+
+def from_mode(mode, colors):
+    """Converts (..., 3) colors in the color mode to packed 0xRRGGBB."""
+    return rgb2packed(MODES[mode][1](colors))
+
+
+def draw(tool, rng, k, n, offset='Random'):
+    """
+    Draws the uniform random numbers for k palettes of n colors. The base
+    swatch needs none, so the shape is (k, n-1, 3), or (k, n-1, 1) for
+    value offsets, which move all channels together.
+    """
+    chans = 1 if tool == 'offset' and offset == 'Value' else 3
+    return make_rng(rng).random((k, max(n - 1, 0), chans))
+
+
+def apply(tool, base, u, amount, offset='Random', edge='Clamp'):
+    """
+    Builds palettes from draw() output u around base (a vec3 in the color
+    mode). Returns a (k, n, 3) array whose first swatch is the base.
+
+    For 'randmix', amount is the weight of the base color mixed with a
+    random color. For 'offset', amount is the range of the offset: random
+    offsets move each channel independently, value offsets scale the base
+    by a random ratio of its mean; edge maps the results back into [0,1].
+    """
+    base = np.asarray(base, dtype=np.float64)
+    out = np.empty((u.shape[0], u.shape[1] + 1, 3))
+    out[:, 0] = base
+    new = out[:, 1:]
+    if tool == 'randmix':
+        np.multiply(u, 1.0 - amount, out=new)
+        new += amount * base
+    elif tool == 'offset' and offset == 'Random':
+        np.multiply(u, 2.0 * amount, out=new)
+        new += base - amount
+        EDGES[edge](new, out=new)
+    elif tool == 'offset' and offset == 'Value':
+        val = base.sum() / 3.0
+        target = u * (2.0 * amount) + (val - amount)
+        if val == 0:
+            # Black has nothing to scale; move every channel to the target.
+            new[:] = target
+        else:
+            np.multiply(target, base / val, out=new)
+        EDGES[edge](new, out=new)
+    else:
+        raise ValueError(f'Unknown generator: {tool} {offset}')
+    return out
+
+
+def generate_array(tool, k, n, base, amount, offset='Random', edge='Clamp',
+                   rng=None):
+    """Generates k palettes of n colors as a (k, n, 3) array."""
+    u = draw(tool, rng, k, n, offset)
+    return apply(tool, base, u, amount, offset, edge)
+
+
+@metrics.timed('palgen.generate')
+def generate_many(tool, k, n, base, mode='HSL', amount=0.5,
+                  offset='Random', edge='Clamp', seed=None, packed=False):
+    """
+    Generates k palettes of n colors around the hex color base. Returns a
+    list of hex string lists, or a (k, n) uint32 array if packed is set.
+    """
+    if k < 0 or n < 1:
+        raise ValueError(f'need k >= 0 palettes of n >= 1 colors, got '
+                         f'k={k}, n={n}')
+    vec = to_mode(mode, [base])[0]
+    colors = generate_array(tool, k, n, vec, amount, offset, edge, seed)
+    out = from_mode(mode, colors)
+    if packed:
+        return out
+    hexes = packed2hex(out)
+    return [hexes[i:i + n] for i in range(0, len(hexes), n)]
+
+
+def generate(tool, n, base, mode='HSL', amount=0.5, offset='Random',
+             edge='Clamp', seed=None):
+    """
+    Generates an n-color palette around the hex color base and returns a
+    list of hex strings. The same seed and parameters always give the
+    same palette.
+    """
+    return generate_many(tool, 1, n, base, mode, amount, offset, edge,
+                         seed)[0]
+
+
+class PaletteStream():
+    """
+    One seeded palette that can change size and parameters cheaply.
+
+    The random numbers come from a single Generator and are only ever
+    appended to, so palette(n, ...) always equals
+    generate(tool, n, ..., seed=seed) whatever sizes were asked for before.
+    Swatches are cached for the last parameters; growing applies only the
+    new swatches.
+    """
+    def __init__(self, tool, seed, offset='Random', chunk=64):
+        self.tool = tool
+        self.offset = offset
+        self.seed = seed
+        self.chunk = chunk
+        self.rng = make_rng(seed)
+        self.u = draw(tool, self.rng, 1, 1, offset)
+        self.params = None
+        self.hexes = []
+
+    def randoms(self, n):
+        """Returns the (1, n-1, channels) random numbers of n swatches."""
+        need = n - 1 - self.u.shape[1]
+        if need > 0:
+            more = draw(self.tool, self.rng, 1, max(need, self.chunk) + 1,
+                        self.offset)
+            self.u = np.concatenate([self.u, more], axis=1)
+        return self.u[:, :max(n - 1, 0)]
+
+    @metrics.timed('palgen.stream')
+    def palette(self, n, base, mode='HSL', amount=0.5, edge='Clamp'):
+        """Returns the first n swatches as hex strings."""
+        params = (base, mode, amount, edge)
+        if params != self.params:
+            self.params = params
+            self.vec = to_mode(mode, [base])[0]
+            self.hexes = []
+        have = len(self.hexes)
+        if n > have:
+            u = self.randoms(n)[:, max(have - 1, 0):]
+            colors = apply(self.tool, self.vec, u, amount, self.offset,
+                           edge)[0]
+            new = colors[1:] if have else colors
+            self.hexes += packed2hex(from_mode(mode, new))
+        return self.hexes[:n]
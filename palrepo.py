@@ -0,0 +1,284 @@
+"""
+Palette repository.
+
+PaletteRepository sits between the widgets and the `palettes` table of
+color.db, which it opens read-only. All lookups are parameterized
+statements (sqlite3 keeps them prepared in its statement cache) served
+by the palettes_pack_name index on (pack, name) that color.db ships
+with (swatchio's Importer adds it to the databases it fills), and
+decoded palettes are kept in a bounded LRU keyed by (pack, name), so
+browsing never re-parses JSON for a palette it has already seen.
+
+load_packed() decodes palette JSON for every module that reads the
+`palettes` table in bulk.
+
+Side tables derived from color.db (the search index, contrast scores,
+...) are kept out of it, in cache databases under the application cache
+folder: connect() opens color.db read-only with the cache of one index
+attached as `cache`, and palette_changes() tells an index which palettes
+were added, edited or deleted since it last looked.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+import metrics
+from vconv import hex2packed
+
+__all__ = ['HEXRE', 'load_packed', 'cache_path', 'connect',
+           'palette_changes', 'PaletteRepository']
+
+# A swatch as stored in color.db.
+HEXRE = re.compile(r'^#[0-9A-Fa-f]{6}$')
+
+
+def _swatches(text):
+    """The '#RRGGBB' swatches of palette JSON; [] if it is not a list."""
+    try:
+        return [s for s in json.loads(text)
+                if isinstance(s, str) and HEXRE.match(s)]
+    except (TypeError, ValueError):
+        return []
+
+
+def load_packed(texts):
+    """
+    Decodes palette JSON texts into (offsets, packed): palette i has the
+    0xRRGGBB colors packed[offsets[i]:offsets[i + 1]]. Swatches that are
+    not '#RRGGBB' are skipped, and text that is not a JSON list gives an
+    empty palette.
+    """
+    lens, flat = [], []
+    with metrics.timer('json.decode'):
+        for text in texts:
+            pal = _swatches(text)
+            lens.append(len(pal))
+            flat += pal
+    offsets = np.zeros(len(lens) + 1, dtype=np.int64)
+    np.cumsum(lens, out=offsets[1:])
+    return offsets, hex2packed(flat)
+
+
+def _cache_folder():
+    """The app's cache folder, where Qt's CacheLocation puts it."""
+    if sys.platform == 'win32':
+        return os.path.join(os.environ.get('LOCALAPPDATA')
+                            or os.path.expanduser('~'), 'CWExplorer', 'cache')
+    if sys.platform == 'darwin':
+        return os.path.expanduser('~/Library/Caches/CWExplorer')
+    return os.path.join(os.environ.get('XDG_CACHE_HOME')
+                        or os.path.expanduser('~/.cache'), 'CWExplorer')
+
+
+def cache_path(path, name):
+    """
+    The cache database of the index name for the color database at path,
+    in the application cache folder.
+    """
+    folder = _cache_folder()
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.abspath(path)
+    key = hashlib.blake2b(path.encode(), digest_size=6).hexdigest()
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(folder, f'{stem}-{key}.{name}.db')
+
+
+def connect(path, name=None, cache=None):
+    """
+    Opens the color database at path read-only. With an index name, its
+    cache database (cache_path(path, name) unless cache is given) is
+    attached as `cache`.
+    """
+    conn = sqlite3.connect(Path(path).absolute().as_uri() + '?mode=ro',
+                           uri=True, check_same_thread=False)
+    if name is not None:
+        conn.execute('ATTACH DATABASE ? AS cache;',
+                     (cache or cache_path(path, name),))
+    return conn
+
+
+def _stamp(conn):
+    """
+    The change counter of the main database, and the size and
+    modification time of its files.
+    """
+    path = conn.execute('PRAGMA database_list;').fetchone()[2]
+    stamp = []
+    with open(path, 'rb') as f:
+        # Bumped by every commit that does not go through a WAL.
+        stamp.append(f.read(28)[24:].hex())
+    for name in (path, path + '-wal'):
+        try:
+            st = os.stat(name)
+        except OSError:
+            continue
+        stamp.append(f'{st.st_size}:{st.st_mtime_ns}')
+    return ' '.join(stamp)
+
+
+def palette_changes(conn, forget=False):
+    """
+    Compares the palettes table of conn (from connect()) with the digests
+    of the rows its cache was built from, and updates them. Returns the
+    new or edited rows as (rowid, pack, name, json) and the rowids of
+    deleted palettes. With forget, every palette counts as new. Call it
+    in the transaction that updates the cache.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS cache.palette_digest (
+            pal    INTEGER PRIMARY KEY,
+            digest INTEGER NOT NULL
+        );''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS cache.palette_stamp (
+            stamp TEXT NOT NULL
+        );''')
+    if forget:
+        conn.execute('DELETE FROM cache.palette_digest;')
+        conn.execute('DELETE FROM cache.palette_stamp;')
+    # Taken before reading, so a write in between is seen next time.
+    stamp = _stamp(conn)
+    row = conn.execute('SELECT stamp FROM cache.palette_stamp;').fetchone()
+    if row is not None and row[0] == stamp:
+        return [], []
+    known = dict(conn.execute('SELECT pal, digest FROM cache.palette_digest;'))
+    rows, digests = [], []
+    for row in conn.execute('SELECT rowid, pack, name, json FROM palettes;'):
+        digest = int.from_bytes(hashlib.blake2b(
+            '\0'.join(map(str, row[1:])).encode(), digest_size=8).digest(),
+            'big', signed=True)
+        if known.pop(row[0], None) != digest:
+            rows.append(row)
+            digests.append((row[0], digest))
+    deleted = list(known)
+    conn.executemany('DELETE FROM cache.palette_digest WHERE pal = ?;',
+                     ((pal,) for pal in deleted))
+    conn.executemany('INSERT OR REPLACE INTO cache.palette_digest '
+                     'VALUES (?, ?);', digests)
+    conn.execute('DELETE FROM cache.palette_stamp;')
+    conn.execute('INSERT INTO cache.palette_stamp VALUES (?);', (stamp,))
+    return rows, deleted
+
+
+class PaletteRepository():
+    """Cached, read-mostly access to the palettes in color.db."""
+
+    def __init__(self, path='color.db', cache_size=512):
+        self.path = path
+        self.cache_size = cache_size
+        self.conn = connect(path)
+        self.lock = threading.RLock()
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._packs = None
+        self._names = {}
+
+    def close(self):
+        self.conn.close()
+
+    def packs(self):
+        """Returns the sorted list of palette pack names."""
+        with self.lock:
+            if self._packs is None:
+                with metrics.timer('sql.packs'):
+                    self._packs = [row[0] for row in self.conn.execute('''
+                        SELECT DISTINCT pack FROM palettes ORDER BY pack;''')]
+            return list(self._packs)
+
+    def names(self, pack):
+        """Returns the sorted palette names in a pack."""
+        with self.lock:
+            names = self._names.get(pack)
+            if names is None:
+                with metrics.timer('sql.names'):
+                    names = [row[0] for row in self.conn.execute('''
+                        SELECT name FROM palettes
+                         WHERE pack = ? ORDER BY name;''', (pack,))]
+                self._names[pack] = names
+            return list(names)
+
+    def palette(self, pack, name):
+        """
+        Returns the palette (pack, name) as a list of hex strings, or None
+        if there is no such palette. Like load_packed(), it skips swatches
+        that are not '#RRGGBB'.
+        """
+        key = (pack, name)
+        with self.lock:
+            pal = self.cache.get(key)
+            if pal is not None:
+                self.hits += 1
+                metrics.count('repo.cache_hits')
+                self.cache.move_to_end(key)
+                return list(pal)
+            self.misses += 1
+            metrics.count('repo.cache_misses')
+            with metrics.timer('sql.palette'):
+                row = self.conn.execute('''
+                    SELECT json FROM palettes
+                     WHERE pack = ? AND name = ? LIMIT 1;''', key).fetchone()
+            if row is None:
+                return None
+            with metrics.timer('json.decode'):
+                pal = _swatches(row[0])
+            self.cache[key] = pal
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+            return list(pal)
+
+    def packed(self, pack, name):
+        """
+        Returns the palette (pack, name) as a uint32 array of 0xRRGGBB
+        values, or None if there is no such palette.
+        """
+        pal = self.palette(pack, name)
+        return None if pal is None else hex2packed(pal)
+
+    def page(self, pack, after=None, limit=100):
+        """
+        Returns up to limit (name, packed) rows of a pack in name order,
+        starting after the cursor `after`, and the cursor for the next
+        page. Pages are read by key, so deep pages cost the same as the
+        first, and bypass the palette cache.
+        """
+        name, rowid = after if after is not None else ('', 0)
+        with self.lock, metrics.timer('sql.page'):
+            rows = self.conn.execute('''
+                SELECT name, rowid, json FROM palettes
+                 WHERE pack = ? AND (name, rowid) > (?, ?)
+                 ORDER BY name, rowid LIMIT ?;''',
+                (pack, name, rowid, limit)).fetchall()
+        if not rows:
+            return [], after
+        offsets, packed = load_packed(row[2] for row in rows)
+        split = np.split(packed, offsets[1:-1])
+        return [(row[0], pal) for row, pal in zip(rows, split)], rows[-1][:2]
+
+    def invalidate(self):
+        """Drops all cached data, e.g. after the palettes table changed."""
+        with self.lock:
+            self.cache.clear()
+            self._packs = None
+            self._names.clear()
+
+    def stats(self):
+        """Returns the palette cache counters."""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'size': len(self.cache),
+                'capacity': self.cache_size,
+            }
@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+"""
+Palette search.
+
+PaletteSearch keeps two side structures in its cache database (see
+palrepo.connect) and queries them:
+
+    palettes_fts   an FTS5 index over the pack and name of every palette
+    palette_sig    the color signature of every palette: one row per
+                   (Lab bin, palette rowid, color), clustered by bin
+
+Text queries are prefix matches ranked by bm25. "Palettes containing a
+color near X" looks up only the signature rows in the bins around X and
+computes the exact CIE76 delta E for those, so no palette JSON is decoded
+at query time.
+
+The side tables are brought up to date by sync(): added, edited and
+deleted palettes are reindexed incrementally; a new bin size rebuilds
+them.
+"""
+
+import re
+import sys
+import threading
+
+import numpy as np
+
+import metrics
+from palrepo import connect, load_packed, palette_changes
+from vconv import hex2packed, packed2lab
+
+__all__ = ['PaletteSearch']
+
+_TERMRE = re.compile(r'\w+', re.UNICODE)
+
+# Lab bin grid: L in [0,100], a and b in about [-128,128].
+_AB_OFFSET = 128.0
+
+
+class PaletteSearch():
+    """Full-text and color similarity search over the palettes table."""
+
+    def __init__(self, path='color.db', bin_size=10.0, cache=None):
+        self.path = path
+        self.bin_size = float(bin_size)
+        self.axis = int(np.ceil(2 * _AB_OFFSET / self.bin_size)) + 1
+        self.conn = connect(path, 'search', cache)
+        self.lock = threading.RLock()
+        self.sync()
+
+    def close(self):
+        self.conn.close()
+
+    ### Index maintenance
+
+    def _meta(self):
+        return dict(self.conn.execute(
+            'SELECT key, value FROM cache.search_meta;'))
+
+    def sync(self):
+        """
+        Brings the side tables up to date with palettes. Returns the number
+        of palettes indexed.
+        """
+        with self.lock, self.conn:
+            self.conn.executescript('''
+                CREATE TABLE IF NOT EXISTS cache.search_meta (
+                    key TEXT PRIMARY KEY,
+                    value
+                );
+                CREATE VIRTUAL TABLE IF NOT EXISTS cache.palettes_fts
+                    USING fts5 (pack, name);
+                CREATE TABLE IF NOT EXISTS cache.palette_sig (
+                    bin   INTEGER NOT NULL,
+                    pal   INTEGER NOT NULL,
+                    color INTEGER NOT NULL,
+                    PRIMARY KEY (bin, pal, color)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS cache.palette_sig_pal
+                    ON palette_sig (pal);''')
+            forget = self._meta().get('bin_size') != self.bin_size
+            if forget:
+                self.conn.execute('DELETE FROM cache.palette_sig;')
+                self.conn.execute('DELETE FROM cache.palettes_fts;')
+            rows, deleted = palette_changes(self.conn, forget)
+            if not forget:
+                gone = [(pal,) for pal in [row[0] for row in rows] + deleted]
+                self.conn.executemany(
+                    'DELETE FROM cache.palettes_fts WHERE rowid = ?;', gone)
+                self.conn.executemany(
+                    'DELETE FROM cache.palette_sig WHERE pal = ?;', gone)
+            self.conn.executemany(
+                'INSERT INTO cache.palettes_fts (rowid, pack, name) '
+                'VALUES (?, ?, ?);', (row[:3] for row in rows))
+            self._index_sigs(rows)
+            self.conn.execute(
+                'INSERT OR REPLACE INTO cache.search_meta VALUES (?, ?);',
+                ('bin_size', self.bin_size))
+        return len(rows)
+
+    def _index_sigs(self, rows):
+        offsets, packed = load_packed(row[3] for row in rows)
+        if len(packed):
+            pals = np.repeat([row[0] for row in rows], np.diff(offsets))
+            bins = self._bins(packed2lab(packed))
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO cache.palette_sig VALUES (?, ?, ?);',
+                zip(bins.tolist(), pals.tolist(), packed.tolist()))
+
+    ### Lab bins
+
+    def _coords(self, lab):
+        shifted = np.asarray(lab) + (0.0, _AB_OFFSET, _AB_OFFSET)
+        coords = np.floor(shifted / self.bin_size).astype(np.int64)
+        return np.clip(coords, 0, self.axis - 1)
+
+    def _bins(self, lab):
+        c = self._coords(lab)
+        return (c[..., 0] * self.axis + c[..., 1]) * self.axis + c[..., 2]
+
+    def _bins_near(self, lab, radius):
+        """Bins that may hold colors within radius of lab."""
+        lo = self._coords(np.asarray(lab) - radius)
+        hi = self._coords(np.asarray(lab) + radius)
+        axes = [np.arange(lo[i], hi[i] + 1) for i in range(3)]
+        grid = np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1)
+        grid = grid.reshape(-1, 3)
+        return ((grid[:, 0] * self.axis + grid[:, 1]) * self.axis
+                + grid[:, 2]).tolist()
+
+    ### Queries
+
+    @staticmethod
+    def fts_query(text):
+        """Turns user input into an FTS5 query of prefix terms."""
+        return ' '.join(f'"{t}"*' for t in _TERMRE.findall(text))
+
+    def text(self, text, limit=500):
+        """
+        Returns (pack, name) of the palettes whose pack or name contain
+        words starting with every word of text, best matches first.
+        """
+        query = self.fts_query(text)
+        if not query:
+            return []
+        with self.lock:
+            return self.conn.execute('''
+                SELECT pack, name FROM cache.palettes_fts
+                 WHERE palettes_fts MATCH ?
+                 ORDER BY rank LIMIT ?;''', (query, limit)).fetchall()
+
+    def _near_rows(self, color, radius, rowids=None):
+        """Rowid and delta E of palettes with a color within radius."""
+        q = packed2lab(hex2packed([color]))[0]
+        bins = self._bins_near(q, radius)
+        with self.lock:
+            rows = self.conn.execute(f'''
+                SELECT pal, color FROM cache.palette_sig
+                 WHERE bin IN ({','.join('?' * len(bins))});''',
+                bins).fetchall()
+        if not rows:
+            return np.zeros(0, np.int64), np.zeros(0)
+        rows = np.array(rows, dtype=np.int64)
+        pal = rows[:, 0]
+        d = np.sqrt(((packed2lab(rows[:, 1]) - q) ** 2).sum(axis=1))
+        keep = d <= radius
+        if rowids is not None:
+            keep &= np.isin(pal, rowids)
+        pal, d = pal[keep], d[keep]
+        if not len(pal):
+            return np.zeros(0, np.int64), np.zeros(0)
+        # Best distance per palette, nearest first.
+        order = np.lexsort((d, pal))
+        pal, d = pal[order], d[order]
+        first = np.r_[True, pal[1:] != pal[:-1]]
+        pal, d = pal[first], d[first]
+        order = np.argsort(d, kind='stable')
+        return pal[order], d[order]
+
+    def near(self, color, radius=10.0, limit=500):
+        """
+        Returns (pack, name, delta_e) of the palettes containing a color
+        within radius (CIE76) of the hex color, nearest first.
+        """
+        return self.search(color=color, radius=radius, limit=limit)
+
+    @metrics.timed('sql.search')
+    def search(self, text='', color=None, radius=10.0, limit=500):
+        """
+        Combined search. With text only, returns (pack, name, None) in rank
+        order; with a color, (pack, name, delta_e) nearest first, limited
+        to text matches if text is given.
+        """
+        query = self.fts_query(text)
+        if color is None:
+            return [(p, n, None) for p, n in self.text(text, limit)]
+        rowids = None
+        if query:
+            with self.lock:
+                rowids = [r[0] for r in self.conn.execute('''
+                    SELECT rowid FROM cache.palettes_fts
+                     WHERE palettes_fts MATCH ?;''', (query,))]
+        pal, d = self._near_rows(color, radius, rowids)
+        pal, d = pal[:limit].tolist(), d[:limit].tolist()
+        if not pal:
+            return []
+        with self.lock:
+            names = dict((r[0], r[1:]) for r in self.conn.execute(f'''
+                SELECT rowid, pack, name FROM palettes
+                 WHERE rowid IN ({','.join('?' * len(pal))});''', pal))
+        return [names[p] + (dist,) for p, dist in zip(pal, d) if p in names]
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+    parser = argparse.ArgumentParser(description='Search palettes.')
+    parser.add_argument('text', nargs='?', default='')
+    parser.add_argument('--db', default='color.db')
+    parser.add_argument('--near', metavar='#RRGGBB',
+                        help='palettes containing a color near this one')
+    parser.add_argument('--radius', type=float, default=10.0,
+                        help='delta E for --near (default 10)')
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+    t0 = time.perf_counter()
+    ps = PaletteSearch(args.db)
+    print(f'index ready in {(time.perf_counter() - t0) * 1e3:.1f} ms',
+          file=sys.stderr)
+    t0 = time.perf_counter()
+    results = ps.search(args.text, args.near, args.radius, args.limit)
+    elapsed = time.perf_counter() - t0
+    for pack, name, d in results:
+        print(f'{pack}/{name}' + ('' if d is None else f'  dE={d:.2f}'))
+    print(f'{len(results)} results in {elapsed * 1e3:.2f} ms',
+          file=sys.stderr)
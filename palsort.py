@@ -0,0 +1,143 @@
+"""
+Perceptual swatch ordering.
+
+Generated palettes come out in random order. order() finds a better one
+from the CIE L*a*b* coordinates of the swatches:
+
+    Hue        by Lab hue angle, grays (low chroma) first by lightness
+    Lightness  by L*, darkest first
+    Path       a short path through the swatches, so neighbours look
+               alike: nearest-neighbour from the darkest swatch, then
+               2-opt on the full delta E matrix until no move helps,
+               for at most PASSES passes
+
+2-opt is vectorized: every pass computes the gain of all O(n^2) segment
+reversals at once and applies the best non-overlapping ones together.
+The path is open; a dummy node at distance 0 from every swatch closes it
+so the ends are free to move.
+
+The result only depends on the swatches, so generated and imported
+palettes sort the same on any machine. The interactive Sort can also
+give a time budget, which may stop 2-opt earlier on a busy machine.
+"""
+
+import time
+
+import numpy as np
+
+import metrics
+from vconv import hex2packed, packed2hex, packed2lab
+
+__all__ = ['METHODS', 'BUDGET', 'order', 'sort_packed', 'sort_hex']
+
+METHODS = ('Hue', 'Lightness', 'Path')
+
+# Most 2-opt passes of a Path sort; 250 swatches settle in about 15.
+PASSES = 20
+
+# Seconds the interactive Path sort may spend on 2-opt.
+BUDGET = 0.03
+
+# Chroma below which a swatch sorts as a gray by Hue.
+GRAY_CHROMA = 8.0
+
+
+def _hue_order(lab):
+    chroma = np.hypot(lab[:, 1], lab[:, 2])
+    hue = np.arctan2(lab[:, 2], lab[:, 1]) % (2 * np.pi)
+    gray = chroma < GRAY_CHROMA
+    return np.lexsort((lab[:, 0], np.where(gray, -1.0, hue)))
+
+
+def _nearest_path(dist, start):
+    n = len(dist)
+    path = np.empty(n, dtype=np.int64)
+    seen = np.zeros(n, dtype=bool)
+    cur = start
+    for k in range(n):
+        path[k] = cur
+        seen[cur] = True
+        if k < n - 1:
+            row = np.where(seen, np.inf, dist[cur])
+            cur = int(row.argmin())
+    return path
+
+
+def _two_opt(dist, tour, passes, deadline=None):
+    """
+    Improves the closed tour in place with 2-opt moves until none helps,
+    after passes passes, or once the deadline (if any) passes.
+    """
+    m = len(tour)
+    # Pairs of edges (i, i+1) and (j, j+1) with j >= i + 2 that are not
+    # the same two edges around the wrap.
+    i, j = np.triu_indices(m, 2)
+    keep = ~((i == 0) & (j == m - 1))
+    i, j = i[keep], j[keep]
+    for _ in range(passes):
+        if deadline is not None and time.perf_counter() >= deadline:
+            break
+        nxt = np.roll(tour, -1)
+        gain = (dist[tour[i], tour[j]] + dist[nxt[i], nxt[j]]
+                - dist[tour[i], nxt[i]] - dist[tour[j], nxt[j]])
+        better = np.flatnonzero(gain < -1e-9)
+        if not len(better):
+            break
+        # Reversals of disjoint segments do not change each other's gain.
+        used = np.zeros(m + 1, dtype=bool)
+        for k in better[np.argsort(gain[better])].tolist():
+            a, b = i[k], j[k]
+            if used[a:b + 2].any():
+                continue
+            used[a:b + 2] = True
+            tour[a + 1:b + 1] = tour[a + 1:b + 1][::-1].copy()
+    return tour
+
+
+def _path_order(lab, passes, budget):
+    deadline = None if budget is None else time.perf_counter() + budget
+    n = len(lab)
+    dist = np.zeros((n + 1, n + 1), dtype=np.float32)
+    diff = lab[:, None, :] - lab[None, :, :]
+    dist[1:, 1:] = np.sqrt((diff * diff).sum(axis=-1))
+    start = int(lab[:, 0].argmin())
+    path = _nearest_path(dist[1:, 1:], start)
+    tour = np.concatenate([[0], path + 1])
+    tour = _two_opt(dist, tour, passes, deadline)
+    path = tour[1:] - 1
+    # Run dark to light.
+    if lab[path[0], 0] > lab[path[-1], 0]:
+        path = path[::-1]
+    return path
+
+
+@metrics.timed('palsort.order')
+def order(packed, method='Path', budget=None, passes=PASSES):
+    """
+    Returns the indices that sort the 0xRRGGBB swatches packed by method
+    (one of METHODS). The 2-opt of a Path sort runs at most passes
+    passes, and, if budget is given, at most budget seconds; only
+    without a budget is the order the same on every run.
+    """
+    packed = np.asarray(packed, dtype=np.uint32)
+    if len(packed) < 3:
+        return np.argsort(packed2lab(packed)[:, 0], kind='stable')
+    lab = packed2lab(packed)
+    if method == 'Hue':
+        return _hue_order(lab)
+    if method == 'Lightness':
+        return np.lexsort((_hue_order(lab).argsort(), lab[:, 0]))
+    if method == 'Path':
+        return _path_order(lab, passes, budget)
+    raise ValueError(f'Unknown sort: {method}')
+
+
+def sort_packed(packed, method='Path', budget=None):
+    """Returns the swatches of packed sorted by method."""
+    packed = np.asarray(packed, dtype=np.uint32)
+    return packed[order(packed, method, budget)]
+
+
+def sort_hex(hexes, method='Path', budget=None):
+    """Returns a list of '#RRGGBB' swatches sorted by method."""
+    return packed2hex(sort_packed(hex2packed(hexes), method, budget))
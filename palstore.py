@@ -0,0 +1,330 @@
+#!/usr/bin/env python
+"""
+Binary palette store.
+
+A palette store (.cwp) holds palettes as packed 0xRRGGBB uint32 values
+plus a small index, and is read through a read-only memory map, so
+opening it costs nothing and a palette is a zero-copy slice of the file.
+It is an alternative to the JSON text in the `palettes` table of
+color.db for large, generated libraries.
+
+Layout (little-endian, every section 8-byte aligned):
+
+    header       MAGIC, version, counts and section offsets (_HEADER)
+    colors       uint32[n_colors]      all swatches, palette after palette
+    pal_offsets  uint64[n_pal + 1]     palette i is colors[o[i]:o[i+1]]
+    pack_starts  uint64[n_packs + 1]   pack j holds palettes s[j]..s[j+1]-1
+    str_offsets  uint64[n_packs + n_pal + 1]
+    strings      UTF-8 pack names, then palette names
+
+Palettes are sorted by (pack, name), so a pack is a contiguous range.
+
+    python palstore.py import color.db palettes.cwp
+    python palstore.py export palettes.cwp color.db
+    python palstore.py info palettes.cwp
+"""
+
+import json
+import os
+import sqlite3
+import struct
+import sys
+import threading
+
+import numpy as np
+
+import palsort
+from palrepo import load_packed
+from vconv import packed2hex
+
+__all__ = ['PaletteStore', 'write_store', 'import_db', 'export_db']
+
+MAGIC = b'CWPSTORE'
+VERSION = 1
+
+# magic, version, flags, n_pal, n_colors, n_packs, then the byte offsets
+# of colors, pal_offsets, pack_starts, str_offsets, strings and the end.
+_HEADER = struct.Struct('<8sIIQQQ6Q')
+
+
+
+def _align(n):
+    return (n + 7) & ~7
+
+
+def write_store(path, pals):
+    """
+    Writes a palette store from an iterable of (pack, name, palette),
+    where palette is a sequence of packed 0xRRGGBB ints or a uint32 array.
+    The file is written to a temporary name and renamed into place.
+    Returns the number of palettes written.
+    """
+    keys, chunks, lens = [], [], []
+    for pack, name, pal in pals:
+        keys.append((pack, name))
+        pal = np.asarray(pal, dtype=np.uint32).ravel()
+        chunks.append(pal)
+        lens.append(len(pal))
+    # Stable sort, so duplicate (pack, name) keep their input order.
+    order = sorted(range(len(keys)), key=keys.__getitem__)
+    lens = np.asarray(lens, dtype=np.uint64)
+    offsets = np.zeros(len(keys) + 1, dtype=np.uint64)
+    np.cumsum(lens[order], out=offsets[1:])
+    colors = np.concatenate([chunks[i] for i in order]) if order \
+        else np.zeros(0, dtype=np.uint32)
+
+    packs, starts = [], []
+    for i, k in enumerate(order):
+        if not packs or keys[k][0] != packs[-1]:
+            packs.append(keys[k][0])
+            starts.append(i)
+    starts.append(len(keys))
+    strings = [p.encode('utf-8') for p in packs] \
+        + [keys[k][1].encode('utf-8') for k in order]
+    str_offsets = np.zeros(len(strings) + 1, dtype=np.uint64)
+    np.cumsum([len(s) for s in strings], out=str_offsets[1:])
+
+    sections = [
+        colors.astype('<u4'),
+        offsets.astype('<u8'),
+        np.asarray(starts, dtype='<u8'),
+        str_offsets.astype('<u8'),
+        np.frombuffer(b''.join(strings), dtype=np.uint8),
+    ]
+    pos = _align(_HEADER.size)
+    where = []
+    for arr in sections:
+        where.append(pos)
+        pos = _align(pos + arr.nbytes)
+    header = _HEADER.pack(MAGIC, VERSION, 0, len(keys), len(colors),
+                          len(packs), *where, pos)
+
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(header)
+        for off, arr in zip(where, sections):
+            f.seek(off)
+            f.write(arr.tobytes())
+        f.truncate(pos)
+    os.replace(tmp, path)
+    return len(keys)
+
+
+class PaletteStore():
+    """
+    Read-only, memory-mapped palette store. Offers the same lookups as
+    PaletteRepository (packs, names, palette, packed), so either can back
+    a PaletteSelector.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.mm = np.memmap(path, dtype=np.uint8, mode='r')
+        if len(self.mm) < _HEADER.size:
+            raise ValueError(f'{path}: not a palette store')
+        (magic, version, _, self.n_pal, self.n_colors, self.n_packs,
+         *where) = _HEADER.unpack(self.mm[:_HEADER.size].tobytes())
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path}: not a version {VERSION} palette store')
+        c, po, ps, so, st, end = where
+        self.colors = self._view(c, '<u4', self.n_colors)
+        self.offsets = self._view(po, '<u8', self.n_pal + 1)
+        self.starts = self._view(ps, '<u8', self.n_packs + 1)
+        self.str_offsets = self._view(so, '<u8', self.n_packs + self.n_pal + 1)
+        self.strings = self.mm[st:end]
+        self.lock = threading.Lock()
+        self._packs = None
+        self._names = {}
+        self._index = {}
+
+    def _view(self, off, dtype, count):
+        size = np.dtype(dtype).itemsize * count
+        return self.mm[off:off + size].view(dtype)
+
+    def _string(self, i):
+        return self._strings(i, i + 1)[0]
+
+    def _strings(self, lo, hi):
+        o = self.str_offsets[lo:hi + 1].tolist()
+        blob = self.strings[o[0]:o[-1]].tobytes()
+        base = o[0]
+        return [blob[a - base:b - base].decode('utf-8')
+                for a, b in zip(o[:-1], o[1:])]
+
+    def close(self):
+        """Drops the map; it is unmapped once no slices of it remain."""
+        self.mm = self.colors = self.offsets = self.strings = None
+
+    def __len__(self):
+        return self.n_pal
+
+    def __getitem__(self, i):
+        """Palette i as a zero-copy uint32 slice of the map."""
+        return self.colors[self.offsets[i]:self.offsets[i + 1]]
+
+    def packs(self):
+        """Returns the sorted list of pack names."""
+        with self.lock:
+            if self._packs is None:
+                self._packs = self._strings(0, self.n_packs)
+        return list(self._packs)
+
+    def _pack_range(self, pack):
+        packs = self.packs()
+        j = packs.index(pack) if pack in packs else -1
+        if j < 0:
+            return 0, 0
+        return int(self.starts[j]), int(self.starts[j + 1])
+
+    def names(self, pack):
+        """Returns the sorted palette names in a pack."""
+        with self.lock:
+            names = self._names.get(pack)
+        if names is None:
+            lo, hi = self._pack_range(pack)
+            names = self._strings(self.n_packs + lo, self.n_packs + hi)
+            index = {}
+            for i, name in enumerate(names, lo):
+                index.setdefault(name, i)
+            with self.lock:
+                self._names[pack] = names
+                self._index[pack] = index
+        return list(names)
+
+    def find(self, pack, name):
+        """Returns the index of palette (pack, name), or -1."""
+        if pack not in self._index:
+            self.names(pack)
+        return self._index[pack].get(name, -1)
+
+    def packed(self, pack, name):
+        """
+        Returns the palette (pack, name) as a zero-copy uint32 array of
+        0xRRGGBB values, or None if there is no such palette.
+        """
+        i = self.find(pack, name)
+        return None if i < 0 else self[i]
+
+    def page(self, pack, after=None, limit=100):
+        """
+        Returns up to limit (name, packed) rows of a pack after the cursor
+        `after`, and the cursor for the next page, like
+        PaletteRepository.page(). The arrays are views into the map.
+        """
+        names = self.names(pack)
+        lo, hi = self._pack_range(pack)
+        start = lo if after is None else after
+        stop = min(start + limit, hi)
+        return [(names[i - lo], self[i]) for i in range(start, stop)], stop
+
+    def palette(self, pack, name):
+        """Returns the palette (pack, name) as hex strings, or None."""
+        pal = self.packed(pack, name)
+        return None if pal is None else packed2hex(pal)
+
+    def invalidate(self):
+        pass
+
+    def items(self):
+        """Yields (pack, name, packed) for every palette, in order."""
+        for pack in self.packs():
+            lo, hi = self._pack_range(pack)
+            for i, name in enumerate(self.names(pack), lo):
+                yield pack, name, self[i]
+
+
+def import_db(db, path, packs=None, batch=10000, sort=None):
+    """
+    Copies the palettes table of color.db (or some of its packs) into a
+    palette store. Swatches that are not '#RRGGBB' are skipped, and with
+    sort (a palsort method) the swatches of every palette are reordered.
+    Returns the number of palettes written.
+    """
+    conn = sqlite3.connect(db)
+    query = 'SELECT pack, name, json FROM palettes'
+    params = ()
+    if packs:
+        query += f" WHERE pack IN ({','.join('?' * len(packs))})"
+        params = tuple(packs)
+    cur = conn.execute(query + ' ORDER BY pack, name, rowid;', params)
+
+    def rows():
+        while True:
+            block = cur.fetchmany(batch)
+            if not block:
+                return
+            offsets, packed = load_packed(text for _, _, text in block)
+            for (pack, name, _), pal in zip(
+                    block, np.split(packed, offsets[1:-1])):
+                if sort is not None:
+                    pal = palsort.sort_packed(pal, sort, budget=None)
+                yield pack, name, pal
+
+    try:
+        return write_store(path, rows())
+    finally:
+        conn.close()
+
+
+def export_db(path, db, batch=50000):
+    """
+    Appends every palette of a store to the palettes table of color.db as
+    JSON hex lists. Returns the number of palettes written.
+    """
+    store = PaletteStore(path)
+    conn = sqlite3.connect(db)
+    total = 0
+    try:
+        rows = []
+        for pack, name, pal in store.items():
+            rows.append((pack, name, json.dumps(packed2hex(pal))))
+            if len(rows) >= batch:
+                with conn:
+                    conn.executemany('INSERT INTO palettes (pack, name, json) '
+                                     'VALUES (?, ?, ?);', rows)
+                total += len(rows)
+                rows = []
+        with conn:
+            conn.executemany('INSERT INTO palettes (pack, name, json) '
+                             'VALUES (?, ?, ?);', rows)
+        total += len(rows)
+    finally:
+        conn.close()
+        store.close()
+    return total
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+    parser = argparse.ArgumentParser(description='Binary palette stores.')
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    p = sub.add_parser('import', help='palettes table -> store')
+    p.add_argument('db')
+    p.add_argument('store')
+    p.add_argument('--pack', action='append', help='only this pack '
+                   '(repeatable)')
+    p.add_argument('--sort', type=str.capitalize, choices=palsort.METHODS,
+                   help='reorder the swatches of every palette')
+    p = sub.add_parser('export', help='store -> palettes table')
+    p.add_argument('store')
+    p.add_argument('db')
+    p = sub.add_parser('info', help='summarize a store')
+    p.add_argument('store')
+    args = parser.parse_args()
+    t0 = time.perf_counter()
+    if args.cmd == 'import':
+        n = import_db(args.db, args.store, args.pack, sort=args.sort)
+        print(f'{n} palettes written to {args.store}', file=sys.stderr)
+    elif args.cmd == 'export':
+        n = export_db(args.store, args.db)
+        print(f'{n} palettes added to {args.db}', file=sys.stderr)
+    else:
+        store = PaletteStore(args.store)
+        print(f'{store.n_pal} palettes, {store.n_colors} colors, '
+              f'{store.n_packs} packs, '
+              f'{os.path.getsize(args.store)} bytes')
+        for pack in store.packs():
+            lo, hi = store._pack_range(pack)
+            print(f'  {pack}: {hi - lo}')
+    print(f'{(time.perf_counter() - t0) * 1e3:.1f} ms', file=sys.stderr)
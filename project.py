@@ -0,0 +1,386 @@
+"""
+Project files.
+
+A project (.cwx) is an SQLite file holding the work area palette and its
+undo history, the tool settings, and any number of stored palettes:
+
+    meta       key/value JSON: format, journal id, tool settings, history
+               base state and index
+    history    one row per undo entry: text, merge key, encoded state
+    palettes   stored palettes (pack, name, colors as little-endian
+               uint32 0xRRGGBB)
+
+Opening is lazy: the file is attached read-only and only meta and
+history are read, so stored palettes are paged in by whoever browses
+them. Palettes stored since the last save live in memory until then.
+
+Saving writes a complete new file next to the old one and renames it
+into place, so a project on disk is always whole. Between saves every
+change is appended to a journal (<project>.journal, JSON Lines) by a
+background thread; opening a project replays the journal left behind by
+a session that did not save.
+"""
+
+import json
+import os
+import queue
+import sqlite3
+import threading
+import uuid
+
+import numpy as np
+
+from vconv import hex2packed, packed2hex
+
+__all__ = ['Project', 'Journal', 'FORMAT', 'AUTOSAVE', 'autosavePath']
+
+FORMAT = 1
+
+# The untitled project, whose journal lives in the app data folder.
+AUTOSAVE = 'autosave.cwx'
+
+def autosavePath():
+    """The untitled project's path, in the application data folder."""
+    from PySide6.QtCore import QCoreApplication, QStandardPaths
+    folder = QStandardPaths.writableLocation(
+        QStandardPaths.StandardLocation.AppDataLocation)
+    if not QCoreApplication.applicationName():
+        # Not named yet (no application, e.g. a script): use the app's.
+        folder = os.path.join(folder, 'CWExplorer')
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, AUTOSAVE)
+
+
+_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS {db}.meta (
+        key   TEXT PRIMARY KEY,
+        value TEXT
+    );
+    CREATE TABLE IF NOT EXISTS {db}.history (
+        pos   INTEGER PRIMARY KEY,
+        text  TEXT,
+        key   TEXT,
+        state TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS {db}.palettes (
+        pack   TEXT NOT NULL,
+        name   TEXT NOT NULL,
+        colors BLOB NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS {db}.palettes_pack_name
+        ON palettes (pack, name);
+'''
+
+
+def _blob(colors):
+    return np.asarray(colors, dtype='<u4').tobytes()
+
+
+def _unblob(blob):
+    return np.frombuffer(blob, dtype='<u4')
+
+
+class Journal():
+    """
+    Append-only JSON Lines log, written by a background thread so that
+    recording a change never waits on the disk. The first line names the
+    project version (journal id) the records apply to.
+    """
+    def __init__(self, path, jid):
+        self.path = path
+        self.jid = jid
+        self.queue = queue.SimpleQueue()
+        self.thread = None
+
+    def write(self, record):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, daemon=True,
+                                           name='cwx-journal')
+            self.thread.start()
+        self.queue.put(record)
+
+    def _run(self):
+        fresh = not os.path.exists(self.path)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            if fresh:
+                f.write(json.dumps({'op': 'begin', 'id': self.jid}) + '\n')
+            while True:
+                record = self.queue.get()
+                if record is None:
+                    return
+                f.write(json.dumps(record) + '\n')
+                if self.queue.empty():
+                    f.flush()
+
+    def close(self):
+        """Writes out what is queued and stops the writer."""
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def discard(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    @staticmethod
+    def read(path, jid=None):
+        """
+        Returns the records of the journal at path, or [] if there is none
+        or it belongs to another version of the project (unless jid is
+        None). A torn last line is ignored.
+        """
+        if not os.path.exists(path):
+            return []
+        records = []
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    break
+        if not records or records[0].get('op') != 'begin':
+            return []
+        if jid is not None and records[0].get('id') != jid:
+            return []
+        return records[1:]
+
+
+class Project():
+    """
+    An open project. Also a palette source for the PaletteBrowser and
+    PaletteSelector (packs, names, page, packed, palette).
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(':memory:', check_same_thread=False,
+                                    isolation_level=None, uri=True)
+        self.conn.executescript(_SCHEMA.format(db='main'))
+        self._attach(path)
+        self.meta = self._readMeta()
+        self.jid = self.meta.get('journal', uuid.uuid4().hex)
+        self.journal = Journal(self.journalPath(), self.jid)
+        self.count = self._count()
+        self.replayed = None
+        self.dirty = False
+
+    def journalPath(self):
+        return (self.path or autosavePath()) + '.journal'
+
+    def _attach(self, path):
+        if path is not None and os.path.exists(path):
+            uri = 'file:' + os.path.abspath(path) + '?mode=ro'
+            self.conn.execute("ATTACH ? AS base;", (uri,))
+        else:
+            self.conn.execute("ATTACH ':memory:' AS base;")
+            self.conn.executescript(_SCHEMA.format(db='base'))
+        self.conn.execute('''
+            CREATE TEMP VIEW IF NOT EXISTS allpal AS
+                SELECT pack, name, colors, 0 AS src, rowid AS rid
+                  FROM base.palettes
+                UNION ALL
+                SELECT pack, name, colors, 1, rowid FROM main.palettes;''')
+
+    def _readMeta(self):
+        return {k: json.loads(v) for k, v in self.conn.execute(
+            'SELECT key, value FROM base.meta;')}
+
+    def _count(self):
+        return self.conn.execute('SELECT count(*) FROM allpal;').fetchone()[0]
+
+    @classmethod
+    def open(cls, path):
+        """
+        Opens a project, replaying its journal if the last session ended
+        without saving. path may also name a journal of an unsaved project.
+        """
+        if path.endswith('.journal'):
+            base = path[:-len('.journal')]
+            if os.path.exists(base):
+                project = cls(base)
+                jid = project.jid
+            else:
+                # An unsaved project: the journal is all there is.
+                project = cls(None)
+                jid = None
+            project.journal = Journal(path, project.jid)
+            records = Journal.read(path, jid)
+        else:
+            project = cls(path)
+            records = Journal.read(project.journal.path, project.jid)
+        if not records:
+            # Nothing to recover, or left over from another version.
+            project.journal.discard()
+        project.replay(records)
+        return project
+
+    def close(self):
+        self.journal.close()
+        self.conn.close()
+
+    ### State
+
+    def params(self):
+        """Tool settings saved with the project."""
+        return self.meta.get('params', {})
+
+    def history(self):
+        """
+        The saved undo history as (base, [(text, key, state)], index) with
+        states JSON-encoded, or None if there is none.
+        """
+        if 'base' not in self.meta:
+            return None
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT text, key, state FROM base.history ORDER BY pos;'
+            ).fetchall()
+        entries = [(text, json.loads(key), json.loads(state))
+                   for text, key, state in rows]
+        return self.meta['base'], entries, self.meta.get('index', len(rows))
+
+    def replay(self, records):
+        """Applies journal records on top of the saved state."""
+        hist = self.history()
+        base, entries, index = hist if hist else (None, [], 0)
+        for r in records:
+            op = r.get('op')
+            if op == 'params':
+                self.meta['params'] = r['params']
+            elif op == 'push':
+                # Undone entries are dropped, a merge replaces the top one.
+                del entries[max(0, len(entries) - r['undone']):]
+                if r['merged'] and entries:
+                    entries.pop()
+                if base is None:
+                    base = r['old']
+                entries.append((r['text'], r['key'], r['state']))
+                index = len(entries)
+            elif op == 'index':
+                # Stored as the number of undone entries.
+                index = max(0, len(entries) - r['undone'])
+            elif op == 'store':
+                self._store(r['pack'], r['name'], hex2packed(r['colors']))
+        self.replayed = (base, entries, index) if base is not None else None
+        self.dirty = bool(records)
+
+    def record(self, op, **data):
+        """Appends a change to the journal."""
+        self.dirty = True
+        self.journal.write(dict(op=op, **data))
+
+    ### Stored palettes
+
+    def _store(self, pack, name, colors):
+        with self.lock:
+            self.conn.execute('INSERT INTO main.palettes VALUES (?, ?, ?);',
+                              (pack, name, _blob(colors)))
+            self.count += 1
+
+    def store(self, pack, name, colors):
+        """Adds a palette (packed colors) to the project."""
+        self._store(pack, name, colors)
+        self.record('store', pack=pack, name=name,
+                    colors=packed2hex(colors))
+
+    def packs(self):
+        with self.lock:
+            return [row[0] for row in self.conn.execute(
+                'SELECT DISTINCT pack FROM allpal ORDER BY pack;')]
+
+    def names(self, pack):
+        with self.lock:
+            return [row[0] for row in self.conn.execute('''
+                SELECT name FROM allpal WHERE pack = ?
+                 ORDER BY name, src, rid;''', (pack,))]
+
+    def packed(self, pack, name):
+        with self.lock:
+            row = self.conn.execute('''
+                SELECT colors FROM allpal WHERE pack = ? AND name = ?
+                 ORDER BY src, rid LIMIT 1;''', (pack, name)).fetchone()
+        return None if row is None else _unblob(row[0])
+
+    def palette(self, pack, name):
+        pal = self.packed(pack, name)
+        return None if pal is None else packed2hex(pal)
+
+    def page(self, pack, after=None, limit=100):
+        """Keyset paging like PaletteRepository.page()."""
+        name, src, rid = after if after is not None else ('', -1, 0)
+        with self.lock:
+            rows = self.conn.execute('''
+                SELECT name, src, rid, colors FROM allpal
+                 WHERE pack = ? AND (name, src, rid) > (?, ?, ?)
+                 ORDER BY name, src, rid LIMIT ?;''',
+                (pack, name, src, rid, limit)).fetchall()
+        if not rows:
+            return [], after
+        return [(r[0], _unblob(r[3])) for r in rows], rows[-1][:3]
+
+    def invalidate(self):
+        pass
+
+    ### Saving
+
+    def save(self, path, params, history):
+        """
+        Writes the whole project to path atomically: into path.tmp, which
+        then replaces path. history is (base, entries, index) with encoded
+        states. Afterwards the project is backed by the new file and the
+        journal starts over.
+        """
+        tmp = path + '.tmp'
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        base, entries, index = history
+        jid = uuid.uuid4().hex
+        meta = {'format': FORMAT, 'journal': jid, 'params': params,
+                'base': base, 'index': index}
+        with self.lock:
+            self.conn.execute('ATTACH ? AS out;', (tmp,))
+            try:
+                self.conn.executescript(_SCHEMA.format(db='out'))
+                self.conn.execute('BEGIN;')
+                self.conn.execute('''
+                    INSERT INTO out.palettes
+                    SELECT pack, name, colors FROM allpal
+                     ORDER BY pack, name, src, rid;''')
+                self.conn.executemany(
+                    'INSERT INTO out.meta VALUES (?, ?);',
+                    [(k, json.dumps(v)) for k, v in meta.items()])
+                self.conn.executemany(
+                    'INSERT INTO out.history VALUES (?, ?, ?, ?);',
+                    [(i, text, json.dumps(key), json.dumps(state))
+                     for i, (text, key, state) in enumerate(entries)])
+                self.conn.execute('COMMIT;')
+            except BaseException:
+                # Leave the connection and the old file as they were.
+                if self.conn.in_transaction:
+                    self.conn.execute('ROLLBACK;')
+                self.conn.execute('DETACH out;')
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+            self.conn.execute('DETACH out;')
+            # Windows cannot replace a file SQLite still has open.
+            self.conn.execute('DETACH base;')
+            try:
+                os.replace(tmp, path)
+            except BaseException:
+                self._attach(self.path)
+                os.remove(tmp)
+                raise
+            self.journal.discard()
+            self.conn.execute('DELETE FROM main.palettes;')
+            self.path = path
+            self._attach(path)
+            self.meta = self._readMeta()
+            self.jid = jid
+            self.journal = Journal(self.journalPath(), jid)
+            self.journal.discard()
+        self.dirty = False
+        return path
@@ -0,0 +1,524 @@
+#!/usr/bin/env python
+"""
+Bulk import of color libraries into color.db.
+
+read() turns a file into chunks of colors and palettes:
+
+    .csv          one color per row. A header names the columns: hex (or
+                  color), or r, g and b; and optionally name, subset,
+                  notes, valid and palette. Without a header the columns
+                  are name, hex. Commas, semicolons and tabs all work.
+    .json/.jsonl  a list of color objects with the keys above, an object
+                  mapping names to hex codes (colors) or to lists of them
+                  (palettes), a list of palette objects {"name", "palette"}
+                  like CWGenerate writes, or a single list of hex codes
+    .gpl          a GIMP palette: its named colors, and the palette itself
+    .ase          Adobe Swatch Exchange: its named colors, and a palette
+                  for every group (RGB, CMYK, Lab and Gray swatches)
+
+Named swatches become rows of `colors` in a topset (the file name unless
+given); palettes go to `palettes` in a pack (the topset unless given), and
+a color with a palette column is a swatch of that palette.
+
+Importer writes a chunk at a time. The hex codes of a whole chunk are
+checked and converted to 0xRRGGBB at once, r, g and b for `components`
+come from the packed values, and each chunk is one transaction of
+executemany() calls. The database is switched to WAL so readers, like the
+app, are not blocked by the import. Colors already in the topset with the
+same subset, name and hex, and palettes already in the pack under the
+same name, are skipped; `components` relies on INSERT OR IGNORE against
+its UNIQUE hex.
+
+    python swatchio.py FILE... [--db color.db] [--topset NAME] [--pack NAME]
+"""
+
+import csv
+import json
+import os
+import sqlite3
+import struct
+import sys
+from itertools import compress, repeat
+
+import numpy as np
+
+import metrics
+from vconv import hex2packed, lab_to_rgb, packed2hex, rgb2packed
+
+__all__ = ['FORMATS', 'BATCH', 'parse_hex', 'read', 'Importer',
+           'import_files']
+
+# Rows per chunk, and so per transaction.
+BATCH = 50000
+
+# ASCII code -> is a hex digit.
+_HEXDIGIT = np.zeros(256, dtype=bool)
+_HEXDIGIT[np.frombuffer(b'0123456789ABCDEFabcdef', np.uint8)] = True
+
+_COLUMNS = {
+    'hex': 'hex', 'color': 'hex', 'colour': 'hex',
+    'r': 'r', 'red': 'r', 'g': 'g', 'green': 'g', 'b': 'b', 'blue': 'b',
+    'name': 'name', 'subset': 'subset', 'notes': 'notes', 'valid': 'valid',
+    'palette': 'palette',
+}
+
+_FALSE = {'0', 'false', 'no', 'n', 'f'}
+
+
+def _digits(code):
+    code = str(code).strip().lstrip('#')
+    if len(code) == 3:
+        code = ''.join(c + c for c in code)
+    return code if len(code) == 6 and code.isascii() else 'zzzzzz'
+
+
+@metrics.timed('swatchio.parse_hex')
+def parse_hex(codes):
+    """
+    Converts hex codes ('#RRGGBB', 'RRGGBB' or '#RGB', in any case) to a
+    uint32 array of 0xRRGGBB values. Returns it with a boolean mask of the
+    codes that were valid; the others come out as 0.
+    """
+    n = len(codes)
+    if n == 0:
+        return np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=bool)
+    joined = ''.join(codes)
+    if not (len(joined) == 7 * n and joined[::7] == '#' * n
+            and joined.isascii()):
+        codes = [_digits(code) for code in codes]
+        joined = ''.join(codes)
+    width = len(joined) // n
+    chars = np.frombuffer(joined.encode('ascii'), np.uint8).reshape(n, width)
+    ok = _HEXDIGIT[chars[:, width - 6:]].all(1)
+    if not ok.all():
+        codes = [code if good else '000000' for code, good in zip(codes, ok)]
+    return hex2packed(codes), ok
+
+
+def _flag(value):
+    if value is None:
+        return 1
+    if isinstance(value, str):
+        return 0 if value.strip().lower() in _FALSE else 1
+    return int(bool(value))
+
+
+def _text(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+### Readers
+#
+# A reader yields (colors, palettes) chunks: colors is a list of
+# (subset, name, hex, valid, notes, palette) and palettes a list of
+# (name, [hex, ...]), with hex codes as found in the file.
+
+def _rgb_codes(values):
+    """'#RRGGBB' codes of a list of (r, g, b) byte values."""
+    rgb = np.asarray(values, dtype=np.float64).reshape(-1, 3)
+    return packed2hex(rgb2packed(rgb / 255.0))
+
+
+def _palettes(colors):
+    """The palettes that the palette column of colors adds up to."""
+    pals = {}
+    for row in colors:
+        if row[5]:
+            pals.setdefault(row[5], []).append(row[2])
+    return list(pals.items())
+
+
+def _read_csv(f, stem, batch):
+    head = f.read(4096)
+    f.seek(0)
+    line = head.splitlines()[0] if head else ''
+    delim = max(',;\t', key=line.count)
+    rows = csv.reader(f, delimiter=delim)
+    header = next(rows, None)
+    if header is None:
+        return
+    names = [_COLUMNS.get(h.strip().lower()) for h in header]
+    if any(names):
+        col = {name: i for i, name in reversed(list(enumerate(names)))
+               if name is not None}
+    else:
+        col = {'name': 0, 'hex': 1} if len(header) > 1 else {'hex': 0}
+        rows = _chain([header], rows)
+    if 'hex' not in col and not {'r', 'g', 'b'} <= col.keys():
+        raise ValueError(f'{stem}: no hex or r, g, b columns')
+    width = max(col.values()) + 1
+    rgb = None if 'hex' in col else [col['r'], col['g'], col['b']]
+    # Palettes are only complete at the end of the file.
+    pals = {}
+    while True:
+        block = [row if len(row) >= width else row + [''] * (width - len(row))
+                 for _, row in zip(range(batch), rows) if row]
+        if not block:
+            break
+        # Columns are cleaned up whole.
+        columns = list(zip(*block))
+        n = len(block)
+        text = {key: [v.strip() or None for v in columns[col[key]]]
+                if key in col else [None] * n
+                for key in ('subset', 'name', 'notes', 'palette')}
+        if rgb is None:
+            codes = columns[col['hex']]
+        else:
+            values = np.zeros((n, 3))
+            ok = np.ones(n, dtype=bool)
+            for j, i in enumerate(rgb):
+                digits = [v.strip() for v in columns[i]]
+                good = [v.isdigit() for v in digits]
+                ok &= good
+                values[good, j] = [int(v) for v, g in zip(digits, good) if g]
+            codes = [code if good else ''
+                     for code, good in zip(_rgb_codes(values), ok.tolist())]
+        valid = [_flag(v) for v in columns[col['valid']]] \
+            if 'valid' in col else [1] * n
+        colors = list(zip(text['subset'], text['name'], codes, valid,
+                          text['notes'], text['palette']))
+        if 'palette' in col:
+            for name, codes in _palettes(colors):
+                pals.setdefault(name, []).extend(codes)
+        yield colors, []
+    if pals:
+        yield [], list(pals.items())
+
+
+def _chain(first, rest):
+    yield from first
+    yield from rest
+
+
+def _color_object(obj, name=None):
+    code = obj.get('hex', obj.get('color', obj.get('colour')))
+    if code is None and all(k in obj for k in 'rgb'):
+        code = _rgb_codes([[obj['r'], obj['g'], obj['b']]])[0]
+    return (_text(obj.get('subset')), _text(obj.get('name', name)),
+            code if isinstance(code, str) else '', _flag(obj.get('valid')),
+            _text(obj.get('notes')), _text(obj.get('palette')))
+
+
+def _json_items(items, stem):
+    colors, pals = [], []
+    strings = []
+    for i, item in items:
+        if isinstance(item, str):
+            strings.append(item)
+        elif isinstance(item, list):
+            pals.append((f'{stem}-{i}', item))
+        elif isinstance(item, dict):
+            swatches = item.get('palette', item.get('colors'))
+            if isinstance(swatches, list):
+                pals.append((_text(item.get('name')) or f'{stem}-{i}',
+                             [s for s in swatches if isinstance(s, str)]))
+            else:
+                colors.append(_color_object(item))
+    if strings:
+        pals.append((stem, strings))
+    return colors, pals + _palettes(colors)
+
+
+def _json_object(obj, stem):
+    colors, pals = [], []
+    for name, value in obj.items():
+        if isinstance(value, str):
+            colors.append((None, name, value, 1, None, None))
+        elif isinstance(value, list):
+            pals.append((name, [s for s in value if isinstance(s, str)]))
+        elif isinstance(value, dict):
+            colors.append(_color_object(value, name))
+    return colors, pals + _palettes(colors)
+
+
+def _read_json(f, stem, batch, lines=False):
+    if lines:
+        data = [json.loads(line) for line in f if line.strip()]
+    else:
+        data = json.load(f)
+    if isinstance(data, dict):
+        colors, pals = _json_object(data, stem)
+    elif isinstance(data, list):
+        colors, pals = _json_items(enumerate(data), stem)
+    else:
+        raise ValueError(f'{stem}: not a list or an object')
+    yield from _chunks(colors, pals, batch)
+
+
+def _chunks(colors, pals, batch):
+    for i in range(0, max(len(colors), len(pals), 1), batch):
+        yield colors[i:i + batch], pals[i:i + batch]
+
+
+def _read_gpl(f, stem, batch):
+    lines = f.read().splitlines()
+    if not lines or not lines[0].startswith('GIMP Palette'):
+        raise ValueError(f'{stem}: not a GIMP palette')
+    title = None
+    values, names = [], []
+    for line in lines[1:]:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if line.startswith('Name:'):
+            title = _text(line[5:])
+            continue
+        if line.startswith('Columns:'):
+            continue
+        parts = line.split(None, 3)
+        if len(parts) < 3 or not all(p.isdigit() for p in parts[:3]):
+            continue
+        values.append(parts[:3])
+        names.append(_text(parts[3]) if len(parts) > 3 else None)
+    codes = _rgb_codes(values)
+    colors = [(title, name, code, 1, None, None)
+              for name, code in zip(names, codes)
+              if name is not None and name != 'Untitled']
+    yield from _chunks(colors, [(title or stem, codes)], batch)
+
+
+def _ase_string(data, pos):
+    n, = struct.unpack_from('>H', data, pos)
+    text = data[pos + 2:pos + 2 + 2 * n].decode('utf-16-be').rstrip('\0')
+    return text, pos + 2 + 2 * n
+
+
+def _read_ase(data, stem, batch):
+    if data[:4] != b'ASEF':
+        raise ValueError(f'{stem}: not an Adobe Swatch Exchange file')
+    count, = struct.unpack_from('>I', data, 8)
+    pos = 12
+    group = None
+    entries = []
+    models = {b'RGB ': [], b'CMYK': [], b'LAB ': [], b'Gray': []}
+    for _ in range(count):
+        kind, length = struct.unpack_from('>HI', data, pos)
+        body = pos + 6
+        pos = body + length
+        if kind == 0xC001:
+            group, _ = _ase_string(data, body)
+        elif kind == 0xC002:
+            group = None
+        elif kind == 0x0001:
+            name, at = _ase_string(data, body)
+            model = data[at:at + 4]
+            values = models.get(model)
+            if values is None:
+                continue
+            n = 4 if model == b'CMYK' else 1 if model == b'Gray' else 3
+            values.append(struct.unpack_from(f'>{n}f', data, at + 4))
+            entries.append((group, _text(name), model, len(values) - 1))
+    # Every color model is converted at once.
+    rgb = {b'RGB ': np.array(models[b'RGB '], dtype=np.float64)
+           .reshape(-1, 3)}
+    cmyk = np.array(models[b'CMYK'], dtype=np.float64).reshape(-1, 4)
+    rgb[b'CMYK'] = (1 - cmyk[:, :3]) * (1 - cmyk[:, 3:])
+    lab = np.array(models[b'LAB '], dtype=np.float64).reshape(-1, 3)
+    # L is stored as a fraction, a and b as is.
+    rgb[b'LAB '] = lab_to_rgb(lab * [100.0, 1.0, 1.0])
+    gray = np.array(models[b'Gray'], dtype=np.float64).reshape(-1, 1)
+    rgb[b'Gray'] = np.repeat(gray, 3, axis=1)
+    codes = {model: packed2hex(rgb2packed(values))
+             for model, values in rgb.items()}
+    colors, pals = [], {}
+    for group, name, model, i in entries:
+        code = codes[model][i]
+        pals.setdefault(group or stem, []).append(code)
+        if name is not None:
+            colors.append((group, name, code, 1, None, None))
+    yield from _chunks(colors, list(pals.items()), batch)
+
+
+FORMATS = ('.csv', '.json', '.jsonl', '.gpl', '.ase')
+
+
+def read(path, batch=BATCH):
+    """
+    Yields (colors, palettes) chunks of a color library file; see the
+    module docstring for the formats.
+    """
+    stem, ext = os.path.splitext(os.path.basename(path))
+    ext = ext.lower()
+    if ext == '.ase':
+        with open(path, 'rb') as f:
+            yield from _read_ase(f.read(), stem, batch)
+        return
+    if ext not in FORMATS:
+        raise ValueError(f'{path}: unknown format {ext or "(none)"}')
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        if ext == '.csv':
+            yield from _read_csv(f, stem, batch)
+        elif ext == '.gpl':
+            yield from _read_gpl(f, stem, batch)
+        else:
+            yield from _read_json(f, stem, batch, lines=ext == '.jsonl')
+
+
+### Writing
+
+class Importer():
+    """Writes color library chunks to color.db."""
+
+    def __init__(self, path='color.db'):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL;')
+        self.conn.execute('PRAGMA synchronous=NORMAL;')
+        self.conn.execute('PRAGMA cache_size=-65536;')
+        # PaletteRepository opens databases read-only and relies on it.
+        with self.conn:
+            self.conn.execute('''
+                CREATE INDEX IF NOT EXISTS palettes_pack_name
+                    ON palettes (pack, name);''')
+        self.colors = {}
+        self.names = {}
+        self.counts = dict.fromkeys(
+            ('rows', 'colors', 'palettes', 'components', 'skipped',
+             'invalid'), 0)
+
+    def close(self):
+        self.conn.close()
+
+    def _known_colors(self, topset):
+        known = self.colors.get(topset)
+        if known is None:
+            known = self.colors[topset] = set(self.conn.execute(
+                'SELECT subset, name, hex FROM colors WHERE topset = ?;',
+                (topset,)))
+        return known
+
+    def _known_names(self, pack):
+        known = self.names.get(pack)
+        if known is None:
+            known = self.names[pack] = {row[0] for row in self.conn.execute(
+                'SELECT name FROM palettes WHERE pack = ?;', (pack,))}
+        return known
+
+    @metrics.timed('swatchio.write')
+    def write(self, topset, pack, colors, palettes):
+        """
+        Writes one chunk in a transaction. Returns the number of colors
+        and palettes added.
+        """
+        n = len(colors)
+        columns = list(zip(*colors)) or [()] * 6
+        codes = list(columns[2])
+        for _, swatches in palettes:
+            codes += swatches
+        packed, ok = parse_hex(codes)
+        hexes = packed2hex(packed)
+        okl = ok.tolist()
+        # Rows of valid, named colors by (subset, name, hex); the last of
+        # a duplicate wins.
+        keep = ok[:n] & np.fromiter(map(bool, columns[1]), bool, n)
+        keep = keep.tolist()
+        fresh = dict(zip(
+            compress(zip(columns[0], columns[1], hexes), keep),
+            compress(zip(repeat(topset), columns[0], columns[1], hexes,
+                         columns[3], columns[4]), keep)))
+        known = self._known_colors(topset)
+        for key in fresh.keys() & known:
+            del fresh[key]
+        known.update(fresh)
+        color_rows = list(fresh.values())
+        invalid = n - int(ok[:n].sum())
+        self.counts['invalid'] += invalid
+        self.counts['skipped'] += n - invalid - len(color_rows)
+        known = self._known_names(pack)
+        pal_rows = []
+        at = len(colors)
+        for name, swatches in palettes:
+            end = at + len(swatches)
+            pal = [code for code, good in zip(hexes[at:end], okl[at:end])
+                   if good]
+            self.counts['invalid'] += end - at - len(pal)
+            at = end
+            if not pal or name in known:
+                self.counts['skipped'] += 1
+                continue
+            known.add(name)
+            pal_rows.append((pack, name, json.dumps(pal)))
+        comps = np.unique(packed[ok])
+        comp_rows = zip(packed2hex(comps), ((comps >> 16) & 0xFF).tolist(),
+                        ((comps >> 8) & 0xFF).tolist(),
+                        (comps & 0xFF).tolist())
+        with self.conn:
+            self.conn.executemany(
+                'INSERT INTO colors (topset, subset, name, hex, valid, notes)'
+                ' VALUES (?, ?, ?, ?, ?, ?);', color_rows)
+            self.conn.executemany(
+                'INSERT INTO palettes (pack, name, json) VALUES (?, ?, ?);',
+                pal_rows)
+            added = self.conn.executemany(
+                'INSERT OR IGNORE INTO components (hex, r, g, b) '
+                'VALUES (?, ?, ?, ?);', comp_rows).rowcount
+        self.counts['rows'] += len(colors) + len(palettes)
+        self.counts['colors'] += len(color_rows)
+        self.counts['palettes'] += len(pal_rows)
+        self.counts['components'] += max(added, 0)
+        return len(color_rows), len(pal_rows)
+
+    def import_file(self, path, topset=None, pack=None, batch=BATCH,
+                    progress=None):
+        """
+        Imports a color library file into topset (default: the file name)
+        and its palettes into pack (default: topset). progress(counts) is
+        called after every chunk.
+        """
+        if topset is None:
+            topset = os.path.splitext(os.path.basename(path))[0]
+        for colors, palettes in read(path, batch):
+            self.write(topset, pack or topset, colors, palettes)
+            if progress is not None:
+                progress(dict(self.counts))
+        return dict(self.counts)
+
+
+def import_files(paths, db='color.db', topset=None, pack=None,
+                 batch=BATCH, progress=None):
+    """
+    Imports color library files into db. Returns the counts of rows read,
+    colors, palettes and components added, rows skipped as duplicates or
+    unnamed, and invalid hex codes.
+    """
+    importer = Importer(db)
+    try:
+        for path in paths:
+            importer.import_file(path, topset, pack, batch, progress)
+        return dict(importer.counts)
+    finally:
+        importer.close()
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+    parser = argparse.ArgumentParser(description='Import color lists and '
+                                     'palette packs into color.db.')
+    parser.add_argument('files', nargs='+', metavar='FILE',
+                        help=f'{", ".join(FORMATS)} files')
+    parser.add_argument('--db', default='color.db')
+    parser.add_argument('--topset', help='topset of the colors (default: '
+                        'the file name)')
+    parser.add_argument('--pack', help='pack of the palettes (default: the '
+                        'topset)')
+    parser.add_argument('--batch', type=int, default=BATCH,
+                        help='rows per transaction')
+    args = parser.parse_args()
+    t0 = time.perf_counter()
+
+    def progress(counts):
+        rate = counts['rows'] / max(time.perf_counter() - t0, 1e-9)
+        print(f'\r{counts["rows"]} rows, {rate:,.0f} rows/s', end='',
+              file=sys.stderr)
+
+    counts = import_files(args.files, args.db, args.topset, args.pack,
+                          args.batch, progress)
+    print(file=sys.stderr)
+    print(f'{counts["colors"]} colors, {counts["palettes"]} palettes and '
+          f'{counts["components"]} components added, {counts["skipped"]} '
+          f'skipped, {counts["invalid"]} invalid in '
+          f'{(time.perf_counter() - t0) * 1e3:.1f} ms', file=sys.stderr)
@@ -0,0 +1,68 @@
+"""PaletteListModel reading evicted pages in the background."""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip('PySide6')
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PySide6.QtCore import QCoreApplication  # noqa: E402
+
+from CWBrowser import PaletteListModel  # noqa: E402
+from CWJobs import jobRunner  # noqa: E402
+
+APP = QCoreApplication.instance() or QCoreApplication([])
+
+
+class Repo():
+    """Ten palettes in one pack, counting page() calls."""
+    def __init__(self):
+        self.reads = 0
+
+    def page(self, pack, after=None, limit=100):
+        self.reads += 1
+        start = 0 if after is None else after + 1
+        rows = [(f'p{i}', np.array([i], np.uint32))
+                for i in range(start, min(start + limit, 10))]
+        return rows, start + len(rows) - 1
+
+
+def _settle():
+    jobRunner().waitForDone()
+    QCoreApplication.processEvents()
+
+
+def test_evicted_page_loads_in_background():
+    model = PaletteListModel(page_size=2, cache_pages=2)
+    repo = Repo()
+    model.setPack(repo, 'p')
+    while model.canFetchMore():
+        model.fetchMore()
+    assert model.rowCount() == 10
+    reads = repo.reads
+    changed = []
+    model.dataChanged.connect(lambda a, b: changed.append((a.row(), b.row())))
+    assert model.data(model.index(0)) is None
+    assert model.data(model.index(1)) is None
+    assert repo.reads == reads
+    _settle()
+    assert repo.reads == reads + 1
+    assert changed == [(0, 1)]
+    assert model.data(model.index(1)) == 'p1'
+    assert model.palette(9) == ['#000009']
+
+
+def test_stale_page_dropped_after_set_pack():
+    model = PaletteListModel(page_size=2, cache_pages=1)
+    model.setPack(Repo(), 'p')
+    model.fetchMore()
+    model.fetchMore()
+    assert model.row(0) is None
+    model.setPack(Repo(), 'q')
+    _settle()
+    assert not model.pages
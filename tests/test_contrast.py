@@ -0,0 +1,35 @@
+"""ContrastIndex keeps up with edits of the palettes table."""
+
+import json
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from contrast import ContrastIndex  # noqa: E402
+
+
+def test_sync_rescores_edited_palettes(tmp_path):
+    path = str(tmp_path / 'color.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE palettes (pack TEXT NOT NULL, '
+                 'name TEXT NOT NULL, json TEXT NOT NULL);')
+    conn.executemany('INSERT INTO palettes VALUES (?, ?, ?);', [
+        ('p', 'ink', json.dumps(['#000000', '#FFFFFF'])),
+        ('p', 'fog', json.dumps(['#777777', '#888888'])),
+    ])
+    conn.commit()
+    index = ContrastIndex(path, cache=str(tmp_path / 'contrast.db'))
+    assert index.names('p', 7.0) == ['ink']
+    with conn:
+        conn.execute("UPDATE palettes SET json = ? WHERE name = 'ink';",
+                     (json.dumps(['#777777', '#7F7F7F']),))
+        conn.execute("UPDATE palettes SET json = ? WHERE name = 'fog';",
+                     (json.dumps(['#000000', '#FFFF00']),))
+    assert index.sync() == 2
+    assert index.names('p', 7.0) == ['fog']
+    assert conn.execute("SELECT count(*) FROM sqlite_master;").fetchone() \
+        == (1,)
+    conn.close()
+    index.close()
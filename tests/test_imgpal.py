@@ -0,0 +1,37 @@
+"""kmeans() and palette() on images with few distinct colors."""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip('PySide6')
+
+import imgpal  # noqa: E402
+from vconv import packed2lab  # noqa: E402
+
+THREE = np.repeat(np.array([0xFF0000, 0x00FFFF, 0x0000FF], np.uint32),
+                  [3000, 2000, 1000])
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_three_colors_give_three_swatches(seed):
+    assert imgpal.palette(packed2lab(THREE), 10, seed) == \
+        ['#FF0000', '#00FFFF', '#0000FF']
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_no_repeated_swatches(seed):
+    # Anti-aliased edges: a few pixels of two blends of the colors.
+    packed = np.concatenate([THREE, np.repeat(
+        np.array([0x7F7F7F, 0x007FFF], np.uint32), 40)])
+    lab = packed2lab(packed)
+    centers, counts = imgpal.kmeans(lab, 10, seed)
+    d = np.sqrt(((centers[:, None] - centers[None]) ** 2).sum(-1))
+    assert (d[np.triu_indices(len(d), 1)] >= imgpal.MERGE).all()
+    assert counts.sum() == len(lab)
+    pal = imgpal.palette(lab, 10, seed)
+    assert len(pal) == len(set(pal)) == 5
@@ -0,0 +1,49 @@
+"""palette_distance() against a brute-force search of every matching."""
+
+import itertools
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from paldedup import palette_distance  # noqa: E402
+
+
+def brute_force(a, b):
+    """The definition: best one-to-one matching, leftovers at nearest."""
+    if len(a) > len(b):
+        a, b = b, a
+    d = np.sqrt(((a[:, None, :] - b[None, :, :]) ** 2).sum(-1))
+    best = np.inf
+    for cols in itertools.permutations(range(len(b)), len(a)):
+        left = np.ones(len(b), dtype=bool)
+        left[list(cols)] = False
+        total = d[np.arange(len(a)), cols].sum() + d[:, left].min(0).sum()
+        best = min(best, total)
+    return best / len(b)
+
+
+@pytest.mark.parametrize('seed', range(300))
+def test_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    na, nb = rng.integers(1, 6, 2)
+    a = rng.uniform(0, 100, (na, 3))
+    b = rng.uniform(0, 100, (nb, 3))
+    assert palette_distance(a, b) == pytest.approx(brute_force(a, b))
+
+
+def test_same_colors_in_other_counts():
+    x, y = [50.0, 0.0, 0.0], [60.0, 10.0, 0.0]
+    a = np.array([x, x, y])
+    b = np.array([x, y, y])
+    assert palette_distance(a, b) == pytest.approx(brute_force(a, b))
+    assert palette_distance(a, b) > 0
+
+
+def test_reordered_palette_is_identical():
+    rng = np.random.default_rng(1)
+    a = rng.uniform(0, 100, (6, 3))
+    assert palette_distance(a, a[::-1]) == 0.0
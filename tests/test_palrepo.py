@@ -0,0 +1,30 @@
+"""PaletteRepository on palettes with malformed swatches."""
+
+import json
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from palrepo import PaletteRepository  # noqa: E402
+
+
+def test_packed_and_page_agree(tmp_path):
+    path = str(tmp_path / 'color.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE palettes (pack TEXT NOT NULL, '
+                 'name TEXT NOT NULL, json TEXT NOT NULL);')
+    conn.executemany('INSERT INTO palettes VALUES (?, ?, ?);', [
+        ('p', 'bad', 'not json'),
+        ('p', 'mixed', json.dumps(['#112233', 'zz', '#GGGGGG', 5, '#445566'])),
+    ])
+    conn.commit()
+    conn.close()
+    repo = PaletteRepository(path)
+    rows, _ = repo.page('p')
+    for name, packed in rows:
+        assert repo.packed('p', name).tolist() == packed.tolist()
+    assert repo.palette('p', 'mixed') == ['#112233', '#445566']
+    assert repo.palette('p', 'bad') == []
+    repo.close()
@@ -0,0 +1,75 @@
+"""PaletteSearch on a small database."""
+
+import json
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from palsearch import PaletteSearch  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / 'color.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE palettes (pack TEXT NOT NULL, '
+                 'name TEXT NOT NULL, json TEXT NOT NULL);')
+    conn.executemany('INSERT INTO palettes VALUES (?, ?, ?);', [
+        ('sea', 'harbor blue', json.dumps(['#143858', '#FFFFFF'])),
+        ('fire', 'ember', json.dumps(['#FF4500', '#8B0000'])),
+    ])
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def search(db, tmp_path):
+    ps = PaletteSearch(db, cache=str(tmp_path / 'search.db'))
+    yield ps
+    ps.close()
+
+
+def test_text(search):
+    assert search.search('harb') == [('sea', 'harbor blue', None)]
+
+
+def test_near(search):
+    (pack, name, d), = search.search('', '#123456', 3)
+    assert (pack, name) == ('sea', 'harbor blue')
+    assert 2 < d < 3
+
+
+def test_near_rows_but_none_within_radius(search):
+    # #143858 shares a bin with #123456 but is 2.5 delta E away.
+    assert search.search('', '#123456', 1) == []
+    assert search.search('blue', '#123456', 0.5) == []
+
+
+def test_color_db_is_left_alone(db, search):
+    conn = sqlite3.connect(db)
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name != "
+                        "'palettes';").fetchall() == []
+    conn.close()
+
+
+def test_sync_sees_edits_and_deletes(db, search):
+    conn = sqlite3.connect(db)
+    with conn:
+        conn.execute("UPDATE palettes SET name = 'tide', json = ? "
+                     "WHERE pack = 'sea';", (json.dumps(['#FF4500']),))
+        conn.execute("DELETE FROM palettes WHERE pack = 'fire';")
+        conn.execute("INSERT INTO palettes VALUES ('fire', 'coal', ?);",
+                     (json.dumps(['#101010']),))
+    conn.close()
+    assert search.sync() == 2
+    assert search.search('harbor') == []
+    assert search.search('tide') == [('sea', 'tide', None)]
+    assert [r[:2] for r in search.search('', '#FF4500', 1)] == \
+        [('sea', 'tide')]
+    assert search.search('ember') == []
+    assert search.sync() == 0
@@ -0,0 +1,80 @@
+"""Project.open() on journals and save() failures."""
+
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import project as proj  # noqa: E402
+from project import Project  # noqa: E402
+
+HISTORY = (None, [], 0)
+
+
+def _saved(path):
+    p = Project(None)
+    p.store('p', 'a', np.array([0x112233], np.uint32))
+    p.save(path, {}, HISTORY)
+    p.close()
+
+
+def _journal(path, jid, *records):
+    with open(path, 'w', encoding='utf-8') as f:
+        for r in ({'op': 'begin', 'id': jid},) + records:
+            f.write(json.dumps(r) + '\n')
+
+
+STORE = {'op': 'store', 'pack': 'p', 'name': 'b', 'colors': ['#445566']}
+
+
+def test_open_journal_of_saved_project(tmp_path):
+    path = str(tmp_path / 'x.cwx')
+    _saved(path)
+    jid = Project(path).meta['journal']
+    _journal(path + '.journal', jid, STORE)
+    p = Project.open(path + '.journal')
+    assert p.names('p') == ['a', 'b']
+    p.close()
+
+
+def test_open_stale_journal_of_saved_project(tmp_path):
+    path = str(tmp_path / 'x.cwx')
+    _saved(path)
+    _journal(path + '.journal', 'other', STORE)
+    p = Project.open(path + '.journal')
+    assert p.names('p') == ['a']
+    assert not os.path.exists(path + '.journal')
+    p.close()
+
+
+def test_open_journal_of_unsaved_project(tmp_path):
+    path = str(tmp_path / 'x.cwx.journal')
+    _journal(path, 'any', STORE)
+    p = Project.open(path)
+    assert p.names('p') == ['b']
+    p.close()
+
+
+def test_failed_replace_keeps_old_file(tmp_path, monkeypatch):
+    path = str(tmp_path / 'x.cwx')
+    _saved(path)
+    p = Project.open(path)
+    p.store('p', 'b', np.array([0x445566], np.uint32))
+
+    def fail(src, dst):
+        raise OSError('busy')
+    monkeypatch.setattr(proj.os, 'replace', fail)
+    with pytest.raises(OSError):
+        p.save(path, {}, HISTORY)
+    assert not os.path.exists(path + '.tmp')
+    assert p.names('p') == ['a', 'b']
+    monkeypatch.undo()
+    p.save(path, {}, HISTORY)
+    p.close()
+    p = Project.open(path)
+    assert p.names('p') == ['a', 'b']
+    p.close()
@@ -0,0 +1,31 @@
+"""hex2packed() on well-formed, mixed and bad hex codes."""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vconv import hex2packed, packed2hex  # noqa: E402
+
+
+def test_round_trip():
+    packed = np.random.default_rng(0).integers(0, 1 << 24, 1000)
+    codes = packed2hex(packed)
+    assert (hex2packed(codes) == packed).all()
+    assert (hex2packed([c[1:].lower() for c in codes]) == packed).all()
+
+
+def test_mixed_formats():
+    assert hex2packed(['#0000FF', 'ff0000']).tolist() == [0xFF, 0xFF0000]
+
+
+@pytest.mark.parametrize('codes', [
+    ['#abc'], [''], ['#GGGGGG'], ['#12345é'], ['#12 34 '],
+    ['#ABCDEF', 'ABCDEFGH'], ['ABCD', 'ABCDEFGH'], ['#ABC', 'DEF#123456'],
+])
+def test_bad_codes(codes):
+    with pytest.raises(ValueError):
+        hex2packed(codes)
@@ -0,0 +1,475 @@
+"""
+Vectorized color conversions.
+
+The colorways conversion helpers work on one Python list per color. The
+functions in this module work on whole arrays of colors at once:
+
+    packed  uint32 array of 0xRRGGBB values, shape (N,)
+    rgb     float array in [0,1], shape (N, 3)
+    hsl     float array in [0,1], shape (N, 3) ordered H, S, L
+    hsv     float array in [0,1], shape (N, 3) ordered H, S, V
+    lab     CIE L*a*b* floats (D65, 2 degree observer), shape (N, 3)
+    oklab   OKLab floats, L in [0,1], shape (N, 3)
+    oklch   OKLab as L, C, h with the hue h in [0,1), shape (N, 3)
+    hex     list of '#RRGGBB' strings
+
+The float conversions follow the colorsys formulas used by colorways, so
+results match the scalar path. Any leading dimensions are allowed for the
+float arrays; only the last axis has to be 3.
+
+The list-in/list-out functions at the bottom (hex2hsl, hsl2hex, ...) are
+drop-in replacements for their colorways namesakes: they accept a single
+color or a palette and return the same shape of Python lists.
+"""
+
+import numpy as np
+
+import metrics
+
+__all__ = [
+    'hex2packed', 'packed2hex',
+    'packed2rgb', 'rgb2packed',
+    'rgb_to_hsl', 'hsl_to_rgb',
+    'rgb_to_hsv', 'hsv_to_rgb',
+    'rgb_to_lab', 'lab_to_rgb', 'packed2lab', 'packed2luminance',
+    'rgb_to_oklab', 'oklab_to_rgb', 'rgb_to_oklch', 'oklch_to_rgb',
+    'hex2rgb', 'hex2hsl', 'hex2hsv',
+    'rgb2hex', 'hsl2hex', 'hsv2hex',
+]
+
+
+# Nibble value -> upper case ASCII hex digit.
+_DIGIT = np.frombuffer(b'0123456789ABCDEF', np.uint8)
+
+_SHIFTS = np.array([20, 16, 12, 8, 4, 0], dtype=np.uint32)
+
+
+### Packed uint32 <-> hex strings
+
+@metrics.timed('vconv.hex2packed')
+def hex2packed(hexcodes):
+    """
+    Converts a list of '#RRGGBB' (or 'RRGGBB') strings to a uint32 array.
+    Raises ValueError if any code is not six hex digits.
+    """
+    n = len(hexcodes)
+    if n == 0:
+        return np.zeros(0, dtype=np.uint32)
+    digits = _hex_digits(hexcodes)
+    if digits is None:
+        # Mixed formats; normalize to 'RRGGBB'.
+        digits = _hex_digits([h[1:] if h[:1] == '#' else h for h in hexcodes])
+    try:
+        rgb = bytes.fromhex(digits)
+    except (TypeError, ValueError):
+        rgb = b''
+    # fromhex() skips whitespace, which leaves it short.
+    if len(rgb) != 3 * n:
+        raise ValueError('hex codes must be #RRGGBB or RRGGBB')
+    out = np.zeros((n, 4), dtype=np.uint8)
+    out[:, 1:] = np.frombuffer(rgb, np.uint8).reshape(n, 3)
+    return out.view('>u4').ravel().astype(np.uint32)
+
+
+def _hex_digits(hexcodes):
+    """
+    The digits of codes that are all '#RRGGBB' or all 'RRGGBB' long, as
+    one string, or None.
+    """
+    n = len(hexcodes)
+    # Every code is followed by a ',', so each row must be one code.
+    joined = ','.join(hexcodes) + ','
+    width = len(joined) // n
+    if (width not in (7, 8) or len(joined) != width * n
+            or joined.count(',') != n
+            or joined[width - 1::width] != ',' * n
+            or (width == 8 and joined[::8] != '#' * n)):
+        return None
+    return joined.encode('ascii', 'replace').translate(None, b'#,').decode()
+
+
+@metrics.timed('vconv.packed2hex')
+def packed2hex(packed):
+    """Converts a uint32 array of 0xRRGGBB values to '#RRGGBB' strings."""
+    packed = np.asarray(packed, dtype=np.uint32).ravel()
+    chars = np.empty((packed.size, 7), dtype=np.uint8)
+    chars[:, 0] = ord('#')
+    chars[:, 1:] = _DIGIT[(packed[:, None] >> _SHIFTS) & 0xF]
+    return chars.view('S7').ravel().astype('U7').tolist()
+
+
+### Packed uint32 <-> RGB floats
+
+def packed2rgb(packed):
+    """Converts 0xRRGGBB values to RGB floats in [0,1], shape (..., 3)."""
+    packed = np.asarray(packed, dtype=np.uint32)
+    out = np.empty(packed.shape + (3,), dtype=np.float64)
+    out[..., 0] = (packed >> 16) & 0xFF
+    out[..., 1] = (packed >> 8) & 0xFF
+    out[..., 2] = packed & 0xFF
+    out /= 255.0
+    return out
+
+
+def rgb2packed(rgb):
+    """
+    Converts RGB floats in [0,1] to 0xRRGGBB values. Channels are rounded
+    half to even like colorways' norm2bytes and clipped to [0,255].
+    """
+    b = np.clip(np.rint(np.asarray(rgb, dtype=np.float64) * 255.0), 0, 255)
+    b = b.astype(np.uint32)
+    return (b[..., 0] << 16) | (b[..., 1] << 8) | b[..., 2]
+
+
+### Color space conversions on (..., 3) float arrays
+
+def _hue(rgb, maxc, rangec):
+    # Shared hue computation of colorsys.rgb_to_hls/rgb_to_hsv.
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    safe = np.where(rangec == 0, 1.0, rangec)
+    rc = (maxc - r) / safe
+    gc = (maxc - g) / safe
+    bc = (maxc - b) / safe
+    h = np.where(r == maxc, bc - gc,
+        np.where(g == maxc, 2.0 + rc - bc, 4.0 + gc - rc))
+    h = (h / 6.0) % 1.0
+    return np.where(rangec == 0, 0.0, h)
+
+
+def rgb_to_hsl(rgb):
+    """Converts RGB to HSL (H, S, L order, as colorways uses)."""
+    rgb = np.asarray(rgb, dtype=np.float64)
+    maxc = rgb.max(axis=-1)
+    minc = rgb.min(axis=-1)
+    sumc = maxc + minc
+    rangec = maxc - minc
+    l = sumc / 2.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s = np.where(l <= 0.5, rangec / sumc, rangec / (2.0 - maxc - minc))
+    s = np.where(rangec == 0, 0.0, s)
+    return np.stack([_hue(rgb, maxc, rangec), s, l], axis=-1)
+
+
+def rgb_to_hsv(rgb):
+    """Converts RGB to HSV."""
+    rgb = np.asarray(rgb, dtype=np.float64)
+    maxc = rgb.max(axis=-1)
+    rangec = maxc - rgb.min(axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s = np.where(rangec == 0, 0.0, rangec / maxc)
+    return np.stack([_hue(rgb, maxc, rangec), s, maxc], axis=-1)
+
+
+def _v(m1, m2, hue):
+    # Vectorized colorsys._v.
+    hue = hue % 1.0
+    return np.where(hue < 1/6, m1 + (m2 - m1) * hue * 6.0,
+           np.where(hue < 0.5, m2,
+           np.where(hue < 2/3, m1 + (m2 - m1) * (2/3 - hue) * 6.0, m1)))
+
+
+def hsl_to_rgb(hsl):
+    """Converts HSL (H, S, L order) to RGB."""
+    hsl = np.asarray(hsl, dtype=np.float64)
+    h, s, l = hsl[..., 0], hsl[..., 1], hsl[..., 2]
+    m2 = np.where(l <= 0.5, l * (1.0 + s), l + s - l * s)
+    m1 = 2.0 * l - m2
+    rgb = np.stack([_v(m1, m2, h + 1/3), _v(m1, m2, h), _v(m1, m2, h - 1/3)],
+                   axis=-1)
+    gray = (s == 0.0)[..., None]
+    return np.where(gray, l[..., None], rgb)
+
+
+def hsv_to_rgb(hsv):
+    """Converts HSV to RGB."""
+    hsv = np.asarray(hsv, dtype=np.float64)
+    h, s, v = hsv[..., 0], hsv[..., 1], hsv[..., 2]
+    i = np.trunc(h * 6.0)
+    f = h * 6.0 - i
+    p = v * (1.0 - s)
+    q = v * (1.0 - s * f)
+    t = v * (1.0 - s * (1.0 - f))
+    i = (i.astype(np.int64) % 6)[..., None]
+    # Rows of (r, g, b) for each of the six hue sectors.
+    sectors = np.stack([
+        np.stack([v, t, p], axis=-1),
+        np.stack([q, v, p], axis=-1),
+        np.stack([p, v, t], axis=-1),
+        np.stack([p, q, v], axis=-1),
+        np.stack([t, p, v], axis=-1),
+        np.stack([v, p, q], axis=-1),
+    ])
+    rgb = np.take_along_axis(np.moveaxis(sectors, 0, -1), i[..., None],
+                             axis=-1)[..., 0]
+    gray = (s == 0.0)[..., None]
+    return np.where(gray, v[..., None], rgb)
+
+
+# sRGB companding and the RGB <-> XYZ matrices used by colorways.
+_RGB2XYZ = np.array([
+    [0.4124564, 0.3575761, 0.1804375],
+    [0.2126729, 0.7151522, 0.0721750],
+    [0.0193339, 0.1191920, 0.9503041]])
+_XYZ2RGB = np.array([
+    [3.2404542, -1.5371385, -0.4985314],
+    [-0.9692660, 1.8760108, 0.0415560],
+    [0.0556434, -0.2040259, 1.0572252]])
+_WHITE = np.array([0.95047, 1.0, 1.08883])
+
+
+def _linearize(c):
+    return np.where(c > 0.04045, ((c + 0.055) / 1.055) ** 2.4, c / 12.92)
+
+
+# Byte value -> linear RGB, so packed colors skip the power function.
+_LINEAR = _linearize(np.arange(256) / 255.0)
+
+
+def _xyz_to_lab(xyz):
+    t = xyz / _WHITE
+    f = np.where(t > 0.008856, np.cbrt(t), 7.787 * t + 16.0 / 116.0)
+    return np.stack([116.0 * f[..., 1] - 16.0,
+                     500.0 * (f[..., 0] - f[..., 1]),
+                     200.0 * (f[..., 1] - f[..., 2])], axis=-1)
+
+
+def rgb_to_lab(rgb):
+    """Converts RGB to CIE L*a*b*."""
+    lin = _linearize(np.asarray(rgb, dtype=np.float64))
+    return _xyz_to_lab(lin @ _RGB2XYZ.T)
+
+
+def packed2lab(packed):
+    """Converts 0xRRGGBB values to CIE L*a*b* through a byte lookup table."""
+    packed = np.asarray(packed, dtype=np.uint32)
+    lin = np.stack([_LINEAR[(packed >> 16) & 0xFF],
+                    _LINEAR[(packed >> 8) & 0xFF],
+                    _LINEAR[packed & 0xFF]], axis=-1)
+    return _xyz_to_lab(lin @ _RGB2XYZ.T)
+
+
+def packed2luminance(packed):
+    """Relative luminance (CIE Y, 0 to 1) of 0xRRGGBB values, as in WCAG."""
+    packed = np.asarray(packed, dtype=np.uint32)
+    y = _RGB2XYZ[1]
+    return (y[0] * _LINEAR[(packed >> 16) & 0xFF]
+            + y[1] * _LINEAR[(packed >> 8) & 0xFF]
+            + y[2] * _LINEAR[packed & 0xFF])
+
+
+def lab_to_rgb(lab):
+    """Converts CIE L*a*b* to RGB, clipped to [0,1] like colorways."""
+    lab = np.asarray(lab, dtype=np.float64)
+    y = (lab[..., 0] + 16.0) / 116.0
+    f = np.stack([lab[..., 1] / 500.0 + y, y, y - lab[..., 2] / 200.0],
+                 axis=-1)
+    cube = f ** 3
+    xyz = np.where(cube > 0.008856, cube, (f - 16.0 / 116.0) / 7.787) * _WHITE
+    return np.clip(_compand(xyz @ _XYZ2RGB.T), 0.0, 1.0)
+
+
+def _compand(lin):
+    with np.errstate(invalid='ignore'):
+        return np.where(lin > 0.0031308,
+                        1.055 * np.abs(lin) ** (1.0 / 2.4) - 0.055,
+                        lin * 12.92)
+
+
+### OKLab and OKLCH
+
+# Linear RGB -> LMS, and cube-rooted LMS -> OKLab (Ottosson 2020).
+_RGB2LMS = np.array([
+    [0.4122214708, 0.5363325363, 0.0514459929],
+    [0.2119034982, 0.6806995451, 0.1073969566],
+    [0.0883024619, 0.2817188376, 0.6299787005]])
+_LMS2OKLAB = np.array([
+    [0.2104542553, 0.7936177850, -0.0040720468],
+    [1.9779984951, -2.4285922050, 0.4505937099],
+    [0.0259040371, 0.7827717662, -0.8086757660]])
+_OKLAB2LMS = np.array([
+    [1.0, 0.3963377774, 0.2158037573],
+    [1.0, -0.1055613458, -0.0638541728],
+    [1.0, -0.0894841775, -1.2914855480]])
+_LMS2RGB = np.array([
+    [4.0767416621, -3.3077115913, 0.2309699292],
+    [-1.2684380046, 2.6097574011, -0.3413193965],
+    [-0.0041960863, -0.7034186147, 1.7076147010]])
+
+# Ottosson's fit of the largest saturation (chroma / lightness) of a hue
+# in sRGB, S = k0 + k1 a + k2 b + k3 a^2 + k4 a b for unit (a, b), for
+# the hues where red, green or blue reaches 0 first.
+_CUSP_K = np.array([
+    [1.19086277, 1.76576728, 0.59662641, 0.75515197, 0.56771245],
+    [0.73956515, -0.45954404, 0.08285427, 0.12541070, 0.14503204],
+    [1.35733652, -0.00915799, -1.15130210, -0.50559606, 0.00692167]])
+
+# The cusp table covers hue angles from -pi (atan2) to 2 pi (OKLCH), in
+# steps of about a third of a degree.
+_CUSP_STEPS = 1536
+
+# Linear RGB this far outside [0,1] still counts as in gamut.
+_GAMUT_EPS = 1e-7
+
+
+def rgb_to_oklab(rgb):
+    """Converts RGB to OKLab."""
+    lin = _linearize(np.asarray(rgb, dtype=np.float64))
+    return np.cbrt(lin @ _RGB2LMS.T) @ _LMS2OKLAB.T
+
+
+def _cusp(a, b):
+    """
+    Lightness and chroma of the most saturated sRGB color of each unit
+    hue (a, b): Ottosson's fit refined by one Halley step.
+    """
+    first = np.where(-1.88170328 * a - 0.80936493 * b > 1, 0,
+                     np.where(1.81444104 * a - 1.19445276 * b > 1, 1, 2))
+    k = _CUSP_K[first].T
+    sat = k[0] + k[1] * a + k[2] * b + k[3] * a * a + k[4] * a * b
+    # At lightness 1 the LMS roots are 1 + S * m; the channel that
+    # reaches 0 first, w . (1 + S m)^3, is to be 0.
+    m = _OKLAB2LMS[:, 1:] @ np.stack([a, b])
+    w = _LMS2RGB.T[:, first]
+    root = 1.0 + sat * m
+    f = (w * root * root * root).sum(axis=0)
+    f1 = (3.0 * w * m * root * root).sum(axis=0)
+    f2 = (6.0 * w * m * m * root).sum(axis=0)
+    sat -= f * f1 / (f1 * f1 - 0.5 * f * f2)
+    root = 1.0 + sat * m
+    light = np.cbrt(1.0 / (_LMS2RGB @ (root * root * root)).max(axis=0))
+    return light, light * sat
+
+
+# Cusp lightness + 1j * chroma by hue angle, for a single np.interp().
+_CUSP_ANGLE = np.linspace(-np.pi, 2 * np.pi, _CUSP_STEPS + 1)
+_CUSP = np.array([1, 1j]) @ np.array(_cusp(np.cos(_CUSP_ANGLE),
+                                            np.sin(_CUSP_ANGLE)))
+
+
+def _oklab_to_srgb(light, a, b, chroma=None, angle=None):
+    """
+    RGB (n, 3) of OKLab colors given as flat arrays, mapped into the
+    gamut by reducing their chroma at constant lightness and hue. The
+    mapping is in closed form (Ottosson 2021): the gamut of a hue is
+    taken as the triangle of black, white and its cusp, and the edge
+    found is refined by one Halley step. chroma and angle (radians) may
+    be passed when known.
+    """
+    light = np.clip(light, 0.0, 1.0)
+    # LMS roots are L + m; everything below is channels first, (3, n).
+    m = _OKLAB2LMS[:, 1:2] * a + _OKLAB2LMS[:, 2:3] * b
+    root = light + m
+    lin = _LMS2RGB @ (root * root * root)
+    d = np.abs(lin - 0.5)
+    out = np.flatnonzero(np.maximum(np.maximum(d[0], d[1]), d[2])
+                         > 0.5 + _GAMUT_EPS)
+    if len(out):
+        light = light[out]
+        m = m[:, out]
+        if chroma is None:
+            a, b = a[out], b[out]
+            chroma, angle = np.hypot(a, b), np.arctan2(b, a)
+        else:
+            chroma, angle = chroma[out], angle[out]
+        cusp = np.interp(angle, _CUSP_ANGLE, _CUSP)
+        cusp_l, cusp_c = cusp.real, cusp.imag
+        # Scale chroma by s to meet the triangle: its upper edge (to
+        # white) above the cusp, the lower one (to black) below it.
+        upper = light > cusp_l
+        s = cusp_c * np.where(upper, (1.0 - light) / (1.0 - cusp_l),
+                              light / cusp_l) / chroma
+        # At scale s linear RGB is M (L + s m)^3. Every channel rising to
+        # 1 (above the cusp) or falling to 0 (below) takes a Halley step
+        # to that edge; the nearest one is the gamut boundary.
+        root = light + s * m
+        sq = root * root
+        f = _LMS2RGB @ (sq * root) - upper
+        f1 = _LMS2RGB @ (3.0 * sq * m)
+        f2 = _LMS2RGB @ (6.0 * root * m * m)
+        u = f1 / (f1 * f1 - 0.5 * f * f2)
+        step = np.where((u >= 0) == upper, -f * u, np.inf).min(axis=0)
+        s = np.clip(s + np.where(step < np.inf, step, 0.0), 0.0, 1.0)
+        root = light + s * m
+        lin[:, out] = _LMS2RGB @ (root * root * root)
+    lin = np.clip(lin, 0.0, 1.0)
+    return np.where(lin > 0.0031308, 1.055 * lin ** (1.0 / 2.4) - 0.055,
+                    12.92 * lin).T
+
+
+def oklab_to_rgb(lab):
+    """
+    Converts OKLab to RGB. Colors outside sRGB are mapped into it by
+    reducing their chroma at constant lightness and hue.
+    """
+    lab = np.asarray(lab, dtype=np.float64)
+    flat = lab.reshape(-1, 3)
+    return _oklab_to_srgb(flat[:, 0], flat[:, 1], flat[:, 2]) \
+        .reshape(lab.shape)
+
+
+def rgb_to_oklch(rgb):
+    """Converts RGB to OKLCH, hue in [0,1)."""
+    lab = rgb_to_oklab(rgb)
+    out = np.empty_like(lab)
+    out[..., 0] = lab[..., 0]
+    out[..., 1] = np.hypot(lab[..., 1], lab[..., 2])
+    out[..., 2] = np.arctan2(lab[..., 2], lab[..., 1]) / (2 * np.pi) % 1.0
+    return out
+
+
+def oklch_to_rgb(lch):
+    """Converts OKLCH (hue in [0,1)) to RGB, mapped into the gamut."""
+    lch = np.asarray(lch, dtype=np.float64)
+    flat = lch.reshape(-1, 3)
+    chroma = flat[:, 1]
+    angle = flat[:, 2] % 1.0 * (2 * np.pi)
+    return _oklab_to_srgb(flat[:, 0], chroma * np.cos(angle),
+                          chroma * np.sin(angle), chroma, angle) \
+        .reshape(lch.shape)
+
+
+### List-in/list-out wrappers matching the colorways API
+
+def _from_hex(hexcodes, fn):
+    if isinstance(hexcodes, str):
+        return fn(packed2rgb(hex2packed([hexcodes])))[0].tolist()
+    return fn(packed2rgb(hex2packed(hexcodes))).tolist()
+
+
+def _to_hex(colors, fn):
+    if len(colors) == 0:
+        return []
+    colors = np.asarray(colors, dtype=np.float64)
+    if colors.ndim == 1:
+        return packed2hex(rgb2packed(fn(colors[None])))[0]
+    return packed2hex(rgb2packed(fn(colors)))
+
+
+def hex2rgb(hexcodes):
+    """Converts '#RRGGBB' strings to RGB vec3s in [0,1]."""
+    return _from_hex(hexcodes, np.asarray)
+
+
+def hex2hsl(hexcodes):
+    """Converts '#RRGGBB' strings to HSL vec3s."""
+    return _from_hex(hexcodes, rgb_to_hsl)
+
+
+def hex2hsv(hexcodes):
+    """Converts '#RRGGBB' strings to HSV vec3s."""
+    return _from_hex(hexcodes, rgb_to_hsv)
+
+
+def rgb2hex(colors):
+    """Converts RGB vec3s to '#RRGGBB' strings."""
+    return _to_hex(colors, np.asarray)
+
+
+def hsl2hex(colors):
+    """Converts HSL vec3s to '#RRGGBB' strings."""
+    return _to_hex(colors, hsl_to_rgb)
+
+
+def hsv2hex(colors):
+    """Converts HSV vec3s to '#RRGGBB' strings."""
+    return _to_hex(colors, hsv_to_rgb)